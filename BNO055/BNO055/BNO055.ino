@@ -15,6 +15,10 @@
  *    "2" = Ulnar/Radial
  *    "3" = Prono/Supinación
  *    "e" = Detener medición (volver al menú)
+ *    "b" = Telemetría binaria (responde BIN_OK, ~100 Hz)
+ *    "t" = Telemetría de texto (responde TXT_OK, por defecto)
+ *  Registro binario: mismo TramaBin de 26 bytes que integrado.ino
+ *    (fuerza/EMG en NaN, threshold/activation en 0).
  */
 
 #include <Wire.h>
@@ -31,6 +35,7 @@
 
 // === Ajusta esto para la velocidad de impresión ===
 const unsigned long PRINT_MS = 100;   // p.ej. 100=10Hz, 50=20Hz, 200=5Hz
+const unsigned long PRINT_MS_BIN = 10; // modo binario ~100 Hz
 
 Adafruit_BNO055 bnoWrist = Adafruit_BNO055(55, BNO_ADDR_WRIST);
 Adafruit_BNO055 bnoHand  = Adafruit_BNO055(56, BNO_ADDR_HAND);
@@ -49,6 +54,52 @@ Quat qRel_latest = {1,0,0,0};
 enum MeasurementMode { NONE, DEVIATIONS, FLEX_EXT, PRONO_SUP };
 MeasurementMode currentMode = NONE;
 
+// === Telemetría binaria (ver integrado.ino / tramas.py) ===
+const uint16_t SYNC_BIN = 0xA55A;
+
+struct __attribute__((packed)) TramaBin {
+  uint16_t sync;
+  uint16_t seq;
+  uint32_t t_ms;
+  float    angle_deg;
+  float    force_kg;
+  float    emg_env;
+  int16_t  threshold;
+  uint8_t  activation;
+  uint8_t  mode;
+  uint16_t crc;
+};
+
+bool binaryMode = false;
+uint16_t binSeq = 0;
+
+// CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)
+uint16_t crc16(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  while (len--) {
+    crc ^= (uint16_t)(*data++) << 8;
+    for (uint8_t i = 0; i < 8; i++)
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+  }
+  return crc;
+}
+
+void sendBinaryFrame(unsigned long t_ms, float angle_deg) {
+  TramaBin f;
+  f.sync       = SYNC_BIN;
+  f.seq        = binSeq++;
+  f.t_ms       = t_ms;
+  f.angle_deg  = angle_deg;
+  f.force_kg   = NAN;
+  f.emg_env    = NAN;
+  f.threshold  = 0;
+  f.activation = 0;
+  f.mode       = (uint8_t)currentMode;
+  const uint8_t *p = (const uint8_t *)&f;
+  f.crc = crc16(p + 2, sizeof(TramaBin) - 4);
+  Serial.write(p, sizeof(TramaBin));
+}
+
 Quat readQuat(Adafruit_BNO055 &bno) {
   imu::Quaternion q = bno.getQuat();
   Quat out = { (float)q.w(), (float)q.x(), (float)q.y(), (float)q.z() };
@@ -91,6 +142,7 @@ void showMenu() {
   Serial.println("3: Prono/Supinación (yaw X)");
   Serial.println("e: Detener medición (volver al menú)");
   Serial.println("Durante medición, fija el cero con ESPACIO/'z'.");
+  Serial.println("b/t: telemetría binaria / texto");
 }
 
 /* =========== ÁNGULO DE "TWIST" (giro puro) ALREDEDOR DE UN EJE ===========
@@ -181,6 +233,18 @@ void handleSerial() {
         }
         break;
 
+      case 'b': case 'B':
+        Serial.println("BIN_OK");
+        Serial.flush();
+        binaryMode = true;
+        binSeq = 0;
+        break;
+
+      case 't': case 'T':
+        binaryMode = false;
+        Serial.println("TXT_OK");
+        break;
+
       default:
         // opcional: reportar caracter ignorado
         // Serial.print("Ignorado: "); Serial.println(c);
@@ -240,7 +304,7 @@ void loop() {
   // 3) Si no hay cero fijado, pedirlo y no avanzar
   if (!haveZero) {
     unsigned long now = millis();
-    if (now - lastPrint >= 500) {
+    if (!binaryMode && now - lastPrint >= 500) {
       Serial.println("Esperando ESPACIO/'z' para fijar cero...");
       lastPrint = now;
     }
@@ -272,9 +336,13 @@ void loop() {
 
   // 7) Imprime a la tasa definida por PRINT_MS
   unsigned long now = millis();
-  if (now - lastPrint >= PRINT_MS) {
-    Serial.print(label);
-    Serial.println(angle_deg, 2);
+  if (now - lastPrint >= (binaryMode ? PRINT_MS_BIN : PRINT_MS)) {
+    if (binaryMode) {
+      sendBinaryFrame(now, angle_deg);
+    } else {
+      Serial.print(label);
+      Serial.println(angle_deg, 2);
+    }
     lastPrint = now;
   }
 
@@ -15,20 +15,14 @@ import customtkinter as ctk
 from tkinter import messagebox
 from PIL import Image, ImageTk
 import tkinter as tk
-import pandas as pd
 import re
 
-# importar las utilidades Excel/IO desde tu script principal
-# suponemos que tus funciones abrir_o_crear_xlsx, asegurar_inicio_simple, escribir_sesion
-# están en excel_utils.py o en el módulo donde tenías el código original.
-# Si tu script original se llama `capture_cli.py`, cámbialo a:
-# from capture_cli import abrir_o_crear_xlsx, asegurar_inicio_simple, escribir_sesion
-from principal import abrir_o_crear_xlsx, asegurar_inicio_simple, escribir_sesion
-
-# y la función de captura no bloqueante la provee este mismo módulo (ver más abajo)
-from principal import _extraer_numero  # reutiliza la utilidad regex si la tienes
-
-import serial  # pyserial
+# guardado: almacén por paciente (almacen.py, se importa en save_worker); el
+# Excel se regenera desde ahí. La captura no bloqueante la provee este mismo
+# módulo (ver más abajo) e importa pyserial/numpy en su hilo. Lo pesado se
+# precarga en segundo plano apenas se abre la ventana (ver precarga.py).
+from precarga import precargar
+from cola_excel import TrabajadorCola, exportar_o_encolar
 
 # ---------------- Apariencia ----------------
 ctk.set_appearance_mode("Light")
@@ -70,6 +64,15 @@ COLS = [
     "EMG(FP)_mv"
 ]
 
+# Guardar escribe solo la sesión en el almacén; Lecturas.xlsx se regenera
+# entero (crece con el historial), así que se pide aparte:
+# `python almacen.py exportar <cedula>`. True: exportar en cada guardado.
+EXPORTAR_AL_GUARDAR = False
+
+# ---------------- Paciente / Excel (de principal.py) ----------------
+# principal ya no carga pandas/openpyxl al importarse: traerlo es inmediato
+from principal import MAIN_DIR as ORIG_MAIN_DIR, EMG_DE, ahora_nombres
+
 # ---------------- Estado global para la sesión ----------------
 result_queue = Queue()       # resultados que vienen de los threads
 session_dfs = []             # capturas (DataFrames) acumuladas en la sesión
@@ -333,6 +336,12 @@ def capture_from_arduino(cmd, nombre_col, duracion):
     Función que corre en el thread y hace la captura; devuelve DataFrame al queue.
     Mantiene la estructura de DataFrame similar al script original.
     """
+    import serial  # pyserial
+    from tramas import ParserTramas, CAMPO_POR_CMD
+    from lector_serial import LectorSerial
+    from muestras import BufferMuestras
+    from reloj import ModeloReloj, COL_T_HOST, tiempos_de_bloque
+
     try:
         ser = serial.Serial(port=SERIAL_PORT, baudrate=BAUD_RATE, timeout=1)
     except Exception as e:
@@ -344,15 +353,24 @@ def capture_from_arduino(cmd, nombre_col, duracion):
         # enviar comando y tara similar al original
         ser.write(str(cmd).encode()); time.sleep(0.2)
         ser.write(b" "); time.sleep(0.2)
+        parser = ParserTramas()
+        campo = CAMPO_POR_CMD.get(str(cmd), "angle")
+        col_emg = EMG_DE[nombre_col]
+        buf = BufferMuestras(["timestamp_s", COL_T_HOST, nombre_col, col_emg])
+        reloj = ModeloReloj()
+        t_dev0 = None
         t0 = time.time()
-        timestamps, valores = [], []
-        while (time.time() - t0) < duracion:
-            linea = ser.readline().decode(errors="ignore").strip()
-            val = _extraer_numero(linea)
-            if val is None:
-                continue
-            ts = time.time() - t0
-            timestamps.append(ts); valores.append(val)
+        with LectorSerial(ser) as lector:
+            while (time.time() - t0) < duracion:
+                cols, _ = parser.alimentar(lector.leer())
+                n = len(cols["t"])
+                if not n:
+                    continue
+                t_dev, t_host = tiempos_de_bloque(reloj, cols["t"], time.time() - t0)
+                if t_dev0 is None:
+                    t_dev0 = t_dev[0]
+                buf.agregar_bloque({"timestamp_s": t_dev - t_dev0, COL_T_HOST: t_host,
+                                    nombre_col: cols[campo], col_emg: cols["emg_env"]})
         # finalizar
         ser.write(b"e")
     except Exception as e:
@@ -368,10 +386,9 @@ def capture_from_arduino(cmd, nombre_col, duracion):
         except:
             pass
 
-    # construir DataFrame compatible
-    df = pd.DataFrame({c: [1]*len(valores) for c in COLS})
-    df["timestamp_s"] = timestamps
-    df[nombre_col] = valores
+    # DataFrame solo con los canales medidos (vistas del buffer, sin copia)
+    df = buf.a_dataframe()
+    df.attrs["reloj"] = reloj.estadisticas()
     result_queue.put(("ok", cmd, nombre_col, df))
 
 # ---------- handlers de botones (iniciar/detener/siguiente) ----------
@@ -427,8 +444,7 @@ def on_exam_start_stop():
 
         t = threading.Thread(target=capture_from_arduino, args=(cmd, nombre_col, dur), daemon=True)
         t.start()
-        # arrancar chequeo de resultados
-        app.after(200, check_result_queue)
+        # los resultados los recoge check_result_queue (corre desde el inicio)
     else:
         # Si está adquiriendo, informamos (no implementamos stop prematuro)
         messagebox.showinfo("En curso", "La captura está diseñada para durar la duración indicada.\nEspera a que termine.")
@@ -441,7 +457,7 @@ def on_exam_next():
     # si estamos en el último ejercicio: finalizar sesión y guardar
     is_last = (current_ex_idx == len(exam_exercises)-1)
     if is_last:
-        # guardar sesión (usar funciones del módulo excel)
+        # guardar sesión en segundo plano (el aviso llega por result_queue)
         try:
             save_session_and_notify()
         except Exception as e:
@@ -464,6 +480,10 @@ def check_result_queue():
         return
 
     status, cmd, nombre_col, payload = msg
+    if status in ("guardando", "guardado", "error_guardado"):
+        on_save_result(status, nombre_col, payload)
+        app.after(50, check_result_queue)
+        return
     if status == "ok":
         df = payload
         session_dfs.append(df)
@@ -512,29 +532,78 @@ def start_exam(kind, ej_list):
                 ExamState.FULL:"Examen completo"}.get(current_exam,"Examen"))
 
 # ---------- guardar la sesión en Excel (usa tus utilidades) ----------
+# El guardado corre en un hilo aparte (uno solo, así dos sesiones seguidas
+# del mismo paciente no pisan su manifiesto) y avisa por result_queue:
+#   ("guardando", None, hoja, texto)          progreso
+#   ("guardado", None, hoja, (hoja, ruta, en_cola, cedula))
+#                                             listo (ruta None: no se exportó
+#                                             o, con en_cola, Excel abierto)
+#   ("error_guardado", None, hoja, mensaje)
+save_queue = Queue()
+
 def save_session_and_notify():
     """
-    Concatena session_dfs y crea la hoja en Excel usando tus funciones existentes:
-    abrir_o_crear_xlsx, asegurar_inicio_simple, escribir_sesion
+    Encola la sesión actual para guardarla en segundo plano y deja
+    session_dfs vacío: el siguiente examen puede empezar enseguida.
     """
+    global session_dfs
     if not session_dfs:
         raise RuntimeError("No hay capturas para guardar.")
-    # concatenar
-    df_final = pd.concat(session_dfs, ignore_index=True)
-
-    # crear ruta (seguimos tu convención MAIN_DIR/paciente/EXCEL_NAME)
-    # si preferiste definir MAIN_DIR y EXCEL_NAME en tu módulo original, mantenlos ahí
-    from principal import MAIN_DIR as ORIG_MAIN_DIR, EXCEL_NAME as ORIG_EXCEL_NAME
-    ruta_xlsx = ORIG_MAIN_DIR / current_session_patient / ORIG_EXCEL_NAME
-
-    wb = abrir_o_crear_xlsx(ruta_xlsx)
-    asegurar_inicio_simple(wb)
-    ts = time.localtime()
-    hoja_nombre = f"sesion_{time.strftime('%Y-%m-%d_%H-%M-%S', ts)}"[:31]
-    table_name = f"TablaDatos_{time.strftime('%H%M%S', ts)}"
-    hoja_final = escribir_sesion(wb, hoja_nombre, df_final, table_name)
-    wb.save(ruta_xlsx)
-    messagebox.showinfo("Guardado", f"Sesión guardada en: {ruta_xlsx}\nHoja: {hoja_final}")
+
+    # seguimos tu convención MAIN_DIR/paciente/ (manifiesto, sesiones/ y EXCEL_NAME)
+    carpeta_paciente = ORIG_MAIN_DIR / current_session_patient
+
+    ts, hoja_nombre, table_name = ahora_nombres()
+    save_queue.put((session_dfs, carpeta_paciente, ts, hoja_nombre, table_name))
+    session_dfs = []
+    set_status(f"guardando {hoja_nombre}...")
+
+def save_worker():
+    """
+    Hilo de guardado: guarda las capturas de la sesión en el almacén del
+    paciente (almacen.guardar_sesion, solo esta sesión) y, con
+    EXPORTAR_AL_GUARDAR, regenera Lecturas.xlsx (o lo deja en cola si está
+    abierto).
+    """
+    from almacen import guardar_sesion   # pandas: ya precargado al llegar aquí
+
+    while True:
+        dfs, carpeta_paciente, ts, hoja_nombre, table_name = save_queue.get()
+        try:
+            # solo los canales medidos; la hoja densa se arma al exportar
+            result_queue.put(("guardando", None, hoja_nombre, "guardando en el almacén"))
+            hoja_final = guardar_sesion(carpeta_paciente, dfs, ts, hoja_nombre, table_name,
+                                        disposicion="filas")
+            del dfs
+            ruta_xlsx = en_cola = None
+            if EXPORTAR_AL_GUARDAR:
+                result_queue.put(("guardando", None, hoja_nombre, "actualizando Excel"))
+                ruta_xlsx = exportar_o_encolar(carpeta_paciente, hoja_final)
+                en_cola = ruta_xlsx is None
+            result_queue.put(("guardado", None, hoja_nombre, (hoja_final, ruta_xlsx, en_cola,
+                                                             carpeta_paciente.name)))
+        except Exception as e:
+            result_queue.put(("error_guardado", None, hoja_nombre, str(e)))
+
+def on_save_result(status, hoja_nombre, payload):
+    if status == "guardando":
+        set_status(f"guardando {hoja_nombre}: {payload}...")
+    elif status == "guardado":
+        hoja_final, ruta_xlsx, en_cola, cedula = payload
+        if ruta_xlsx is None and not en_cola:
+            set_status(f"sesión {hoja_final} guardada")
+            messagebox.showinfo("Guardado", f"Sesión guardada en el almacén ({hoja_final}).\n"
+                                f"Excel: python almacen.py exportar {cedula}")
+        elif ruta_xlsx is None:
+            set_status(f"sesión {hoja_final} guardada; Excel en cola")
+            messagebox.showinfo("Guardado", f"Sesión guardada ({hoja_final}). El Excel está abierto: "
+                                "se actualizará solo cuando lo cierres.")
+        else:
+            set_status(f"sesión {hoja_final} guardada")
+            messagebox.showinfo("Guardado", f"Sesión guardada en: {ruta_xlsx}\nHoja: {hoja_final}")
+    else:
+        set_status(f"error guardando {hoja_nombre}")
+        messagebox.showerror("Error guardando", f"Ocurrió un error guardando: {payload}")
 
 # ---------- atajos pantalla ----------
 is_fullscreen = False
@@ -554,5 +623,10 @@ app.bind("<F11>", toggle_fullscreen)
 app.bind("<Escape>", exit_fullscreen)
 
 # ---------- inicio ----------
+# los Excel que quedaron en cola (estaban abiertos) se exportan en segundo plano
+precargar()
+TrabajadorCola(ORIG_MAIN_DIR).start()
+threading.Thread(target=save_worker, daemon=True).start()
 show_menu()
+app.after(200, check_result_queue)
 app.mainloop()
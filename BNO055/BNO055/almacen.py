@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+Almacén por paciente: un archivo .npz por sesión + un manifiesto.
+
+    PacienteData/<cedula>/
+        manifiesto.json         lista de sesiones (hoja, fecha, columnas...)
+        sesiones/<hoja>.npz     solo los canales medidos, por ejercicio
+                                (ver sesion.py)
+        Lecturas.xlsx           exportación (se regenera desde el almacén)
+
+Guardar una sesión escribe solo su archivo y el manifiesto (O(sesión)),
+sin abrir ni reescribir el Excel con todo el historial. Lecturas.xlsx pasa
+a ser una exportación: se genera cuando se pide, desde el almacén. La
+primera vez que se usa el almacén de un paciente que ya tenía Excel, sus
+hojas sesion_* se importan para no perder el historial.
+
+Los .npz van en formato compacto (sesion.codificar: float32, tiempos
+como enteros en diferencias, comprimidos), exactos a los decimales que
+se muestran.
+
+Exportar a mano / rehacer la hoja Inicio de un libro / pasar Excel
+existentes al almacén compacto (con informe de tamaño y tiempo de carga):
+    python almacen.py exportar <cedula> [<cedula> ...] [--forzar]
+    python almacen.py inicio <ruta/Lecturas.xlsx> [...]
+    python almacen.py archivar <cedula | ruta/Lecturas.xlsx> [...]
+"""
+
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from catalogo import indexar_sesion
+from lector_xlsx import LectorLibro
+from sesion import tramos_de_capturas, columnas_de, filas_densas, densificar, escribir_npz, leer_npz
+
+# ===================== CONFIG =====================
+
+MANIFIESTO = "manifiesto.json"
+CARPETA_SESIONES = "sesiones"
+EXCEL_NAME = "Lecturas.xlsx"
+VERSION = 2     # 2: sesiones dispersas (tramos por ejercicio)
+COMPACTO = True # False: .npz sin comprimir, float64 (más rápido de escribir)
+
+# ===================== MANIFIESTO =====================
+
+def _ruta_manifiesto(carpeta_paciente):
+    return Path(carpeta_paciente) / MANIFIESTO
+
+
+def leer_manifiesto(carpeta_paciente):
+    ruta = _ruta_manifiesto(carpeta_paciente)
+    if not ruta.exists():
+        return {"version": VERSION, "sesiones": []}
+    return json.loads(ruta.read_text(encoding="utf-8"))
+
+
+def _escribir_manifiesto(carpeta_paciente, man):
+    ruta = _ruta_manifiesto(carpeta_paciente)
+    tmp = ruta.with_suffix(".tmp")
+    tmp.write_text(json.dumps(man, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, ruta)
+
+
+def listar_sesiones(carpeta_paciente):
+    """Entradas del manifiesto, de la más vieja a la más nueva."""
+    return leer_manifiesto(carpeta_paciente)["sesiones"]
+
+# ===================== SESIONES =====================
+
+def _hoja_unica(hoja, existentes):
+    """Mismo criterio que escribir_sesion para no repetir nombres."""
+    if hoja not in existentes:
+        return hoja
+    base, i = hoja, 2
+    while hoja in existentes:
+        hoja = (base[:28] + f"_{i}")[:31]
+        i += 1
+    return hoja
+
+
+def _escribir_npz(ruta, tramos, disposicion):
+    tmp = ruta.with_name(ruta.stem + ".tmp.npz")
+    escribir_npz(tmp, tramos, disposicion, COMPACTO)
+    os.replace(tmp, ruta)
+
+
+def _entrada(hoja, ts, table_name, archivo, tramos, disposicion):
+    return {
+        "hoja": hoja,
+        "fecha": ts.isoformat(timespec="seconds"),
+        "table_name": table_name,
+        "archivo": archivo,
+        "filas": filas_densas(tramos, disposicion),
+        "columnas": columnas_de(tramos),
+        "tramos": [len(t) for t in tramos],
+        "disposicion": disposicion,
+    }
+
+
+def guardar_sesion(carpeta_paciente, capturas, ts, hoja, table_name, examen=None,
+                   disposicion="columnas"):
+    """Guarda una sesión en el almacén. Devuelve el nombre de hoja final.
+
+    `capturas` es la lista de DataFrames por ejercicio (o un DataFrame ya
+    unido); se guardan solo los canales con datos de cada uno. `disposicion`
+    indica cómo se arma la hoja densa al exportar (ver sesion.py).
+
+    Primero el .npz (escritura atómica) y luego el manifiesto, así un corte
+    a mitad deja como mucho un archivo huérfano, nunca un manifiesto roto.
+    Al final se registra en el catálogo SQLite (si falla, la sesión ya está
+    guardada y `python catalogo.py indexar` la recoge después).
+    """
+    carpeta = Path(carpeta_paciente)
+    asegurar_almacen(carpeta)
+    man = leer_manifiesto(carpeta)
+    hoja = _hoja_unica(hoja, {s["hoja"] for s in man["sesiones"]})
+
+    tramos = tramos_de_capturas(capturas)
+    (carpeta / CARPETA_SESIONES).mkdir(parents=True, exist_ok=True)
+    archivo = f"{CARPETA_SESIONES}/{hoja}.npz"
+    _escribir_npz(carpeta / archivo, tramos, disposicion)
+
+    entrada = _entrada(hoja, ts, table_name, archivo, tramos, disposicion)
+    entrada["examen"] = examen
+    man["sesiones"].append(entrada)
+    man["version"] = VERSION
+    _escribir_manifiesto(carpeta, man)
+
+    try:
+        indexar_sesion(carpeta, hoja, ts, tramos, examen, carpeta / archivo, entrada["filas"])
+    except Exception as e:
+        print(f"⚠️ No se pudo actualizar el catálogo: {e}", file=sys.stderr)
+    return hoja
+
+
+def _buscar(carpeta_paciente, entrada):
+    if isinstance(entrada, str):
+        entrada = next(s for s in listar_sesiones(carpeta_paciente) if s["hoja"] == entrada)
+    return entrada
+
+
+def leer_tramos(carpeta_paciente, entrada, columnas=None):
+    """(tramos, disposicion) de una sesión: solo lo medido, sin densificar."""
+    entrada = _buscar(carpeta_paciente, entrada)
+    return leer_npz(Path(carpeta_paciente) / entrada["archivo"], columnas)
+
+
+def leer_sesion(carpeta_paciente, entrada, columnas=None):
+    """DataFrame denso de una sesión (entrada del manifiesto o nombre de
+    hoja), con NaN donde un ejercicio no midió. Con `columnas` sale con
+    esas columnas, en ese orden, y solo se leen esas del archivo."""
+    entrada = _buscar(carpeta_paciente, entrada)
+    tramos, disposicion = leer_tramos(carpeta_paciente, entrada, columnas)
+    df = densificar(tramos, disposicion, columnas)
+    df.attrs["sesion"] = entrada
+    return df
+
+# ===================== IMPORTAR EXCEL EXISTENTE =====================
+
+def _fecha_de_hoja(hoja, respaldo):
+    m = re.match(r"sesion_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})", hoja)
+    if m:
+        return datetime.strptime(m.group(1), "%Y-%m-%d_%H-%M-%S")
+    return respaldo
+
+
+def importar_xlsx(carpeta_paciente, ruta_xlsx=None):
+    """Pasa al almacén las hojas sesion_* de un Lecturas.xlsx que aún no
+    estén en el manifiesto. Devuelve cuántas importó."""
+    carpeta = Path(carpeta_paciente)
+    ruta_xlsx = Path(ruta_xlsx) if ruta_xlsx else carpeta / EXCEL_NAME
+    man = leer_manifiesto(carpeta)
+    ya = {s["hoja"] for s in man["sesiones"]}
+    respaldo = datetime.fromtimestamp(ruta_xlsx.stat().st_mtime)
+
+    nuevas = 0
+    (carpeta / CARPETA_SESIONES).mkdir(parents=True, exist_ok=True)
+    with LectorLibro(ruta_xlsx) as lib:
+        for hoja in lib.sesiones():
+            if hoja in ya:
+                continue
+            tramos = tramos_de_capturas(lib.hoja(hoja))
+            ts = _fecha_de_hoja(hoja, respaldo)
+            archivo = f"{CARPETA_SESIONES}/{hoja}.npz"
+            _escribir_npz(carpeta / archivo, tramos, "columnas")
+            table_name = re.sub(r"[^A-Za-z0-9_]", "_", f"TablaDatos_{ts.strftime('%H%M%S')}")[:31]
+            entrada = _entrada(hoja, ts, table_name, archivo, tramos, "columnas")
+            entrada["importada"] = True
+            man["sesiones"].append(entrada)
+            nuevas += 1
+    man["importado_xlsx"] = True
+    _escribir_manifiesto(carpeta, man)
+    return nuevas
+
+
+def asegurar_almacen(carpeta_paciente):
+    """La primera vez, importa el Lecturas.xlsx que hubiera."""
+    carpeta = Path(carpeta_paciente)
+    if leer_manifiesto(carpeta).get("importado_xlsx"):
+        return
+    carpeta.mkdir(parents=True, exist_ok=True)
+    if (carpeta / EXCEL_NAME).exists():
+        importar_xlsx(carpeta)
+    else:
+        man = leer_manifiesto(carpeta)
+        man["importado_xlsx"] = True
+        _escribir_manifiesto(carpeta, man)
+
+# ===================== EXPORTAR EXCEL =====================
+
+def hojas_ajenas(carpeta_paciente, ruta_xlsx=None):
+    """Hojas de un Lecturas.xlsx existente que exportar_xlsx perdería:
+    (sesion_* que no están en el manifiesto, otras hojas con datos).
+    Inicio no cuenta (se rehace) ni las hojas vacías."""
+    from openpyxl import load_workbook
+
+    carpeta = Path(carpeta_paciente)
+    ruta_xlsx = Path(ruta_xlsx) if ruta_xlsx else carpeta / EXCEL_NAME
+    if not ruta_xlsx.exists():
+        return [], []
+    conocidas = {s["hoja"] for s in listar_sesiones(carpeta)} | {"Inicio"}
+    sesiones, otras = [], []
+    wb = load_workbook(ruta_xlsx, read_only=True)
+    try:
+        for hoja in wb.sheetnames:
+            if hoja in conocidas:
+                continue
+            if hoja.startswith("sesion_"):
+                sesiones.append(hoja)
+            elif any(v is not None for fila in wb[hoja].iter_rows(values_only=True) for v in fila):
+                otras.append(hoja)
+    finally:
+        wb.close()
+    return sesiones, otras
+
+
+def exportar_xlsx(carpeta_paciente, ruta_xlsx=None, columnas=None, forzar=False):
+    """Regenera Lecturas.xlsx (Inicio + una hoja por sesión) desde el almacén.
+
+    El libro es write_only: cada sesión se lee del almacén, se vuelca fila
+    a fila al archivo y se suelta, así la memoria no crece con el historial.
+    Se escribe en un temporal y se reemplaza al final: si el Excel está
+    abierto falla con PermissionError y el anterior queda intacto.
+
+    Antes de reemplazarlo se miran sus hojas (hojas_ajenas): las sesion_*
+    que el almacén no tiene se importan primero, y si hay otras hojas con
+    datos (notas a mano, gráficos) se rechaza con ValueError salvo con
+    `forzar`. Lo editado a mano dentro de las hojas de sesión se pierde
+    (es una exportación).
+    """
+    # Se importa aquí: principal importa este módulo
+    from openpyxl import Workbook
+    from principal import COLS, resumen_inicio, escribir_inicio_stream, escribir_sesion_stream
+
+    carpeta = Path(carpeta_paciente)
+    asegurar_almacen(carpeta)
+    ruta_xlsx = Path(ruta_xlsx) if ruta_xlsx else carpeta / EXCEL_NAME
+    columnas = COLS if columnas is None else columnas
+
+    if not forzar:
+        sesiones, otras = hojas_ajenas(carpeta, ruta_xlsx)
+        if otras:
+            raise ValueError(f"{ruta_xlsx} tiene hojas que no vienen del almacén y se perderían: "
+                             f"{', '.join(otras)} (guárdalas aparte o exporta con --forzar)")
+        if sesiones:
+            importar_xlsx(carpeta, ruta_xlsx)
+
+    wb = Workbook(write_only=True)
+    filas, filas_emg = [], []
+    tablas = set()
+    for s in listar_sesiones(carpeta):
+        df = leer_sesion(carpeta, s, columnas)
+        table_name = _hoja_unica(s["table_name"], tablas)
+        tablas.add(table_name)
+        escribir_sesion_stream(wb, s["hoja"], df, table_name)
+        f, f_emg = resumen_inicio(datetime.fromisoformat(s["fecha"]), df)
+        filas += f
+        if f_emg is not None:
+            filas_emg.append(f_emg)
+    escribir_inicio_stream(wb, filas, filas_emg)
+
+    tmp = ruta_xlsx.with_name("~tmp_" + ruta_xlsx.name)
+    wb.save(tmp)
+    os.replace(tmp, ruta_xlsx)
+    return ruta_xlsx
+
+# ===================== ARCHIVAR =====================
+
+def compactar(carpeta_paciente):
+    """Reescribe en formato compacto las sesiones del almacén que no lo
+    estén (p.ej. de versiones anteriores). Devuelve cuántas reescribió."""
+    carpeta = Path(carpeta_paciente)
+    n = 0
+    for s in listar_sesiones(carpeta):
+        ruta = carpeta / s["archivo"]
+        with np.load(ruta) as z:
+            if "indice" in z.files and "codificacion" in json.loads(str(z["indice"])):
+                continue
+        tramos, disposicion = leer_npz(ruta)
+        _escribir_npz(ruta, tramos, disposicion)
+        n += 1
+    return n
+
+
+def tamano_almacen(carpeta_paciente):
+    carpeta = Path(carpeta_paciente)
+    archivos = [carpeta / MANIFIESTO] + [carpeta / s["archivo"] for s in listar_sesiones(carpeta)]
+    return sum(a.stat().st_size for a in archivos if a.exists())
+
+
+def informe_archivo(carpeta_paciente, ruta_xlsx=None):
+    """Tamaño y tiempo de carga de todas las sesiones: Excel vs almacén."""
+    from lector_xlsx import limpiar_cache
+    carpeta = Path(carpeta_paciente)
+    ruta_xlsx = Path(ruta_xlsx) if ruta_xlsx else carpeta / EXCEL_NAME
+    inf = {"sesiones": len(listar_sesiones(carpeta)), "almacen_bytes": tamano_almacen(carpeta)}
+
+    t0 = time.perf_counter()
+    for s in listar_sesiones(carpeta):
+        leer_tramos(carpeta, s)
+    inf["t_almacen_s"] = time.perf_counter() - t0
+
+    if ruta_xlsx.exists():
+        inf["xlsx_bytes"] = ruta_xlsx.stat().st_size
+        limpiar_cache()
+        t0 = time.perf_counter()
+        with LectorLibro(ruta_xlsx) as lib:
+            for h in lib.sesiones():
+                lib.columnas(h)
+        inf["t_xlsx_s"] = time.perf_counter() - t0
+        limpiar_cache()
+    return inf
+
+
+def archivar(carpeta_paciente, ruta_xlsx=None):
+    """Pasa al almacén compacto las sesiones de un Lecturas.xlsx existente
+    (las que falten) y compacta las que ya estaban. Devuelve el informe."""
+    carpeta = Path(carpeta_paciente)
+    ruta_xlsx = Path(ruta_xlsx) if ruta_xlsx else carpeta / EXCEL_NAME
+    if ruta_xlsx.exists():
+        importar_xlsx(carpeta, ruta_xlsx)
+    else:
+        asegurar_almacen(carpeta)
+    compactar(carpeta)
+    return informe_archivo(carpeta, ruta_xlsx)
+
+
+def _kb(n):
+    return f"{n / 1024:.1f} KB"
+
+# ===================== MAIN =====================
+
+def reconstruir_inicio_xlsx(ruta_xlsx):
+    """Rehace la hoja Inicio de un Lecturas.xlsx cualquiera (también los que
+    no vienen del almacén, como los de la app Qt) desde sus hojas sesion_*."""
+    from openpyxl import load_workbook
+    from principal import reconstruir_inicio
+    wb = load_workbook(ruta_xlsx)
+    reconstruir_inicio(wb)
+    wb.save(ruta_xlsx)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) >= 2 and argv[0] == "inicio":
+        for ruta in argv[1:]:
+            reconstruir_inicio_xlsx(ruta)
+            print(f"✅ Inicio reconstruido: {ruta}")
+        return 0
+    if len(argv) < 2 or argv[0] not in ("exportar", "archivar"):
+        print(__doc__)
+        return 2
+    from principal import MAIN_DIR
+    if argv[0] == "archivar":
+        for arg in argv[1:]:
+            ruta = Path(arg)
+            carpeta, ruta_xlsx = (ruta.parent, ruta) if ruta.suffix == ".xlsx" else (MAIN_DIR / arg, None)
+            inf = archivar(carpeta, ruta_xlsx)
+            linea = f"✅ {carpeta.name}: {inf['sesiones']} sesiones, almacén {_kb(inf['almacen_bytes'])}"
+            if "xlsx_bytes" in inf:
+                linea += (f" vs xlsx {_kb(inf['xlsx_bytes'])} ({inf['xlsx_bytes'] / inf['almacen_bytes']:.1f}x);"
+                          f" carga {inf['t_almacen_s'] * 1e3:.1f} ms vs {inf['t_xlsx_s'] * 1e3:.1f} ms"
+                          f" ({inf['t_xlsx_s'] / max(inf['t_almacen_s'], 1e-9):.0f}x)")
+            print(linea)
+        return 0
+    forzar = "--forzar" in argv
+    codigo = 0
+    for ced in [a for a in argv[1:] if a != "--forzar"]:
+        try:
+            ruta = exportar_xlsx(MAIN_DIR / ced, forzar=forzar)
+        except ValueError as e:
+            print(f"❌ {e}")
+            codigo = 1
+            continue
+        print(f"✅ {ruta} ({len(listar_sesiones(MAIN_DIR / ced))} sesiones)")
+    return codigo
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de las etapas de captura y guardado, sin hardware.
+
+Mide tiempo (mínimo y mediana de varias repeticiones) y pico de memoria
+(tracemalloc, en una corrida aparte) de:
+    parser      bucle de captura: ParserTramas / DecodificadorBinario +
+                reloj + BufferMuestras, con el flujo troceado como el puerto
+    union       unión de las capturas por ejercicio (principal.unir_capturas),
+                por posición y alineada por tiempo
+    remuestreo  las capturas de la sesión a una rejilla de 100 Hz
+                (remuestreo.remuestrear_sesion, lineal)
+    emg         _emg_global_y_momentos
+    escribir    escribir_sesion sobre un libro nuevo
+    stream      escribir_sesion_stream + save en un libro write_only
+    resumen     anexar_resumen_inicio con un Inicio de N sesiones
+    guardar     wb.save de un libro con N sesiones
+    abrir       load_workbook del mismo libro (abrir_o_crear_xlsx)
+    arranque    arranque en frío de principal y python_script (intérprete
+                nuevo): hasta terminar `import` y hasta que el operador
+                puede escribir (menú / STATUS:READY); el pico de memoria es
+                el de la importación, y se anota qué módulos pesados
+                (precarga.PESADOS) quedaron cargados al importar
+
+Los datos son sintéticos (simulador.generar_df_prueba) y los libros crecen
+de 1 a 500 sesiones. El resultado se guarda en JSON y se puede comparar
+contra una línea base:
+    python benchmarks.py [--completo] [--salida res.json] [--comparar base.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+from principal import (
+    EJERCICIOS, EMG_DE, abrir_o_crear_xlsx, asegurar_inicio_simple,
+    anexar_resumen_inicio, escribir_sesion, escribir_sesion_stream, _emg_global_y_momentos,
+    unir_capturas,
+)
+from muestras import BufferMuestras
+from precarga import PESADOS
+from remuestreo import remuestrear_sesion
+from reloj import ModeloReloj, COL_T_HOST, tiempos_de_bloque
+from simulador import ArduinoSimulado, generar_df_prueba, HZ_TEXTO
+from tramas import ParserTramas, DecodificadorBinario, CAMPO_POR_CMD
+
+# ===================== CONFIG =====================
+
+REPETICIONES = 3
+TROZO_BYTES = 1024          # lo que suele haber en in_waiting por lectura
+TOLERANCIA = 0.20           # +20 % sobre la línea base = regresión
+
+# (duraciones de captura en s, tamaños de libro en sesiones, s por sesión del libro)
+PRESETS = {
+    "rapido":   ([10, 60, 600], [1, 10, 50], 60),
+    "completo": ([10, 60, 600, 3600], [1, 10, 100, 500], 60),
+}
+
+# ===================== MEDICIÓN =====================
+
+def medir(fn, repeticiones=REPETICIONES):
+    """Tiempo de `fn()` (sin tracemalloc) y pico de memoria en otra corrida."""
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "t_min_s": min(tiempos),
+        "t_mediana_s": statistics.median(tiempos),
+        "pico_mb": pico / 2**20,
+    }
+
+
+def _registro(etapa, parametros, medida):
+    return {"etapa": etapa, "parametros": parametros, **medida}
+
+# ===================== ETAPAS =====================
+
+def _trozos(flujo, tam=TROZO_BYTES):
+    return [flujo[i:i + tam] for i in range(0, len(flujo), tam)]
+
+
+def bucle_captura(trozos, binario, nombre_col, cmd="1"):
+    """Mismo trabajo por bloque que capturar_rom_desde_arduino (sin puerto)."""
+    parser = DecodificadorBinario() if binario else ParserTramas()
+    campo = CAMPO_POR_CMD[cmd]
+    col_emg = EMG_DE[nombre_col]
+    buf = BufferMuestras(["timestamp_s", COL_T_HOST, nombre_col, col_emg])
+    reloj = ModeloReloj()
+    t_dev0 = None
+    for i, datos in enumerate(trozos):
+        cols, _ = parser.alimentar(datos)
+        if not len(cols["t"]):
+            continue
+        t_dev, t_host = tiempos_de_bloque(reloj, cols["t"], i * 0.01)
+        if t_dev0 is None:
+            t_dev0 = t_dev[0]
+        buf.agregar_bloque({"timestamp_s": t_dev - t_dev0, COL_T_HOST: t_host,
+                            nombre_col: cols[campo], col_emg: cols["emg_env"]})
+    return buf.a_dataframe()
+
+
+def capturas_por_ejercicio(df):
+    """Divide una sesión densa en las capturas de cada ejercicio, como las
+    devuelve la captura (tiempo, t_host, columna y su EMG)."""
+    capturas = []
+    for _, col in EJERCICIOS:
+        t = df["timestamp_s"].to_numpy()
+        capturas.append(pd.DataFrame({
+            "timestamp_s": t, COL_T_HOST: t, col: df[col].to_numpy(),
+            EMG_DE[col]: df[EMG_DE[col]].to_numpy(),
+        }))
+    return capturas
+
+
+def bench_captura(duraciones, hz, repeticiones):
+    out = []
+    nombre_col = EJERCICIOS[0][1]
+    for dur in duraciones:
+        n = int(dur * hz)
+        for binario in (False, True):
+            flujo = ArduinoSimulado(hz=hz).volcado("1", n, binario=binario)
+            trozos = _trozos(flujo)
+            m = medir(lambda: bucle_captura(trozos, binario, nombre_col), repeticiones)
+            out.append(_registro("parser", {"duracion_s": dur, "hz": hz,
+                                            "binario": binario, "bytes": len(flujo)}, m))
+
+        df = generar_df_prueba(n, hz)
+        capturas = capturas_por_ejercicio(df)
+        out.append(_registro("union", {"duracion_s": dur, "hz": hz},
+                             medir(lambda: unir_capturas(capturas), repeticiones)))
+        out.append(_registro("union", {"duracion_s": dur, "hz": hz, "modo": "tiempo"},
+                             medir(lambda: unir_capturas(capturas, "tiempo"), repeticiones)))
+        out.append(_registro("remuestreo", {"duracion_s": dur, "hz": hz, "hz_rejilla": 100},
+                             medir(lambda: remuestrear_sesion(capturas, 100), repeticiones)))
+        out.append(_registro("emg", {"duracion_s": dur, "hz": hz},
+                             medir(lambda: _emg_global_y_momentos(df), repeticiones)))
+
+        def escribir():
+            wb = openpyxl.Workbook()
+            escribir_sesion(wb, "sesion_bench", df, "TablaDatos_bench")
+        out.append(_registro("escribir", {"duracion_s": dur, "hz": hz},
+                             medir(escribir, repeticiones)))
+
+        def escribir_stream():
+            wb = openpyxl.Workbook(write_only=True)
+            escribir_sesion_stream(wb, "sesion_bench", df, "TablaDatos_bench")
+            wb.save(Path(tempfile.gettempdir()) / "bench_stream.xlsx")
+        out.append(_registro("stream", {"duracion_s": dur, "hz": hz},
+                             medir(escribir_stream, repeticiones)))
+    return out
+
+
+def bench_libro(tamanos, hz, dur_sesion, repeticiones, carpeta):
+    """Hace crecer un libro sesión a sesión y mide en cada tamaño pedido.
+
+    `resumen` no es repetible sin cambiar el libro (cada llamada añade
+    filas a Inicio), así que cada repetición cuenta como una sesión más y
+    después se escriben sus hojas; el tamaño que se informa es el de antes
+    de la primera llamada.
+    """
+    out = []
+    df = generar_df_prueba(int(dur_sesion * hz), hz)
+    ruta = Path(carpeta) / "Lecturas.xlsx"
+    wb = openpyxl.Workbook()
+    asegurar_inicio_simple(wb)
+    ts = datetime(2025, 1, 1)
+    n_sesiones = 0
+
+    def agregar_sesion(resumen=True):
+        nonlocal n_sesiones
+        n_sesiones += 1
+        escribir_sesion(wb, f"sesion_{n_sesiones:05d}", df, f"TablaDatos_{n_sesiones}")
+        if resumen:
+            anexar_resumen_inicio(wb, ts, df)
+
+    for objetivo in sorted(tamanos):
+        while n_sesiones < objetivo:
+            agregar_sesion()
+        params = {"sesiones": n_sesiones, "duracion_s": dur_sesion, "hz": hz}
+        out.append(_registro("guardar", params, medir(lambda: wb.save(ruta), repeticiones)))
+        out.append(_registro("abrir", dict(params, tamano_mb=ruta.stat().st_size / 2**20),
+                             medir(lambda: abrir_o_crear_xlsx(ruta), repeticiones)))
+
+        out.append(_registro("resumen", params,
+                             medir(lambda: anexar_resumen_inicio(wb, ts, df), repeticiones)))
+        # Las hojas de las filas que acaba de dejar `resumen` en Inicio
+        for _ in range(repeticiones + 1):
+            agregar_sesion(resumen=False)
+    return out
+
+# ---------- arranque en frío ----------
+# Interfaz no entra: abre la ventana al importarse y necesita pantalla.
+
+AQUI = Path(__file__).resolve().parent
+ENTRADAS = {
+    # script -> texto que marca que el operador ya puede interactuar
+    "principal": "Elige una opción",
+    "python_script": "STATUS:READY",
+}
+
+
+def _importar_en_frio(modulo, memoria=False):
+    """(segundos, pico MB, módulos pesados cargados) de `import modulo` en
+    un intérprete nuevo. Con `memoria` se mide con tracemalloc (más lento)."""
+    codigo = (
+        "import sys, time, tracemalloc\n"
+        f"if {memoria}: tracemalloc.start()\n"
+        "t = time.perf_counter()\n"
+        f"import {modulo}\n"
+        "t = time.perf_counter() - t\n"
+        "pico = tracemalloc.get_traced_memory()[1] if tracemalloc.is_tracing() else 0\n"
+        f"print(t, pico, ','.join(m for m in {list(PESADOS)!r} if m in sys.modules))\n"
+    )
+    r = subprocess.run([sys.executable, "-c", codigo], cwd=AQUI, capture_output=True,
+                       text=True, check=True)
+    t, pico, *cargados = r.stdout.split()
+    return float(t), int(pico) / 2**20, (cargados[0].split(",") if cargados else [])
+
+
+def _hasta_listo(script, marca):
+    """Segundos desde lanzar `python script.py` hasta que muestra `marca`."""
+    t0 = time.perf_counter()
+    p = subprocess.Popen([sys.executable, "-u", f"{script}.py"], cwd=AQUI,
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    salida = b""
+    try:
+        while marca.encode() not in salida:
+            trozo = os.read(p.stdout.fileno(), 4096)
+            if not trozo:
+                raise RuntimeError(f"{script}.py terminó sin mostrar '{marca}'")
+            salida += trozo
+        return time.perf_counter() - t0
+    finally:
+        p.kill()
+        p.wait()
+
+
+def _medida(tiempos, pico_mb):
+    return {"t_min_s": min(tiempos), "t_mediana_s": statistics.median(tiempos), "pico_mb": pico_mb}
+
+
+def bench_arranque(repeticiones):
+    out = []
+    for script, marca in ENTRADAS.items():
+        _, pico, cargados = _importar_en_frio(script, memoria=True)
+        t_import = [_importar_en_frio(script)[0] for _ in range(repeticiones)]
+        out.append(_registro("arranque", {"entrada": script, "hasta": "import",
+                                          "pesados": ",".join(cargados) or "-"},
+                             _medida(t_import, pico)))
+        t_listo = [_hasta_listo(script, marca) for _ in range(repeticiones)]
+        out.append(_registro("arranque", {"entrada": script, "hasta": "listo"},
+                             _medida(t_listo, pico)))
+    return out
+
+# ===================== LÍNEA BASE =====================
+
+def _clave(r):
+    p = {k: v for k, v in r["parametros"].items() if k not in ("bytes", "tamano_mb", "pesados")}
+    return r["etapa"] + json.dumps(p, sort_keys=True)
+
+
+def comparar(resultados, base, tolerancia=TOLERANCIA):
+    """Imprime la razón actual/base por etapa (sobre el tiempo mínimo, el
+    menos sensible al ruido de la máquina). Devuelve las regresiones."""
+    previos = {_clave(r): r for r in base["resultados"]}
+    regresiones = []
+    print(f"\n{'etapa':<12}{'parámetros':<48}{'t base':>10}{'t ahora':>10}{'razón':>8}{'mem':>8}")
+    for r in resultados["resultados"]:
+        b = previos.get(_clave(r))
+        if b is None:
+            continue
+        razon = r["t_min_s"] / b["t_min_s"] if b["t_min_s"] else float("inf")
+        razon_mem = r["pico_mb"] / b["pico_mb"] if b["pico_mb"] else float("inf")
+        marca = ""
+        if razon > 1 + tolerancia:
+            marca = "  ⚠️ más lento"
+            regresiones.append(r)
+        params = json.dumps(r["parametros"], ensure_ascii=False)[:46]
+        print(f"{r['etapa']:<12}{params:<48}{b['t_min_s']:>10.4f}{r['t_min_s']:>10.4f}"
+              f"{razon:>8.2f}{razon_mem:>8.2f}{marca}")
+    return regresiones
+
+# ===================== MAIN =====================
+
+def ejecutar(preset="rapido", hz=HZ_TEXTO, repeticiones=REPETICIONES,
+             etapas=("captura", "libro", "arranque")):
+    duraciones, tamanos, dur_sesion = PRESETS[preset]
+    resultados = []
+    if "captura" in etapas:
+        resultados += bench_captura(duraciones, hz, repeticiones)
+    if "libro" in etapas:
+        with tempfile.TemporaryDirectory() as carpeta:
+            resultados += bench_libro(tamanos, hz, dur_sesion, repeticiones, carpeta)
+    if "arranque" in etapas:
+        resultados += bench_arranque(repeticiones)
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "preset": preset,
+            "repeticiones": repeticiones,
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "openpyxl": openpyxl.__version__,
+        },
+        "resultados": resultados,
+    }
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks de captura y guardado")
+    ap.add_argument("--completo", action="store_true",
+                    help="capturas de hasta 1 h y libros de hasta 500 sesiones")
+    ap.add_argument("--hz", type=float, default=HZ_TEXTO)
+    ap.add_argument("--repeticiones", type=int, default=REPETICIONES)
+    ap.add_argument("--etapas", nargs="+", choices=["captura", "libro", "arranque"],
+                    default=["captura", "libro", "arranque"])
+    ap.add_argument("--salida", default="resultados_benchmark.json")
+    ap.add_argument("--comparar", metavar="BASE_JSON")
+    ap.add_argument("--tolerancia", type=float, default=TOLERANCIA)
+    args = ap.parse_args(argv)
+
+    res = ejecutar("completo" if args.completo else "rapido", args.hz, args.repeticiones, args.etapas)
+
+    for r in res["resultados"]:
+        params = ", ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}"
+                           for k, v in r["parametros"].items())
+        print(f"{r['etapa']:<12}{params:<52}{r['t_mediana_s']*1e3:>10.1f} ms{r['pico_mb']:>9.1f} MB")
+
+    Path(args.salida).write_text(json.dumps(res, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"\n💾 Resultados en {args.salida}")
+
+    if args.comparar:
+        base = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        if comparar(res, base, args.tolerancia):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
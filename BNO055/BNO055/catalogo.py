@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Catálogo SQLite de todas las sesiones de PacienteData.
+
+    PacienteData/catalogo.sqlite
+        sesiones    una fila por sesión (cédula, fecha, examen, filas,
+                    extremos EMG, archivo de origen)
+        ejercicios  una fila por sesión y ejercicio (muestras, min/max del
+                    canal y de su EMG)
+
+Se actualiza en cada guardado (almacen.guardar_sesion) y se puede rellenar
+desde cero con los Lecturas.xlsx / almacenes que ya existen, en paralelo:
+    python catalogo.py indexar [--dir PacienteData] [--procesos N] [--forzar]
+    python catalogo.py sql "SELECT cedula, fecha FROM sesiones WHERE fecha >= '2025-03-01'"
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from lector_xlsx import LectorLibro
+# principal no carga nada pesado al importarse ni importa almacen (que
+# importa este módulo) salvo dentro de funciones: no hay ciclo
+from principal import EJERCICIOS, EMG_DE
+from sesion import canales, leer_npz, filas_densas
+
+# ===================== CONFIG =====================
+
+NOMBRE_DB = "catalogo.sqlite"
+EXCEL_NAME = "Lecturas.xlsx"
+MANIFIESTO = "manifiesto.json"
+
+# Examen según los ejercicios con datos (mismos grupos que menu_prueba_funcional)
+EXAMENES = {
+    frozenset({"Flexión/Extensión", "Desviación Ulnar/Radial", "Fuerza de Prensión"}): "Muñeca",
+    frozenset({"Flexión/Extensión", "Pronosupinación", "Fuerza de Prensión"}): "Codo",
+    frozenset(n for n, _ in EJERCICIOS): "Codo y Muñeca",
+}
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS sesiones (
+    id            INTEGER PRIMARY KEY,
+    cedula        TEXT NOT NULL,
+    hoja          TEXT NOT NULL,
+    fecha         TEXT NOT NULL,      -- ISO 8601, ordenable como texto
+    examen        TEXT,
+    filas         INTEGER,
+    emg_max       REAL,
+    emg_max_canal TEXT,
+    emg_min       REAL,
+    emg_min_canal TEXT,
+    archivo       TEXT,
+    origen        TEXT,               -- 'almacen' | 'xlsx'
+    mtime         REAL,
+    UNIQUE (cedula, hoja)
+);
+CREATE TABLE IF NOT EXISTS ejercicios (
+    sesion_id   INTEGER NOT NULL REFERENCES sesiones(id) ON DELETE CASCADE,
+    ejercicio   TEXT NOT NULL,
+    columna     TEXT,
+    muestras    INTEGER,
+    min         REAL,
+    max         REAL,
+    emg_columna TEXT,
+    emg_min     REAL,
+    emg_max     REAL,
+    PRIMARY KEY (sesion_id, ejercicio)
+);
+CREATE INDEX IF NOT EXISTS ix_sesiones_fecha ON sesiones(fecha);
+CREATE INDEX IF NOT EXISTS ix_sesiones_cedula ON sesiones(cedula, fecha);
+CREATE INDEX IF NOT EXISTS ix_ejercicios_ejercicio ON ejercicios(ejercicio);
+"""
+
+# ===================== CONEXIÓN =====================
+
+def conectar(ruta_db):
+    Path(ruta_db).parent.mkdir(parents=True, exist_ok=True)
+    con = sqlite3.connect(ruta_db, timeout=30)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA foreign_keys=ON")
+    con.executescript(ESQUEMA)
+    return con
+
+
+def ruta_catalogo(carpeta_paciente):
+    """El catálogo vive junto a las carpetas de pacientes."""
+    return Path(carpeta_paciente).parent / NOMBRE_DB
+
+# ===================== RESUMEN DE UNA SESIÓN =====================
+
+def _a_float(x):
+    return None if x is None or np.isnan(x) else float(x)
+
+
+def resumen_sesion(datos):
+    """(ejercicios, extremos EMG) de una sesión (DataFrame o tramos de
+    sesion.py), como registros para SQLite."""
+    por_canal = canales(datos)
+    ejercicios = []
+    emg_max = emg_min = (None, None)
+    for nombre, col in EJERCICIOS:
+        if col not in por_canal:
+            continue
+        serie = por_canal[col]
+        n = int(np.count_nonzero(~np.isnan(serie)))
+        if not n:
+            continue
+        col_emg = EMG_DE[col]
+        emg = por_canal.get(col_emg, np.full(1, np.nan))
+        hay_emg = bool(np.any(~np.isnan(emg)))
+        e_min = float(np.nanmin(emg)) if hay_emg else None
+        e_max = float(np.nanmax(emg)) if hay_emg else None
+        ejercicios.append((nombre, col, n, float(np.nanmin(serie)), float(np.nanmax(serie)),
+                           col_emg, e_min, e_max))
+        if e_max is not None and (emg_max[0] is None or e_max > emg_max[0]):
+            emg_max = (e_max, col_emg)
+        if e_min is not None and (emg_min[0] is None or e_min < emg_min[0]):
+            emg_min = (e_min, col_emg)
+    return ejercicios, emg_max, emg_min
+
+
+def inferir_examen(ejercicios):
+    return EXAMENES.get(frozenset(e[0] for e in ejercicios))
+
+
+def registro_sesion(cedula, hoja, ts, datos, examen=None, archivo=None, origen="almacen", mtime=None,
+                    filas=None):
+    ejercicios, emg_max, emg_min = resumen_sesion(datos)
+    return {
+        "cedula": cedula, "hoja": hoja, "fecha": ts.isoformat(timespec="seconds"),
+        "examen": examen or inferir_examen(ejercicios),
+        "filas": int(len(datos) if filas is None else filas),
+        "emg_max": emg_max[0], "emg_max_canal": emg_max[1],
+        "emg_min": emg_min[0], "emg_min_canal": emg_min[1],
+        "archivo": str(archivo) if archivo else None, "origen": origen, "mtime": mtime,
+        "ejercicios": ejercicios,
+    }
+
+# ===================== ESCRITURA =====================
+
+_COLS_SESION = ("cedula", "hoja", "fecha", "examen", "filas", "emg_max", "emg_max_canal",
+                "emg_min", "emg_min_canal", "archivo", "origen", "mtime")
+
+
+def _insertar(con, reg):
+    con.execute("DELETE FROM sesiones WHERE cedula = ? AND hoja = ?", (reg["cedula"], reg["hoja"]))
+    cur = con.execute(
+        f"INSERT INTO sesiones ({', '.join(_COLS_SESION)}) VALUES ({', '.join('?' * len(_COLS_SESION))})",
+        tuple(reg[c] for c in _COLS_SESION))
+    con.executemany("INSERT INTO ejercicios VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(cur.lastrowid, *e) for e in reg["ejercicios"]])
+
+
+def indexar_sesion(carpeta_paciente, hoja, ts, datos, examen=None, archivo=None, filas=None):
+    """Registra (o actualiza) una sesión recién guardada."""
+    carpeta = Path(carpeta_paciente)
+    mtime = os.path.getmtime(archivo) if archivo and os.path.exists(archivo) else None
+    reg = registro_sesion(carpeta.name, hoja, ts, datos, examen, archivo, "almacen", mtime, filas)
+    con = conectar(ruta_catalogo(carpeta))
+    try:
+        with con:
+            _insertar(con, reg)
+    finally:
+        con.close()
+
+# ===================== INDEXADO MASIVO =====================
+
+def _fecha_de_hoja(hoja, respaldo):
+    m = re.match(r"sesion_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})", hoja)
+    return datetime.strptime(m.group(1), "%Y-%m-%d_%H-%M-%S") if m else respaldo
+
+
+def fuente_paciente(carpeta):
+    """(origen, archivo) de donde leer un paciente: el almacén si existe,
+    si no su Lecturas.xlsx."""
+    carpeta = Path(carpeta)
+    if (carpeta / MANIFIESTO).exists():
+        return "almacen", carpeta / MANIFIESTO
+    if (carpeta / EXCEL_NAME).exists():
+        return "xlsx", carpeta / EXCEL_NAME
+    return None, None
+
+
+def registros_paciente(carpeta):
+    """Registros de todas las sesiones de un paciente. Corre en un proceso
+    aparte durante el indexado masivo (solo lee, no toca la base)."""
+    carpeta = Path(carpeta)
+    origen, archivo = fuente_paciente(carpeta)
+    regs = []
+    if origen == "almacen":
+        man = json.loads(archivo.read_text(encoding="utf-8"))
+        for s in man["sesiones"]:
+            npz = carpeta / s["archivo"]
+            tramos, disposicion = leer_npz(npz)
+            regs.append(registro_sesion(carpeta.name, s["hoja"], datetime.fromisoformat(s["fecha"]), tramos,
+                                        s.get("examen"), npz, origen, npz.stat().st_mtime,
+                                        filas_densas(tramos, disposicion)))
+    elif origen == "xlsx":
+        mtime = archivo.stat().st_mtime
+        with LectorLibro(archivo) as lib:
+            for hoja in lib.sesiones():
+                ts = _fecha_de_hoja(hoja, datetime.fromtimestamp(mtime))
+                regs.append(registro_sesion(carpeta.name, hoja, ts, lib.hoja(hoja),
+                                            None, archivo, origen, mtime))
+    return carpeta.name, regs
+
+
+def _al_dia(con, carpeta):
+    """True si el catálogo ya tiene este paciente con el mismo archivo/mtime."""
+    origen, archivo = fuente_paciente(carpeta)
+    if origen is None:
+        return True
+    fila = con.execute("SELECT MAX(mtime), COUNT(*) FROM sesiones WHERE cedula = ? AND origen = ?",
+                       (Path(carpeta).name, origen)).fetchone()
+    if not fila[1]:
+        return False
+    if origen == "xlsx":
+        return fila[0] == archivo.stat().st_mtime
+    man = json.loads(archivo.read_text(encoding="utf-8"))
+    return fila[1] == len(man["sesiones"])
+
+
+def indexar_todo(main_dir, procesos=None, forzar=False):
+    """Rellena el catálogo con todos los pacientes de `main_dir`.
+
+    La lectura de cada paciente (lo caro: abrir el xlsx) va en un pool de
+    procesos; la escritura en SQLite la hace solo este proceso, en una
+    transacción por paciente. Sin `forzar` se saltan los que no cambiaron.
+    """
+    main_dir = Path(main_dir)
+    con = conectar(main_dir / NOMBRE_DB)
+    try:
+        carpetas = [c for c in sorted(main_dir.iterdir()) if c.is_dir()]
+        pendientes = [c for c in carpetas if forzar or not _al_dia(con, c)]
+        n_sesiones = 0
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            for cedula, regs in pool.map(registros_paciente, pendientes):
+                with con:
+                    con.execute("DELETE FROM sesiones WHERE cedula = ?", (cedula,))
+                    for reg in regs:
+                        _insertar(con, reg)
+                n_sesiones += len(regs)
+                print(f"  {cedula}: {len(regs)} sesiones")
+        return len(pendientes), n_sesiones
+    finally:
+        con.close()
+
+# ===================== CONSULTAS =====================
+
+def sesiones(ruta_db, cedula=None, desde=None, hasta=None, examen=None, ejercicio=None):
+    """DataFrame de sesiones filtradas (fechas como 'AAAA-MM-DD' o datetime)."""
+    where, params = [], []
+    if cedula:
+        where.append("s.cedula = ?"); params.append(cedula)
+    if desde:
+        where.append("s.fecha >= ?"); params.append(str(desde)[:10])
+    if hasta:
+        where.append("s.fecha < date(?, '+1 day')"); params.append(str(hasta)[:10])
+    if examen:
+        where.append("s.examen = ?"); params.append(examen)
+    if ejercicio:
+        where.append("EXISTS (SELECT 1 FROM ejercicios e WHERE e.sesion_id = s.id AND e.ejercicio = ?)")
+        params.append(ejercicio)
+    sql = "SELECT s.* FROM sesiones s"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    con = sqlite3.connect(ruta_db)
+    try:
+        return pd.read_sql_query(sql + " ORDER BY s.fecha", con, params=params)
+    finally:
+        con.close()
+
+# ===================== MAIN =====================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Catálogo SQLite de PacienteData")
+    sub = ap.add_subparsers(dest="accion", required=True)
+    ix = sub.add_parser("indexar", help="rellena el catálogo con lo que ya existe")
+    ix.add_argument("--dir", help="carpeta PacienteData (por defecto la de principal.py)")
+    ix.add_argument("--procesos", type=int, default=None)
+    ix.add_argument("--forzar", action="store_true", help="reindexa también lo que no cambió")
+    q = sub.add_parser("sql", help="ejecuta una consulta y la muestra")
+    q.add_argument("consulta")
+    q.add_argument("--dir")
+    args = ap.parse_args(argv)
+
+    if args.dir:
+        main_dir = Path(args.dir)
+    else:
+        from principal import MAIN_DIR as main_dir
+
+    if args.accion == "indexar":
+        t0 = datetime.now()
+        n_pac, n_ses = indexar_todo(main_dir, args.procesos, args.forzar)
+        print(f"✅ {n_pac} pacientes, {n_ses} sesiones en {(datetime.now() - t0).total_seconds():.1f} s "
+              f"→ {main_dir / NOMBRE_DB}")
+        return 0
+
+    con = sqlite3.connect(main_dir / NOMBRE_DB)
+    try:
+        print(pd.read_sql_query(args.consulta, con).to_string(index=False))
+    finally:
+        con.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
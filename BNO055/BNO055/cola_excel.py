@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+"""
+Cola de exportaciones pendientes a Lecturas.xlsx.
+
+Si el Excel del paciente está abierto, exportar falla con PermissionError.
+La sesión ya quedó en el almacén (almacen.guardar_sesion), así que no se
+pierde nada: se anota al paciente en la cola y se sigue con el siguiente.
+
+    PacienteData/cola_excel/<cedula>.json
+        hojas pendientes, desde cuándo, intentos y último error
+
+Un hilo en segundo plano (TrabajadorCola) reintenta cada pocos segundos y,
+cuando el archivo se libera, regenera el Excel desde el almacén y borra la
+entrada. Reaplicar una entrada es inocuo: exportar_xlsx rehace el libro
+entero desde el almacén, así que si se corta entre exportar y borrar la
+entrada, la próxima pasada deja el mismo Excel.
+
+    python cola_excel.py estado [--dir PacienteData]
+    python cola_excel.py drenar [--dir PacienteData] [--esperar]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# ===================== CONFIG =====================
+
+CARPETA_COLA = "cola_excel"   # dentro de PacienteData/
+INTERVALO_S = 5.0             # cada cuánto reintenta el trabajador
+
+_lock = threading.Lock()       # entradas de la cola dentro de este proceso
+_exportando = threading.Lock() # una exportación a la vez (comparten ~tmp_)
+
+# ===================== ENTRADAS =====================
+
+def _ruta_cola(main_dir):
+    return Path(main_dir) / CARPETA_COLA
+
+
+def _ruta_entrada(carpeta_paciente):
+    carpeta = Path(carpeta_paciente)
+    return _ruta_cola(carpeta.parent) / f"{carpeta.name}.json"
+
+
+def _leer(ruta):
+    try:
+        return json.loads(Path(ruta).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _escribir(ruta, entrada):
+    """Escritura atómica y a disco: la entrada sobrevive a un corte."""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ruta.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entrada, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, ruta)
+
+
+def encolar(carpeta_paciente, hoja=None, error=None):
+    """Anota (o actualiza) la exportación pendiente de un paciente."""
+    ruta = _ruta_entrada(carpeta_paciente)
+    with _lock:
+        entrada = _leer(ruta) or {
+            "cedula": Path(carpeta_paciente).name,
+            "hojas": [],
+            "desde": datetime.now().isoformat(timespec="seconds"),
+            "seq": 0,
+            "intentos": 0,
+            "ultimo_error": None,
+        }
+        if hoja and hoja not in entrada["hojas"]:
+            entrada["hojas"].append(hoja)
+        entrada["seq"] += 1
+        if error is not None:
+            entrada["ultimo_error"] = error
+        _escribir(ruta, entrada)
+    return entrada
+
+
+def _quitar_si_igual(carpeta_paciente, seq):
+    """Borra la entrada solo si nadie la tocó mientras se exportaba
+    (si se encoló otra sesión, esa exportación puede no incluirla)."""
+    ruta = _ruta_entrada(carpeta_paciente)
+    with _lock:
+        entrada = _leer(ruta)
+        if entrada is not None and entrada["seq"] == seq:
+            ruta.unlink(missing_ok=True)
+
+
+def _anotar_fallo(carpeta_paciente, seq, error):
+    ruta = _ruta_entrada(carpeta_paciente)
+    with _lock:
+        entrada = _leer(ruta)
+        if entrada is None:
+            return
+        entrada["intentos"] += 1
+        entrada["ultimo_error"] = error
+        entrada["ultimo_intento"] = datetime.now().isoformat(timespec="seconds")
+        _escribir(ruta, entrada)
+
+
+def pendientes(main_dir):
+    """Entradas de la cola, de la más vieja a la más nueva."""
+    cola = _ruta_cola(main_dir)
+    if not cola.is_dir():
+        return []
+    entradas = [e for e in (_leer(r) for r in cola.glob("*.json")) if e is not None]
+    return sorted(entradas, key=lambda e: e["desde"])
+
+
+def pendiente(carpeta_paciente):
+    """La entrada de un paciente, o None si su Excel está al día."""
+    return _leer(_ruta_entrada(carpeta_paciente))
+
+# ===================== EXPORTAR =====================
+
+def exportar_o_encolar(carpeta_paciente, hoja=None):
+    """Regenera el Excel; si está abierto, lo deja en la cola.
+
+    Devuelve la ruta del xlsx, o None si quedó en cola. Otros errores
+    (no de bloqueo) se propagan como antes.
+    """
+    from almacen import exportar_xlsx   # pandas/openpyxl: solo al exportar
+
+    previa = pendiente(carpeta_paciente)
+    try:
+        with _exportando:
+            ruta_xlsx = exportar_xlsx(carpeta_paciente)
+    except PermissionError as e:
+        encolar(carpeta_paciente, hoja, error=str(e))
+        return None
+    if previa is not None:
+        _quitar_si_igual(carpeta_paciente, previa["seq"])
+    return ruta_xlsx
+
+
+def aplicar(main_dir, entrada):
+    """Intenta exportar un paciente de la cola. Devuelve la ruta o None."""
+    from almacen import exportar_xlsx
+
+    carpeta = Path(main_dir) / entrada["cedula"]
+    try:
+        with _exportando:
+            ruta_xlsx = exportar_xlsx(carpeta)
+    except PermissionError as e:
+        _anotar_fallo(carpeta, entrada["seq"], str(e))
+        return None
+    _quitar_si_igual(carpeta, entrada["seq"])
+    return ruta_xlsx
+
+
+def drenar(main_dir, al_exportar=None, al_fallar=None):
+    """Una pasada por toda la cola. Devuelve cuántas entradas quedan."""
+    for entrada in pendientes(main_dir):
+        try:
+            ruta_xlsx = aplicar(main_dir, entrada)
+        except Exception as e:
+            # un paciente con el almacén roto no frena al resto
+            _anotar_fallo(Path(main_dir) / entrada["cedula"], entrada["seq"], str(e))
+            if al_fallar:
+                al_fallar(entrada, e)
+            continue
+        if ruta_xlsx is not None and al_exportar:
+            al_exportar(entrada, ruta_xlsx)
+    return len(pendientes(main_dir))
+
+# ===================== TRABAJADOR =====================
+
+class TrabajadorCola(threading.Thread):
+    """Hilo que drena la cola cada `intervalo_s` segundos.
+
+    `al_exportar(entrada, ruta)` se llama cuando un Excel queda al día y
+    `al_fallar(entrada, error)` con errores que no son de bloqueo, ambos
+    desde este hilo. `despertar()` adelanta el siguiente intento (p.ej.
+    justo después de encolar).
+    """
+
+    def __init__(self, main_dir, intervalo_s=INTERVALO_S, al_exportar=None, al_fallar=None):
+        super().__init__(name="cola_excel", daemon=True)
+        self.main_dir = Path(main_dir)
+        self.intervalo_s = intervalo_s
+        self.al_exportar = al_exportar
+        self.al_fallar = al_fallar
+        self._despertar = threading.Event()
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                drenar(self.main_dir, self.al_exportar, self.al_fallar)
+            except Exception as e:
+                print(f"⚠️ Cola de Excel: {e}", file=sys.stderr)
+            self._despertar.wait(self.intervalo_s)
+            self._despertar.clear()
+
+    def despertar(self):
+        self._despertar.set()
+
+    def detener(self, timeout=None):
+        self._parar.set()
+        self._despertar.set()
+        self.join(timeout)
+
+# ===================== MAIN =====================
+
+def imprimir_estado(main_dir):
+    entradas = pendientes(main_dir)
+    if not entradas:
+        print("✅ No hay exportaciones pendientes.")
+    for e in entradas:
+        print(f"⏳ {e['cedula']}: {len(e['hojas'])} sesión(es) desde {e['desde']}, "
+              f"{e['intentos']} intento(s)" + (f" — {e['ultimo_error']}" if e["ultimo_error"] else ""))
+    return entradas
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Exportaciones pendientes a Lecturas.xlsx")
+    ap.add_argument("accion", choices=["estado", "drenar"])
+    ap.add_argument("--dir", help="carpeta PacienteData (por defecto la de principal.py)")
+    ap.add_argument("--esperar", action="store_true",
+                    help="con drenar: reintentar hasta que la cola quede vacía")
+    args = ap.parse_args(argv)
+
+    if args.dir:
+        main_dir = Path(args.dir)
+    else:
+        from principal import MAIN_DIR
+        main_dir = MAIN_DIR
+
+    if args.accion == "estado":
+        return 1 if imprimir_estado(main_dir) else 0
+
+    def exportado(entrada, ruta):
+        print(f"✅ {entrada['cedula']}: {ruta}")
+
+    while drenar(main_dir, al_exportar=exportado) and args.esperar:
+        time.sleep(INTERVALO_S)
+    return 1 if imprimir_estado(main_dir) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+from time import sleep
+
+import serial
+
+from tramas import (ParserTramas, DecodificadorBinario, negociar_binario, esperar_listo,
+                    CMD_TEXTO, ESPERA_LISTO_S)
+
+# ===================== CONFIG =====================
+
+SERIAL_PORT = "COM4"
+BAUD_RATE = 115200
+SERIAL_TIMEOUT = 1.0
+
+ESPERA_RESET_S = 2.0     # pausa antes de reabrir un puerto caído
+ESPERA_CMD_S = 0.3       # respiro tras cada comando al firmware
+MAX_RECONEXIONES = 3
+
+# Comandos del firmware (BNO055.ino / integrado.ino)
+CMD_EJERCICIOS = ("1", "2", "3", "4")
+CMD_TARA = b" "
+CMD_DETENER = b"e"
+
+# ===================== CONEXIÓN DE SESIÓN =====================
+
+class ConexionSerial:
+    """Puerto serie abierto una sola vez para todo un examen.
+
+    El cambio de ejercicio se hace con los comandos del firmware
+    ('1'/'2'/'3'/'4' + tara, 'e' para detener) sin cerrar el puerto,
+    así solo se paga una vez el reinicio del Arduino. Si el equipo se
+    desconecta a mitad de examen, se reabre el puerto y se vuelve a
+    enviar el ejercicio en curso y la tara.
+
+    Al abrir se espera a que el firmware imprima su menú (fin de setup)
+    antes de enviarle nada. Con `binario=True` se negocia entonces el modo
+    binario (y tras cada reconexión); si el firmware no lo soporta se
+    queda en texto. `crear_parser()` devuelve el decodificador adecuado.
+
+    Cada apertura del puerto es una `generacion` nueva y el modo se negocia
+    de nuevo, así que puede cambiar tras una reconexión: quien lee con
+    LectorSerial debe crear otro parser cuando cambie la generación de lo
+    leído (`crear_parser(generacion)` usa el modo de esa apertura).
+    """
+
+    def __init__(self, puerto=SERIAL_PORT, baud=BAUD_RATE, timeout=SERIAL_TIMEOUT,
+                 espera_reset=ESPERA_RESET_S, max_reconexiones=MAX_RECONEXIONES,
+                 binario=False, espera_listo=ESPERA_LISTO_S):
+        self.puerto = puerto
+        self.baud = baud
+        self.timeout = timeout
+        self.espera_reset = espera_reset
+        self.espera_listo = espera_listo
+        self.max_reconexiones = max_reconexiones
+        self.ser = None
+        self.cmd_actual = None
+        self.reconexiones = 0
+        self.binario_pedido = binario
+        self.binario = False
+        self.generacion = 0
+        self._binario_de = {}    # generación -> modo negociado en esa apertura
+
+    # ---------- ciclo de vida ----------
+
+    @property
+    def abierta(self):
+        return self.ser is not None and self.ser.is_open
+
+    def abrir(self):
+        if self.abierta:
+            return self
+        self.ser = serial.Serial(port=self.puerto, baudrate=self.baud, timeout=self.timeout)
+        # El Arduino se reinicia al abrir el puerto: hasta que imprime el
+        # menú no atiende comandos (ni la 'b' de la negociación)
+        esperar_listo(self.ser, self.espera_listo)
+        self.ser.reset_input_buffer()
+        self.binario = self.binario_pedido and negociar_binario(self.ser)
+        self.generacion += 1
+        self._binario_de[self.generacion] = self.binario
+        return self
+
+    def crear_parser(self, generacion=None):
+        binario = self._binario_de.get(generacion, self.binario)
+        return DecodificadorBinario() if binario else ParserTramas()
+
+    def cerrar(self):
+        if self.ser is None:
+            return
+        try:
+            if self.ser.is_open:
+                if self.cmd_actual is not None:
+                    self.ser.write(CMD_DETENER)
+                if self.binario:
+                    # dejar el firmware en texto para el Monitor Serie / Qt
+                    self.ser.write(CMD_TEXTO)
+                self.ser.flush()
+                self.ser.close()
+        except (serial.SerialException, OSError):
+            pass
+        self.ser = None
+        self.cmd_actual = None
+        self.binario = False
+
+    def __enter__(self):
+        return self.abrir()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+        return False
+
+    # ---------- comandos del firmware ----------
+
+    def _enviar_ejercicio(self, cmd):
+        self.ser.write(cmd.encode())
+        self.ser.flush()
+        sleep(ESPERA_CMD_S)
+        self.ser.write(CMD_TARA)
+        self.ser.flush()
+        sleep(ESPERA_CMD_S)
+
+    def iniciar_ejercicio(self, cmd):
+        """Cambia el modo del firmware y fija el cero, sin reabrir el puerto."""
+        cmd = str(cmd)
+        if cmd not in CMD_EJERCICIOS:
+            raise ValueError(f"Comando de ejercicio inválido: {cmd!r}")
+        self.abrir()
+        if self.cmd_actual is not None:
+            self.detener_ejercicio()
+        self.cmd_actual = cmd
+        self._con_reconexion(lambda: self._enviar_ejercicio(cmd))
+        # Descarta lo que quedó del ejercicio anterior / mensajes de menú
+        self.ser.reset_input_buffer()
+
+    def detener_ejercicio(self):
+        if not self.abierta or self.cmd_actual is None:
+            return
+        self.cmd_actual = None
+        try:
+            self.ser.write(CMD_DETENER)
+            self.ser.flush()
+            sleep(ESPERA_CMD_S)
+        except (serial.SerialException, OSError):
+            # Si el equipo ya no está, basta con olvidar el ejercicio
+            pass
+
+    # ---------- lectura / escritura con recuperación ----------
+
+    def readline(self):
+        return self._con_reconexion(lambda: self.ser.readline())
+
+    def read(self, n):
+        return self._con_reconexion(lambda: self.ser.read(n))
+
+    @property
+    def in_waiting(self):
+        return self._con_reconexion(lambda: self.ser.in_waiting)
+
+    def write(self, datos):
+        return self._con_reconexion(lambda: self.ser.write(datos))
+
+    def reconectar(self):
+        """Reabre el puerto y restaura el ejercicio en curso (con nueva tara)."""
+        cmd = self.cmd_actual
+        self._descartar_puerto()
+        self.abrir()
+        self.reconexiones += 1
+        if cmd is not None:
+            self._enviar_ejercicio(cmd)
+            self.ser.reset_input_buffer()
+
+    def _descartar_puerto(self):
+        try:
+            if self.ser is not None:
+                self.ser.close()
+        except (serial.SerialException, OSError):
+            pass
+        self.ser = None
+
+    def _con_reconexion(self, operacion):
+        intentos = 0
+        while True:
+            try:
+                if not self.abierta:
+                    self.reconectar()
+                return operacion()
+            except (serial.SerialException, OSError):
+                if intentos >= self.max_reconexiones:
+                    raise
+                intentos += 1
+                self._descartar_puerto()
+                sleep(self.espera_reset)
@@ -0,0 +1,232 @@
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+# ===================== DIARIO DE CAPTURA EN DISCO =====================
+# Un archivo por ejercicio, solo se añade al final:
+#   MAGIA (8 B) | largo de la cabecera (u4) | cabecera JSON | relleno a 64 B
+#   filas float64 little-endian de `len(canales)` valores, una tras otra
+# Sin índices ni bloques con cabecera: tras un corte lo único que puede
+# quedar mal es la última fila a medias, que se recorta al reabrir, y el
+# cuerpo se puede mapear en memoria directamente como una matriz (n, k).
+
+MAGIA = b"VICDIAR1"
+EXTENSION = ".diario"
+ALINEACION = 64
+DTYPE_DIARIO = np.dtype("<f8")
+
+FILAS_POR_BLOQUE = 256     # filas pendientes antes de escribir
+INTERVALO_S = 1.0          # o cada cuánto se escribe, lo que llegue antes
+
+CARPETA_DIARIO = "diario"  # dentro de PacienteData/<cedula>/
+INFO_SESION = "sesion.json"
+INFO_EXPORTADA = "exportada.json"
+
+
+class DiarioCaptura:
+    """Escritor del diario de un ejercicio.
+
+    Misma interfaz que BufferMuestras (`agregar_bloque`, `a_dataframe`),
+    pero las muestras se escriben al disco en bloques (write + flush +
+    fsync) cada `filas_por_bloque` filas o `intervalo_s` segundos, así que
+    la memoria no crece con la duración y un cuelgue solo pierde el último
+    bloque.
+    """
+
+    def __init__(self, ruta, canales, meta=None, filas_por_bloque=FILAS_POR_BLOQUE,
+                 intervalo_s=INTERVALO_S, fsync=True):
+        self.ruta = Path(ruta)
+        self.canales = list(canales)
+        self.meta = dict(meta or {})
+        self.filas_por_bloque = filas_por_bloque
+        self.intervalo_s = intervalo_s
+        self.fsync = fsync
+        self._f = None
+        self._pendientes = []
+        self._n_pendientes = 0
+        self._n_disco = 0
+        self._t_escritura = time.time()
+
+    def __len__(self):
+        return self._n_disco + self._n_pendientes
+
+    # ---------- ciclo de vida ----------
+
+    def abrir(self):
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        cab = json.dumps({"canales": self.canales, "dtype": DTYPE_DIARIO.str, "meta": self.meta},
+                         ensure_ascii=False).encode("utf-8")
+        inicio = len(MAGIA) + 4 + len(cab)
+        relleno = b" " * (-inicio % ALINEACION)
+        self._f = open(self.ruta, "xb")
+        self._f.write(MAGIA + len(cab + relleno).to_bytes(4, "little") + cab + relleno)
+        self._sincronizar()
+        return self
+
+    def cerrar(self):
+        if self._f is None:
+            return
+        self.vaciar()
+        self._f.close()
+        self._f = None
+
+    def __enter__(self):
+        return self.abrir()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+        return False
+
+    # ---------- escritura ----------
+
+    def agregar_bloque(self, columnas):
+        """Añade n filas desde un dict canal -> array (o escalar)."""
+        n = max((np.size(v) for v in columnas.values() if np.ndim(v)), default=0)
+        if n == 0:
+            return 0
+        bloque = np.empty((n, len(self.canales)), dtype=DTYPE_DIARIO)
+        for j, c in enumerate(self.canales):
+            bloque[:, j] = columnas.get(c, np.nan)
+        self._pendientes.append(bloque)
+        self._n_pendientes += n
+        if (self._n_pendientes >= self.filas_por_bloque
+                or time.time() - self._t_escritura >= self.intervalo_s):
+            self.vaciar()
+        return n
+
+    def vaciar(self):
+        """Escribe al disco lo pendiente."""
+        self._t_escritura = time.time()
+        if not self._pendientes:
+            return
+        datos = np.concatenate(self._pendientes) if len(self._pendientes) > 1 else self._pendientes[0]
+        self._f.write(datos.tobytes())
+        self._sincronizar()
+        self._n_disco += len(datos)
+        self._pendientes = []
+        self._n_pendientes = 0
+
+    def _sincronizar(self):
+        self._f.flush()
+        if self.fsync:
+            os.fsync(self._f.fileno())
+
+    # ---------- lectura ----------
+
+    def a_dataframe(self, canales=None):
+        """Cierra el diario y devuelve sus datos mapeados desde el disco."""
+        self.cerrar()
+        df = diario_a_dataframe(self.ruta)
+        return df if canales is None else df[canales]
+
+# ===================== LECTURA / RECUPERACIÓN =====================
+
+def leer_cabecera(f):
+    """(canales, meta, offset de los datos) de un diario abierto en binario."""
+    if f.read(len(MAGIA)) != MAGIA:
+        raise ValueError(f"{getattr(f, 'name', 'archivo')} no es un diario de captura")
+    largo = int.from_bytes(f.read(4), "little")
+    cab = json.loads(f.read(largo).decode("utf-8"))
+    return cab["canales"], cab.get("meta", {}), len(MAGIA) + 4 + largo
+
+
+def abrir_diario(ruta, reparar=True, mmap=True):
+    """Abre un diario (también uno que quedó a medias por un corte).
+
+    Devuelve (canales, meta, datos) con `datos` de forma (n, k): un memmap
+    de solo lectura o, con mmap=False, un array en memoria. Si la última
+    fila quedó incompleta se ignora y, con `reparar`, se recorta del
+    archivo para poder seguir leyéndolo igual.
+    """
+    ruta = Path(ruta)
+    with open(ruta, "rb") as f:
+        canales, meta, offset = leer_cabecera(f)
+    fila = DTYPE_DIARIO.itemsize * len(canales)
+    cuerpo = ruta.stat().st_size - offset
+    n, sobra = divmod(max(cuerpo, 0), fila)
+    if sobra and reparar:
+        with open(ruta, "r+b") as f:
+            f.truncate(offset + n * fila)
+    if n == 0:
+        return canales, meta, np.empty((0, len(canales)), dtype=DTYPE_DIARIO)
+    if mmap:
+        datos = np.memmap(ruta, dtype=DTYPE_DIARIO, mode="r", offset=offset, shape=(n, len(canales)))
+    else:
+        datos = np.fromfile(ruta, dtype=DTYPE_DIARIO, count=n * len(canales), offset=offset)
+        datos = datos.reshape(n, len(canales))
+    return canales, meta, datos
+
+
+def diario_a_dataframe(ruta, mmap=True):
+    import pandas as pd   # solo al leer: escribir el diario no lo necesita
+
+    canales, meta, datos = abrir_diario(ruta, mmap=mmap)
+    df = pd.DataFrame(datos, columns=canales, copy=False)
+    df.attrs["diario"] = meta
+    return df
+
+# ===================== SESIONES =====================
+# PacienteData/<cedula>/diario/<hoja>/
+#     sesion.json          fecha, hoja y tabla de la sesión
+#     01_1.diario, ...     un diario por ejercicio, en orden de captura
+# Al exportar a Lecturas.xlsx, sesion.json pasa a exportada.json y la
+# carpeta se borra; si Windows no deja (archivo aún mapeado) se borra en
+# el siguiente arranque.
+
+def _escribir_json_atomico(ruta, datos):
+    tmp = ruta.with_suffix(".tmp")
+    tmp.write_text(json.dumps(datos, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, ruta)
+
+
+def iniciar_sesion(carpeta_paciente, ts, hoja, table_name):
+    """Crea la carpeta del diario de una sesión nueva."""
+    carpeta = Path(carpeta_paciente) / CARPETA_DIARIO / hoja
+    carpeta.mkdir(parents=True, exist_ok=True)
+    _escribir_json_atomico(carpeta / INFO_SESION, {
+        "fecha": ts.isoformat(timespec="seconds"), "hoja": hoja, "table_name": table_name,
+    })
+    return carpeta
+
+
+def ruta_ejercicio(carpeta_sesion, cmd):
+    """Ruta del diario del siguiente ejercicio de la sesión."""
+    orden = len(list(Path(carpeta_sesion).glob(f"*{EXTENSION}"))) + 1
+    return Path(carpeta_sesion) / f"{orden:02d}_{cmd}{EXTENSION}"
+
+
+def sesiones_pendientes(carpeta_paciente):
+    """Sesiones con diario que no llegaron a exportarse, de la más vieja a
+    la más nueva. De paso borra las ya exportadas que quedaron en disco."""
+    base = Path(carpeta_paciente) / CARPETA_DIARIO
+    if not base.is_dir():
+        return []
+    pendientes = []
+    for carpeta in sorted(p for p in base.iterdir() if p.is_dir()):
+        if (carpeta / INFO_SESION).exists():
+            pendientes.append(carpeta)
+        elif (carpeta / INFO_EXPORTADA).exists():
+            shutil.rmtree(carpeta, ignore_errors=True)
+    return pendientes
+
+
+def cargar_sesion(carpeta_sesion, mmap=True):
+    """(info, lista de DataFrames por ejercicio) de una sesión del diario."""
+    carpeta = Path(carpeta_sesion)
+    info = json.loads((carpeta / INFO_SESION).read_text(encoding="utf-8"))
+    info["ts"] = datetime.fromisoformat(info["fecha"])
+    dfs = [diario_a_dataframe(r, mmap=mmap) for r in sorted(carpeta.glob(f"*{EXTENSION}"))]
+    return info, [df for df in dfs if len(df)]
+
+
+def descartar_sesion(carpeta_sesion):
+    """Marca la sesión como exportada y borra su diario."""
+    carpeta = Path(carpeta_sesion)
+    if (carpeta / INFO_SESION).exists():
+        os.replace(carpeta / INFO_SESION, carpeta / INFO_EXPORTADA)
+    shutil.rmtree(carpeta, ignore_errors=True)
@@ -8,16 +8,17 @@ import numpy as np
 import pandas as pd
 import serial  # 👈 nuevo: para hablar con Arduino
 
-from openpyxl import load_workbook, Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
+from tramas import ParserTramas, leer_bloque
+from reloj import ModeloReloj, COL_T_HOST, tiempos_de_bloque
+from pantalla import PantallaEnVivo
+from almacen import guardar_sesion
+from cola_excel import exportar_o_encolar, drenar
 
 # ===================== CONFIG =====================
 
 MAIN_DIR = Path(r"C:\Users\Adrian Jr\Desktop\VICENT\BNO055\BNO055")
 EXCEL_NAME = "Lecturas.xlsx"
+EXPORTAR_AL_GUARDAR = False  # el Excel se rehace entero: `python almacen.py exportar <cedula>`
 
 # puerto y parámetros del Arduino
 SERIAL_PORT = "COM4"      # 👈 CAMBIA esto si tu Arduino está en otro puerto
@@ -72,16 +73,6 @@ def ahora_nombres():
     table_name = re.sub(r'[^A-Za-z0-9_]', '_', table_name)[:31]
     return ts, hoja, table_name
 
-def abrir_o_crear_xlsx(ruta):
-    ruta.parent.mkdir(parents=True, exist_ok=True)
-    if ruta.exists():
-        # Intentar abrir existente
-        return load_workbook(ruta)
-    # Crear nuevo
-    wb = Workbook()
-    wb.save(ruta)
-    return wb
-
 # --------- (la función de prueba la dejo por si luego quieres simular) ----------
 def generar_df_prueba(n=200) -> pd.DataFrame:
     """Datos ficticios solo para pruebas. NO se usa si capturamos de Arduino."""
@@ -115,43 +106,8 @@ def generar_df_prueba(n=200) -> pd.DataFrame:
     return df
 # ----------------------------------------------------------------------
 
-def _emg_global_y_momentos(df: pd.DataFrame):
-    """Máx/Mín global de todos los EMG y momento asociado (ROM/Fuerza)."""
-    emg_cols = list(EMG_MAP.keys())
-
-    max_vals = df[emg_cols].max(numeric_only=True)
-    emg_max_col = max_vals.idxmax()
-    emg_max_val = float(max_vals.max())
-    i_max = int(df[emg_max_col].idxmax())
-    assoc_col_max = EMG_MAP[emg_max_col]
-    momento_max = f"{assoc_col_max} = {df.at[i_max, assoc_col_max]}"
-
-    min_vals = df[emg_cols].min(numeric_only=True)
-    emg_min_col = min_vals.idxmin()
-    emg_min_val = float(min_vals.min())
-    i_min = int(df[emg_min_col].idxmin())
-    assoc_col_min = EMG_MAP[emg_min_col]
-    momento_min = f"{assoc_col_min} = {df.at[i_min, assoc_col_min]}"
-
-    return emg_max_val, momento_max, emg_min_val, momento_min
-
 # ===================== LECTURA DESDE ARDUINO =====================
 
-def _extraer_numero(linea: str):
-    """
-    Recibe una línea como:
-      'FLEX/EXT (pitch) [deg]: -23.45'
-    Devuelve: -23.45 (float) o None.
-    """
-    match = re.search(r"[-+]?\d*\.\d+|\d+", linea)
-    if match:
-        try:
-            return float(match.group())
-        except:
-            return None
-    return None
-
-
 def capturar_rom_desde_arduino(puerto, ejercicio, duracion_s, baud=115200):
     """
     Habla con tu código actual de Arduino:
@@ -195,130 +151,54 @@ def capturar_rom_desde_arduino(puerto, ejercicio, duracion_s, baud=115200):
 
     print(f"🎥 Capturando durante {duracion_s} segundos...")
     t0 = time.time()
-    timestamps = []
-    valores = []
-
-    while (time.time() - t0) < duracion_s:
-        linea = ser.readline().decode(errors="ignore").strip()
-        if not linea:
-            continue
-
-        val = _extraer_numero(linea)
-        if val is None:
-            continue
-
-        ts = time.time() - t0
-        timestamps.append(ts)
-        valores.append(val)
-
-        print(f"[{ts:6.2f}s] {val:8.2f}")
+    bloques_t = []
+    bloques_t_host = []
+    bloques_val = []
+
+    parser = ParserTramas()
+    reloj = ModeloReloj()
+    t_dev0 = None
+
+    with PantallaEnVivo(nombre_col) as pantalla:
+        while (time.time() - t0) < duracion_s:
+            cols, _ = parser.alimentar(leer_bloque(ser))
+            if not len(cols["angle"]):
+                continue
+
+            # Tiempo de cada trama según el reloj del Arduino (no la hora
+            # de llegada del bloque, que es la misma para todo el trozo)
+            t_dev, t_host = tiempos_de_bloque(reloj, cols["t"], time.time() - t0)
+            if t_dev0 is None:
+                t_dev0 = t_dev[0]
+            bloques_t.append(t_dev - t_dev0)
+            bloques_t_host.append(t_host)
+            bloques_val.append(cols["angle"])
+            pantalla.publicar(t_dev - t_dev0, cols["angle"])
 
     print("\n🛑 Enviando comando de parada ('e')...")
     ser.write(b"e")
     time.sleep(0.2)
     ser.close()
 
-    if not valores:
+    if not bloques_val:
         print("⚠️ No se capturó ningún dato válido.")
-        return pd.DataFrame(columns=COLS)
-
-    # Construir DataFrame: todo en 1, menos la ROM del ejercicio actual
-    df = pd.DataFrame({
-        "timestamp_s": timestamps,
-        "ROM Flexión/Extensión_°": [1]*len(valores),
-        "EMG(F/E)_mv": [1]*len(valores),
-        "ROM Desviación Ulnar/Radial_°": [1]*len(valores),
-        "EMG(D)_mv": [1]*len(valores),
-        "ROM Pronosupinación_°": [1]*len(valores),
-        "EMG(PS)_mv": [1]*len(valores),
-        "Fuerza de Prensión_Kg": [1]*len(valores),
-        "EMG(FP)_mv": [1]*len(valores),
-    })
-
-    df[nombre_col] = valores
+        return pd.DataFrame(columns=["timestamp_s", COL_T_HOST, nombre_col])
+
+    # Solo lo medido: el resto de COLS queda vacío al exportar (antes se
+    # rellenaba con 1 y esos unos salían en Inicio como mín/máx reales)
+    df = pd.DataFrame({"timestamp_s": np.concatenate(bloques_t),
+                       COL_T_HOST: np.concatenate(bloques_t_host),
+                       nombre_col: np.concatenate(bloques_val)})
+    df.attrs["reloj"] = reloj.estadisticas()
     print(f"✅ Captura completada. Muestras: {len(df)}")
     return df
 
-# ===================== GESTIÓN DE EXCEL =====================
-
-def asegurar_inicio_simple(wb):
-    """Crea hoja 'Inicio' con las dos tablas si no existe."""
-    if "Inicio" not in wb.sheetnames:
-        ws = wb.create_sheet("Inicio", 0)
-        ws["A1"].value = "Dashboard - Resumen (simple)"
-        ws["A1"].font = Font(bold=True, size=14)
-        ws.append([])
-        ws.append(["Fecha", "Ejercicio", "Min", "Max"])
-        ws["G2"].value = "Resumen EMG global (por sesión)"
-        ws["G2"].font = Font(bold=True)
-        ws["G3"].value = "Fecha"
-        ws["H3"].value = "Emg max"
-        ws["I3"].value = "Momento del EMG max"
-        ws["J3"].value = "Emg min"
-        ws["K3"].value = "Momento del EMG min"
-        for c in ("G", "H", "I", "J", "K"):
-            ws[f"{c}3"].font = Font(bold=True)
-
-def escribir_sesion(wb, hoja_nombre, df, table_name):
-    """Crea una hoja de sesión y mete el DataFrame como tabla."""
-    if hoja_nombre in wb.sheetnames:
-        base = hoja_nombre
-        i = 2
-        while hoja_nombre in wb.sheetnames:
-            hoja_nombre = (base[:28] + f"_{i}")[:31]
-            i += 1
-
-    ws = wb.create_sheet(hoja_nombre)
-
-    for r in dataframe_to_rows(df, index=False, header=True):
-        ws.append(r)
-
-    max_row, max_col = ws.max_row, ws.max_column
-    last_col = get_column_letter(max_col)
-    ref = f"A1:{last_col}{max_row}"
-
-    tbl = Table(displayName=table_name, ref=ref)
-    tbl.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws.add_table(tbl)
-
-    return hoja_nombre
-
-def anexar_resumen_inicio(wb, ts, df):
-    """Actualiza la hoja 'Inicio' con min/max por ejercicio y EMG global."""
-    ws = wb["Inicio"]
-
-    # Bloque A–D (por ejercicio)
-    row = 4
-    while ws.cell(row=row, column=1).value not in (None, ""):
-        row += 1
-
-    for nombre_ej, col in EJERCICIOS:
-        vmin = float(pd.to_numeric(df[col], errors="coerce").min())
-        vmax = float(pd.to_numeric(df[col], errors="coerce").max())
-        ws.cell(row=row, column=1, value=ts.strftime("%Y-%m-%d"))
-        ws.cell(row=row, column=2, value=nombre_ej)
-        ws.cell(row=row, column=3, value=vmin)
-        ws.cell(row=row, column=4, value=vmax)
-        row += 1
-
-    # Bloque G–K (resumen EMG global)
-    row_g = 4
-    while ws.cell(row=row_g, column=7).value not in (None, ""):
-        row_g += 1
-
-    emg_max_val, momento_max, emg_min_val, momento_min = _emg_global_y_momentos(df)
-    ws.cell(row=row_g, column=7, value=ts.strftime("%Y-%m-%d"))
-    ws.cell(row=row_g, column=8, value=emg_max_val)
-    ws.cell(row=row_g, column=9, value=momento_max)
-    ws.cell(row=row_g, column=10, value=emg_min_val)
-    ws.cell(row=row_g, column=11, value=momento_min)
-
 # ===================== MAIN =====================
 
 def main():
-    # 1) Pedir cédula y ruta
+    # 1) Pedir cédula (y aplicar lo que quedó en cola de corridas anteriores)
     paciente_id = pedir_cedula()
-    ruta_xlsx = MAIN_DIR / paciente_id / EXCEL_NAME
+    drenar(MAIN_DIR)
 
     # 2) Capturar datos REALES desde Arduino (usa EJERCICIO_ACTUAL)
     df = capturar_rom_desde_arduino(
@@ -328,40 +208,25 @@ def main():
         baud=BAUD_RATE
     )
 
-    # asegurar que tenga todas las columnas y en el orden correcto
-    for col in COLS:
-        if col not in df.columns:
-            df[col] = 1
-    df = df[COLS]
-
-    # 3) Abrir o crear Excel
-    try:
-        wb = abrir_o_crear_xlsx(ruta_xlsx)
-    except PermissionError:
-        print("❌ No se pudo abrir/crear el archivo porque está ABIERTO en Excel.")
-        print("   👉 Cierra el archivo y vuelve a ejecutar el programa.")
-        return
-
-    # 4) Asegurar hoja Inicio
-    asegurar_inicio_simple(wb)
-
-    # 5) Crear hoja de sesión y actualizar Inicio
+    # 3) Guardar la sesión en el almacén del paciente (no toca el Excel,
+    #    así que un Lecturas.xlsx abierto ya no deja al operador esperando)
+    carpeta_paciente = MAIN_DIR / paciente_id
     ts, hoja, table_name = ahora_nombres()
-    hoja_final = escribir_sesion(wb, hoja, df, table_name)
-    anexar_resumen_inicio(wb, ts, df)
-
-    # 6) Guardar con reintento si el Excel está abierto
-    while True:
-        try:
-            wb.save(ruta_xlsx)
-            print("\n✅ Sesión guardada correctamente.")
-            print(f"   Archivo: {ruta_xlsx}")
-            print(f"   Hoja de sesión: {hoja_final}")
-            break
-        except PermissionError:
-            print("\n❌ No se pudo guardar la sesión porque el archivo Excel está ABIERTO.")
-            print("   👉 Por favor, cierra el archivo 'Lecturas.xlsx' del paciente y luego pulsa Enter.")
-            input("   Cuando lo hayas cerrado, presiona Enter para reintentar... ")
+    hoja_final = guardar_sesion(carpeta_paciente, df, ts, hoja, table_name)
+    print("\n✅ Sesión guardada correctamente.")
+    print(f"   Hoja de sesión: {hoja_final}")
+
+    # 4) Regenerar el Excel solo si se pide (se rehace con todo el historial);
+    #    si está ABIERTO queda en cola y se aplica al cerrarlo
+    if not EXPORTAR_AL_GUARDAR:
+        print(f"   Excel: python almacen.py exportar {paciente_id}")
+        return
+    ruta_xlsx = exportar_o_encolar(carpeta_paciente, hoja_final)
+    if ruta_xlsx is not None:
+        print(f"   Archivo: {ruta_xlsx}")
+    else:
+        print("\n⏳ El archivo Excel está ABIERTO: la exportación quedó en cola.")
+        print("   👉 Se aplica sola en la próxima corrida, o ciérralo y ejecuta: python cola_excel.py drenar")
 
 if __name__ == "__main__":
     main()
@@ -8,10 +8,17 @@
  *    '4' -> Modo Fuerza de prensión (solo fuerza + EMG)
  *    ' ' -> TARAR ROM (fijar 0° en postura actual) → responde ZERO_OK o ZERO_FAIL
  *    'e' -> Detener medición (modo NONE)
+ *    'b' -> Telemetría binaria (responde BIN_OK, muestreo ~100 Hz)
+ *    't' -> Telemetría de texto (responde TXT_OK, por defecto)
  *
  *  SALIDA SERIE (línea por muestra) – CSV:
  *    timestamp_s, angle_deg, force_kg, emg_env, threshold, activation
  *
+ *  SALIDA BINARIA (registro fijo de 26 bytes, little-endian):
+ *    sync 0xA55A | seq u16 | t_ms u32 | angle f32 | force f32 | emg_env f32
+ *    | threshold i16 | activation u8 | mode u8 | crc u16
+ *    crc = CRC-16/CCITT-FALSE de seq..mode. Ver TramaBin y tramas.py.
+ *
  *  Convenciones:
  *    - En ejercicios 1–3 (ROM): force_kg = NaN
  *    - En ejercicio 4 (fuerza):  angle_deg = NaN
@@ -33,6 +40,7 @@
 #define BNO_ADDR_HAND   0x29   // mano
 
 const unsigned long PRINT_MS = 100;   // periodo de muestreo ~10 Hz
+const unsigned long PRINT_MS_BIN = 10; // periodo en modo binario ~100 Hz
 
 Adafruit_BNO055 bnoWrist = Adafruit_BNO055(55, BNO_ADDR_WRIST);
 Adafruit_BNO055 bnoHand  = Adafruit_BNO055(56, BNO_ADDR_HAND);
@@ -68,6 +76,53 @@ const int emgThreshold = 15;    // umbral fijo (puedes afinarlo)
 enum MeasurementMode { NONE, DEVIATIONS, FLEX_EXT, PRONO_SUP, FORCE_MODE };
 MeasurementMode currentMode = NONE;
 
+// ---------------------- Telemetría binaria ----------------------
+const uint16_t SYNC_BIN = 0xA55A;
+
+struct __attribute__((packed)) TramaBin {
+  uint16_t sync;
+  uint16_t seq;
+  uint32_t t_ms;
+  float    angle_deg;
+  float    force_kg;
+  float    emg_env;
+  int16_t  threshold;
+  uint8_t  activation;
+  uint8_t  mode;
+  uint16_t crc;
+};
+
+bool binaryMode = false;
+uint16_t binSeq = 0;
+
+// CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF)
+uint16_t crc16(const uint8_t *data, size_t len) {
+  uint16_t crc = 0xFFFF;
+  while (len--) {
+    crc ^= (uint16_t)(*data++) << 8;
+    for (uint8_t i = 0; i < 8; i++)
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : (crc << 1);
+  }
+  return crc;
+}
+
+void sendBinaryFrame(unsigned long t_ms, float angle_deg, float force_kg,
+                     float emg_env, int thr, int act) {
+  TramaBin f;
+  f.sync       = SYNC_BIN;
+  f.seq        = binSeq++;
+  f.t_ms       = t_ms;
+  f.angle_deg  = angle_deg;
+  f.force_kg   = force_kg;
+  f.emg_env    = emg_env;
+  f.threshold  = (int16_t)thr;
+  f.activation = (uint8_t)act;
+  f.mode       = (uint8_t)currentMode;
+  const uint8_t *p = (const uint8_t *)&f;
+  f.crc = crc16(p + 2, sizeof(TramaBin) - 4);
+  Serial.write(p, sizeof(TramaBin));
+}
+
 // ---------------------- Helpers BNO ----------------------
 Quat readQuat(Adafruit_BNO055 &bno) {
   imu::Quaternion q = bno.getQuat();
@@ -194,6 +249,7 @@ void showMenu() {
   Serial.println("3: Pronosupinación");
   Serial.println("4: Fuerza de prensión");
   Serial.println("e: Detener medición");
+  Serial.println("b/t: telemetría binaria / texto");
   Serial.println("Barra espaciadora: fijar cero ROM (responde ZERO_OK/ZERO_FAIL)");
 }
 
@@ -250,6 +306,20 @@ void handleSerial() {
         }
         break;
 
+      case 'b':
+      case 'B':
+        Serial.println("BIN_OK");
+        Serial.flush();
+        binaryMode = true;
+        binSeq = 0;
+        break;
+
+      case 't':
+      case 'T':
+        binaryMode = false;
+        Serial.println("TXT_OK");
+        break;
+
       default:
         // ignorado
         break;
@@ -317,12 +387,14 @@ void loop() {
   int   emgAct;
   updateEMG(emgEnv, emgThr, emgAct);
 
-  // 3) Fuerza (si está conectada)
-  float fuerzaKg = -readForceKg();  // será NaN si no está lista
+  // 3) Fuerza (si está conectada). balanza.read() bloquea hasta la
+  //    siguiente conversión del HX711, así que solo se lee en el modo 4:
+  //    en los modos ROM la fuerza es NaN y así no limita el muestreo.
+  float fuerzaKg = (currentMode == FORCE_MODE) ? -readForceKg() : NAN;
 
   // 4) Control de periodo de muestreo
   unsigned long now = millis();
-  if (now - lastPrint < PRINT_MS) {
+  if (now - lastPrint < (binaryMode ? PRINT_MS_BIN : PRINT_MS)) {
     delay(2);
     return;
   }
@@ -347,7 +419,7 @@ void loop() {
 
     if (!haveZero) {
       // Aún no tenemos cero ROM: no emitimos línea de datos
-      Serial.println("Esperando cero ROM (espacio)...");
+      if (!binaryMode) Serial.println("Esperando cero ROM (espacio)...");
       return;
     }
 
@@ -378,7 +450,14 @@ void loop() {
     angle_deg = NAN;
   }
 
-  // 6) Imprimir CSV:
+  // 6a) Modo binario: registro fijo, sin formateo de texto
+  if (binaryMode) {
+    sendBinaryFrame(now, angle_deg, fuerzaKg, emgEnv, emgThr, emgAct);
+    delay(2);
+    return;
+  }
+
+  // 6b) Imprimir CSV:
   // timestamp_s, angle_deg, force_kg, emg_env, threshold, activation
   Serial.print(t, 3);
   Serial.print(',');
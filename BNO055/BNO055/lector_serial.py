@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import deque
+
+# ===================== LECTOR EN SEGUNDO PLANO =====================
+
+MAX_TROZOS = 4096          # trozos pendientes antes de descartar los más viejos
+RX_BUFFER_OS = 1 << 16     # buffer del driver (solo Windows lo permite ajustar)
+VENTANA_TASA_S = 1.0
+
+
+class LectorSerial(threading.Thread):
+    """Hilo que vacía el puerto serie en trozos grandes.
+
+    Lee todo lo que haya en `in_waiting` de una vez y lo deja en una cola
+    de bytes; el parseo lo hace quien consume con `leer()`. Así, aunque el
+    consumidor se atasque (redibujos de Tk, prints), el buffer del sistema
+    operativo se sigue vaciando al ritmo del enlace. Si la cola se llena se
+    descartan los trozos más viejos y se cuentan en `desbordes`.
+
+    Sirve tanto con un serial.Serial como con una ConexionSerial. Con una
+    ConexionSerial cada trozo lleva la generación del puerto con que se
+    leyó (cambia al reconectar) y `leer()` nunca mezcla generaciones: tras
+    cada llamada `generacion` dice a qué apertura pertenecen los bytes.
+    """
+
+    def __init__(self, ser, max_trozos=MAX_TROZOS):
+        super().__init__(daemon=True)
+        self.ser = ser
+        self._cola = deque()
+        self._max_trozos = max_trozos
+        self._hay_datos = threading.Condition()
+        self._parar = threading.Event()
+        self.error = None
+        self.generacion = self._generacion_puerto()
+
+        self.bytes_totales = 0
+        self.bytes_descartados = 0
+        self.desbordes = 0
+        self.bytes_por_segundo = 0.0
+        self._t_ventana = time.time()
+        self._bytes_ventana = 0
+
+        set_buffer = getattr(getattr(ser, "ser", ser), "set_buffer_size", None)
+        if set_buffer is not None:
+            try:
+                set_buffer(rx_size=RX_BUFFER_OS)
+            except Exception:
+                pass
+
+    # ---------- hilo ----------
+
+    def _generacion_puerto(self):
+        return getattr(self.ser, "generacion", 0)
+
+    def run(self):
+        while not self._parar.is_set():
+            try:
+                datos = self.ser.read(self.ser.in_waiting or 1)
+            except Exception as e:
+                self.error = e
+                break
+            if datos:
+                # si hubo reconexión, ocurrió antes de leer: los bytes son
+                # de la generación actual
+                self._encolar(self._generacion_puerto(), datos)
+            self._actualizar_tasa(len(datos))
+        with self._hay_datos:
+            self._hay_datos.notify_all()
+
+    def _encolar(self, generacion, datos):
+        with self._hay_datos:
+            if len(self._cola) >= self._max_trozos:
+                _, viejo = self._cola.popleft()
+                self.desbordes += 1
+                self.bytes_descartados += len(viejo)
+            self._cola.append((generacion, datos))
+            self.bytes_totales += len(datos)
+            self._hay_datos.notify()
+
+    def _actualizar_tasa(self, n):
+        self._bytes_ventana += n
+        ahora = time.time()
+        dt = ahora - self._t_ventana
+        if dt >= VENTANA_TASA_S:
+            self.bytes_por_segundo = self._bytes_ventana / dt
+            self._t_ventana = ahora
+            self._bytes_ventana = 0
+
+    # ---------- consumidor ----------
+
+    def leer(self, timeout=0.1):
+        """Devuelve los bytes pendientes de una misma generación (b"" si no
+        llegó nada); los de una reconexión posterior quedan para la próxima."""
+        trozos = []
+        with self._hay_datos:
+            if not self._cola and self.is_alive():
+                self._hay_datos.wait(timeout)
+            if self._cola:
+                self.generacion = self._cola[0][0]
+                while self._cola and self._cola[0][0] == self.generacion:
+                    trozos.append(self._cola.popleft()[1])
+        if not trozos and self.error is not None:
+            raise self.error
+        return b"".join(trozos)
+
+    def detener(self):
+        self._parar.set()
+        if self.is_alive():
+            self.join(timeout=2.0)
+
+    def estadisticas(self):
+        return {
+            "bytes": self.bytes_totales,
+            "bytes_por_segundo": self.bytes_por_segundo,
+            "desbordes": self.desbordes,
+            "bytes_descartados": self.bytes_descartados,
+        }
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.detener()
+        return False
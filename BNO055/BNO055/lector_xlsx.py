@@ -0,0 +1,183 @@
+import os
+from collections import OrderedDict
+from itertools import islice
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+# ===================== LECTURA PEREZOSA DE Lecturas.xlsx =====================
+# Para vistas y resúmenes que solo leen: el libro se abre en modo read_only
+# (openpyxl no carga las hojas hasta que se recorren), se lee solo la hoja
+# y las columnas pedidas, en trozos, directo a arrays de numpy. Lo leído
+# queda en caché con la firma del archivo (mtime + tamaño): volver a pedir
+# lo mismo de un libro que no cambió no vuelve a tocar el disco.
+
+FILAS_POR_TROZO = 5000
+CACHE_MAX = 64          # hojas/columnas en caché (todas las instancias)
+
+_cache = OrderedDict()
+
+
+def _firma(ruta):
+    st = os.stat(ruta)
+    return st.st_mtime_ns, st.st_size
+
+
+def _de_cache(clave, firma):
+    item = _cache.get(clave)
+    if item is None or item[0] != firma:
+        return None
+    _cache.move_to_end(clave)
+    return item[1]
+
+
+def _a_cache(clave, firma, valor):
+    _cache[clave] = (firma, valor)
+    _cache.move_to_end(clave)
+    while len(_cache) > CACHE_MAX:
+        _cache.popitem(last=False)
+
+
+def limpiar_cache():
+    _cache.clear()
+
+
+class LectorLibro:
+    """Acceso de solo lectura a un Lecturas.xlsx.
+
+        with LectorLibro(ruta) as lib:
+            lib.sesiones()                              # nombres de hoja
+            lib.columnas("sesion_...", ["timestamp_s", "EMG(F/E)_mv"])
+            ejercicios, emg = lib.inicio()
+    """
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self._wb = None
+        self._firma_wb = None
+
+    # ---------- libro ----------
+
+    def _libro(self):
+        firma = _firma(self.ruta)
+        if self._wb is None or firma != self._firma_wb:
+            self.cerrar()
+            self._wb = load_workbook(self.ruta, read_only=True, data_only=True)
+            self._firma_wb = firma
+        return self._wb
+
+    def cerrar(self):
+        if self._wb is not None:
+            self._wb.close()
+            self._wb = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+        return False
+
+    @property
+    def hojas(self):
+        clave = (str(self.ruta.resolve()), "__hojas__")
+        firma = _firma(self.ruta)
+        hojas = _de_cache(clave, firma)
+        if hojas is None:
+            hojas = list(self._libro().sheetnames)
+            _a_cache(clave, firma, hojas)
+        return hojas
+
+    def sesiones(self):
+        return [h for h in self.hojas if h.startswith("sesion_")]
+
+    def cabecera(self, hoja):
+        """Fila 1 tal cual, por posición: una celda vacía queda como "" para
+        que cab.index(nombre) siga siendo la columna de la hoja."""
+        ws = self._libro()[hoja]
+        fila = next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ())
+        return ["" if c is None else c for c in fila]
+
+    # ---------- hojas de sesión ----------
+
+    def columnas(self, hoja, columnas=None):
+        """dict columna -> array float64 (solo lectura) de una hoja de sesión.
+
+        Solo se recorren las columnas entre la primera y la última pedida;
+        lo que no sea numérico queda en NaN.
+        """
+        firma = _firma(self.ruta)
+        clave = (str(self.ruta.resolve()), hoja, None if columnas is None else tuple(columnas))
+        datos = _de_cache(clave, firma)
+        if datos is not None:
+            return datos
+        cab = self.cabecera(hoja)
+        pedidas = [c for c in (cab if columnas is None else columnas) if c != "" and c in cab]
+        if not pedidas:
+            return {}
+
+        idx = [cab.index(c) for c in pedidas]
+        lo, hi = min(idx), max(idx)
+        rel = [i - lo for i in idx]
+        ws = self._libro()[hoja]
+        filas = ws.iter_rows(min_row=2, min_col=lo + 1, max_col=hi + 1, values_only=True)
+
+        cap = FILAS_POR_TROZO
+        out = [np.empty(cap) for _ in pedidas]
+        n = 0
+        while True:
+            trozo = list(islice(filas, FILAS_POR_TROZO))
+            if not trozo:
+                break
+            bloque = pd.DataFrame.from_records(trozo)
+            m = len(trozo)
+            if n + m > cap:
+                while cap < n + m:
+                    cap *= 2
+                out = [np.resize(a, cap) for a in out]
+            for a, j in zip(out, rel):
+                a[n:n + m] = (pd.to_numeric(bloque[j], errors="coerce").to_numpy(np.float64)
+                              if j in bloque else np.nan)
+            n += m
+
+        datos = {}
+        for c, a in zip(pedidas, out):
+            a = a[:n]
+            a.flags.writeable = False
+            datos[c] = a
+        _a_cache(clave, firma, datos)
+        return datos
+
+    def hoja(self, hoja, columnas=None):
+        """DataFrame (sin copia) de las columnas pedidas de una hoja."""
+        return pd.DataFrame(self.columnas(hoja, columnas), copy=False)
+
+    # ---------- Inicio ----------
+
+    def inicio(self):
+        """(ejercicios, emg): los dos bloques de la hoja Inicio como DataFrames."""
+        firma = _firma(self.ruta)
+        clave = (str(self.ruta.resolve()), "Inicio")
+        res = _de_cache(clave, firma)
+        if res is not None:
+            return res
+        vacio = (pd.DataFrame(columns=["Fecha", "Ejercicio", "Min", "Max"]),
+                 pd.DataFrame(columns=["Fecha", "Emg max", "Momento del EMG max",
+                                       "Emg min", "Momento del EMG min"]))
+        if "Inicio" not in self.hojas:
+            return vacio
+
+        ws = self._libro()["Inicio"]
+        filas = list(ws.iter_rows(min_row=3, max_col=11, values_only=True))
+        if not filas:
+            return vacio
+        filas = [tuple(f) + (None,) * (11 - len(f)) for f in filas]
+        cab_ad = [c or f"col{i}" for i, c in enumerate(filas[0][0:4])]
+        cab_gk = [c or f"col{i}" for i, c in enumerate(filas[0][6:11])]
+        ad = pd.DataFrame([f[0:4] for f in filas[1:] if f[0] not in (None, "")], columns=cab_ad)
+        gk = pd.DataFrame([f[6:11] for f in filas[1:] if f[6] not in (None, "")], columns=cab_gk)
+        res = (ad, gk)
+        _a_cache(clave, firma, res)
+        return res
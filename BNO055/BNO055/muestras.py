@@ -0,0 +1,84 @@
+import numpy as np
+
+# ===================== BUFFER DE MUESTRAS =====================
+
+CAPACIDAD_INICIAL = 1024
+
+
+class BufferMuestras:
+    """Almacén de muestras de captura con arrays tipados preasignados.
+
+    Un array por canal (tiempo, cada ROM, fuerza, EMG...). Cuando se llena
+    se duplica la capacidad, así añadir es O(1) amortizado y cada muestra
+    ocupa 8 bytes por canal en vez de un float de Python en una lista.
+    `a_dataframe()` devuelve vistas sobre los arrays, sin copiar (por eso
+    no se debe `limpiar()` un buffer cuyo DataFrame sigue en uso).
+    """
+
+    def __init__(self, canales, capacidad=CAPACIDAD_INICIAL, dtype=np.float64):
+        if isinstance(dtype, dict):
+            dtypes = {c: dtype.get(c, np.float64) for c in canales}
+        else:
+            dtypes = {c: dtype for c in canales}
+        self.canales = list(canales)
+        self._datos = {c: np.empty(max(1, capacidad), dtype=dtypes[c]) for c in self.canales}
+        self._n = 0
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def capacidad(self):
+        return len(self._datos[self.canales[0]])
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in self._datos.values())
+
+    def _asegurar(self, extra):
+        necesario = self._n + extra
+        cap = self.capacidad
+        if necesario <= cap:
+            return
+        while cap < necesario:
+            cap *= 2
+        for c, viejo in self._datos.items():
+            nuevo = np.empty(cap, dtype=viejo.dtype)
+            nuevo[:self._n] = viejo[:self._n]
+            self._datos[c] = nuevo
+
+    def agregar(self, **valores):
+        """Añade una muestra; los canales que no se pasan quedan en NaN."""
+        self._asegurar(1)
+        i = self._n
+        for c, arr in self._datos.items():
+            arr[i] = valores.get(c, np.nan)
+        self._n += 1
+
+    def agregar_bloque(self, columnas):
+        """Añade n muestras de golpe desde un dict canal -> array (o escalar)."""
+        n = max((np.size(v) for v in columnas.values() if np.ndim(v)), default=0)
+        if n == 0:
+            return 0
+        self._asegurar(n)
+        i, j = self._n, self._n + n
+        for c, arr in self._datos.items():
+            arr[i:j] = columnas.get(c, np.nan)
+        self._n = j
+        return n
+
+    def columna(self, canal):
+        return self._datos[canal][:self._n]
+
+    def ultimo(self, canal):
+        return self._datos[canal][self._n - 1] if self._n else np.nan
+
+    def a_dataframe(self, canales=None):
+        """DataFrame con vistas de los arrays (cero copias)."""
+        import pandas as pd   # se carga en segundo plano durante la captura
+
+        canales = self.canales if canales is None else canales
+        return pd.DataFrame({c: self.columna(c) for c in canales}, copy=False)
+
+    def limpiar(self):
+        self._n = 0
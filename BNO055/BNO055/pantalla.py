@@ -0,0 +1,116 @@
+import sys
+import threading
+
+# ===================== PANTALLA EN VIVO =====================
+
+MODO_VIVO = "vivo"          # una línea que se reescribe a `fps`
+MODO_SILENCIO = "silencio"  # nada durante la captura
+MODO_MAQUINA = "maquina"    # líneas DATA:<col>,<ts>,<val> en lotes
+
+FPS = 10
+
+# Un solo lock para todo lo que se escribe en stdout: el hilo de la pantalla
+# (lotes DATA:) y las líneas de protocolo de otros hilos (HWMSG:, STATUS:,
+# avisos de la cola) no se intercalan a mitad de línea en el pipe de QProcess.
+_LOCK_SALIDA = threading.Lock()
+
+
+def emitir(linea, salida=None):
+    """Escribe `linea` + salto como un único write+flush, bajo el lock de salida."""
+    salida = salida or sys.stdout
+    with _LOCK_SALIDA:
+        salida.write(linea + "\n")
+        salida.flush()
+
+
+class PantallaEnVivo:
+    """Muestra la captura en consola sin frenar la adquisición.
+
+    El bucle de captura solo llama a `publicar()`, que guarda lo último
+    recibido (y en modo máquina acumula las líneas). Un hilo aparte
+    escribe en la consola a una tasa fija, con un solo write+flush por
+    cuadro, así el coste de la consola de Windows o del pipe de QProcess
+    deja de sumarse a cada muestra.
+    """
+
+    def __init__(self, etiqueta="", modo=MODO_VIVO, fps=FPS, salida=None):
+        self.etiqueta = etiqueta
+        self.modo = modo
+        self.periodo = 1.0 / fps
+        self.salida = salida or sys.stdout
+        self.muestras = 0
+        self._ultimo = None
+        self._lotes = []
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def publicar(self, ts, valores):
+        """Registra un bloque de muestras (arrays o escalares)."""
+        try:
+            n = len(valores)
+        except TypeError:
+            ts, valores, n = [ts], [valores], 1
+        if not n:
+            return
+        with self._lock:
+            self.muestras += n
+            self._ultimo = (ts[-1], valores[-1])
+            if self.modo == MODO_MAQUINA:
+                self._lotes.append((ts, valores))
+
+    # ---------- render ----------
+
+    def _cuadro(self):
+        with self._lock:
+            ultimo, lotes, n = self._ultimo, self._lotes, self.muestras
+            self._lotes = []
+        if self.modo == MODO_MAQUINA:
+            if not lotes:
+                return ""
+            return "".join(f"DATA:{self.etiqueta},{t:.3f},{v:.6f}\n"
+                           for ts, vals in lotes for t, v in zip(ts, vals))
+        if self.modo == MODO_VIVO and ultimo is not None:
+            t, v = ultimo
+            return f"\r[{t:6.2f}s] {v:8.2f}   ({n} muestras)"
+        return ""
+
+    def _escribir(self):
+        texto = self._cuadro()
+        if texto:
+            with _LOCK_SALIDA:
+                self.salida.write(texto)
+                self.salida.flush()
+
+    def mensaje(self, linea):
+        """Línea de protocolo durante la captura (HWMSG:, STATUS:), sin
+        mezclarse con los lotes que escribe el hilo de la pantalla."""
+        emitir(linea, self.salida)
+
+    def _bucle(self):
+        while not self._parar.wait(self.periodo):
+            self._escribir()
+
+    # ---------- ciclo de vida ----------
+
+    def iniciar(self):
+        if self.modo != MODO_SILENCIO:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+        return self
+
+    def cerrar(self):
+        self._parar.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self._escribir()
+        if self.modo == MODO_VIVO and self._ultimo is not None:
+            emitir("", self.salida)
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.cerrar()
+        return False
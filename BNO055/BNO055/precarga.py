@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Arranque rápido de los puntos de entrada (principal, python_script, Interfaz).
+
+numpy, pandas, openpyxl y los módulos que los usan ya no se importan al
+inicio: cada función importa lo suyo donde lo necesita, así el menú, la
+cédula y la apertura del puerto salen enseguida. Para que esa primera
+importación tampoco se note, `precargar` los importa en un hilo en segundo
+plano mientras el operador elige la prueba, escribe la cédula y hace la
+primera captura. Si una función pide un módulo que el hilo está cargando,
+Python espera a que termine: nunca se carga dos veces.
+
+El arranque en frío de cada entrada se mide en benchmarks.py (etapa
+"arranque").
+"""
+
+import importlib
+import threading
+import time
+
+# ===================== CONFIG =====================
+
+# En el orden en que se usan: lo de la captura (numpy, puerto, tramas),
+# después lo de guardar y exportar (pandas, almacén, openpyxl)
+MODULOS_CAPTURA = ("numpy", "serial", "tramas", "conexion_serial", "lector_serial",
+                   "reloj", "muestras", "diario")
+MODULOS_GUARDADO = ("pandas", "sesion", "almacen", "openpyxl", "openpyxl.worksheet.table",
+                    "openpyxl.utils.dataframe", "openpyxl.workbook.defined_name")
+PESADOS = MODULOS_CAPTURA + MODULOS_GUARDADO
+
+_hilo = None
+tiempos = {}   # módulo -> segundos que tardó en el hilo (diagnóstico)
+
+# ===================== PRECARGA =====================
+
+def _importar(modulos):
+    for nombre in modulos:
+        t0 = time.perf_counter()
+        try:
+            importlib.import_module(nombre)
+        except Exception:
+            # quien lo use de verdad verá el error (p.ej. falta pyserial)
+            continue
+        tiempos[nombre] = time.perf_counter() - t0
+
+
+def precargar(modulos=PESADOS):
+    """Importa `modulos` en un hilo daemon (una sola vez por proceso)."""
+    global _hilo
+    if _hilo is None:
+        _hilo = threading.Thread(target=_importar, args=(tuple(modulos),),
+                                 name="precarga", daemon=True)
+        _hilo.start()
+    return _hilo
+
+
+def esperar(timeout=None):
+    """Espera a que termine la precarga (si se lanzó)."""
+    if _hilo is not None:
+        _hilo.join(timeout)
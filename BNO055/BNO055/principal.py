@@ -3,15 +3,13 @@ from datetime import datetime
 import re
 import random
 import time
-import numpy as np
-import pandas as pd
-import serial
+import warnings
 
-from openpyxl import load_workbook, Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
+# numpy, pandas, openpyxl y los módulos de captura/almacén se importan en
+# cada función que los usa (ver precarga.py): el menú y la cédula salen sin
+# esperarlos y, mientras tanto, se cargan en segundo plano
+from precarga import precargar
+from pantalla import MODO_VIVO
 
 # ===================== CONFIG =====================
 
@@ -20,6 +18,15 @@ EXCEL_NAME = "Lecturas.xlsx"
 
 SERIAL_PORT = "COM4"
 BAUD_RATE = 115200
+MODO_BINARIO = True   # False = protocolo de texto (útil para depurar)
+MODO_PANTALLA = MODO_VIVO   # MODO_SILENCIO para no mostrar nada al capturar
+# Exportar rehace Lecturas.xlsx entero desde el almacén (crece con el
+# historial del paciente), así que al guardar solo se escribe la sesión y el
+# Excel se genera cuando se pide: `python almacen.py exportar <cedula>`
+EXPORTAR_AL_GUARDAR = False
+# Cómo se juntan los ejercicios en la hoja: "columnas" fila a fila (como
+# siempre) o "tiempo", cada fila con la muestra más cercana por timestamp_s
+UNION = "columnas"
 
 COLS = [
     "timestamp_s",
@@ -48,6 +55,9 @@ EMG_MAP = {
     "EMG(FP)_mv":  "Fuerza de Prensión_Kg",
 }
 
+# Columna EMG que acompaña a cada ejercicio
+EMG_DE = {col: emg for emg, col in EMG_MAP.items()}
+
 # ===================== MENÚ =====================
 
 def menu_prueba_funcional():
@@ -110,6 +120,7 @@ def ahora_nombres():
     return ts, hoja, table_name
 
 def abrir_o_crear_xlsx(ruta):
+    from openpyxl import load_workbook, Workbook
     ruta.parent.mkdir(parents=True, exist_ok=True)
     if ruta.exists():
         return load_workbook(ruta)
@@ -118,11 +129,13 @@ def abrir_o_crear_xlsx(ruta):
     return wb
 
 # === NUEVO: función igual que en código 1 para EMG global ===
-def _emg_global_y_momentos(df: pd.DataFrame):
+def _emg_global_y_momentos(df):
     """Máx/Mín global de todos los EMG y momento asociado (ROM/Fuerza).
 
     Si no hay ningún EMG con datos numéricos, devuelve todo None.
     """
+    import pandas as pd
+
     emg_cols = list(EMG_MAP.keys())
 
     # Aseguramos que sean numéricos (puede haber strings, NaN, etc.)
@@ -157,6 +170,8 @@ def _emg_global_y_momentos(df: pd.DataFrame):
 
 def asegurar_inicio_simple(wb):
     """Crea hoja 'Inicio' con las dos tablas si no existe (igual que en código 1)."""
+    from openpyxl.styles import Font
+
     if "Inicio" not in wb.sheetnames:
         ws = wb.create_sheet("Inicio", 0)
         ws["A1"].value = "Dashboard - Resumen (simple)"
@@ -173,16 +188,14 @@ def asegurar_inicio_simple(wb):
         for c in ("G", "H", "I", "J", "K"):
             ws[f"{c}3"].font = Font(bold=True)
 
-# === NUEVO: función que actualiza la hoja Inicio (traída del código 1) ===
-def anexar_resumen_inicio(wb, ts, df):
-    """Actualiza la hoja 'Inicio' con min/max por ejercicio y EMG global."""
-    ws = wb["Inicio"]
+def resumen_inicio(ts, df):
+    """Filas de Inicio de una sesión: (filas A–D por ejercicio, fila G–K o None)."""
+    import pandas as pd
 
-    # ---------- Bloque A–D (por ejercicio) ----------
-    row = 4
-    while ws.cell(row=row, column=1).value not in (None, ""):
-        row += 1
+    fecha = ts.strftime("%Y-%m-%d")
 
+    # ---------- Bloque A–D (por ejercicio) ----------
+    filas = []
     for nombre_ej, col in EJERCICIOS:
         # 👇 Si la columna no existe en este df, saltar
         if col not in df.columns:
@@ -194,33 +207,168 @@ def anexar_resumen_inicio(wb, ts, df):
         if serie.dropna().empty:
             continue
 
-        vmin = float(serie.min())
-        vmax = float(serie.max())
-
-        ws.cell(row=row, column=1, value=ts.strftime("%Y-%m-%d"))
-        ws.cell(row=row, column=2, value=nombre_ej)
-        ws.cell(row=row, column=3, value=vmin)
-        ws.cell(row=row, column=4, value=vmax)
-        row += 1
+        filas.append([fecha, nombre_ej, float(serie.min()), float(serie.max())])
 
     # ---------- Bloque G–K (resumen EMG global) ----------
-    row_g = 4
-    while ws.cell(row=row_g, column=7).value not in (None, ""):
-        row_g += 1
-
     emg_max_val, momento_max, emg_min_val, momento_min = _emg_global_y_momentos(df)
 
-    # Si no hubo EMG en esta sesión, no escribimos nada en G–K
+    # Si no hubo EMG en esta sesión, no hay fila para G–K
     if emg_max_val is None:
+        return filas, None
+    return filas, [fecha, emg_max_val, momento_max, emg_min_val, momento_min]
+
+# ---------- Cursor de Inicio ----------
+# La siguiente fila libre de cada bloque se guarda en el propio libro como
+# nombre definido oculto (p.ej. _InicioSiguienteAD = Inicio!$A$57), así
+# anexar no recorre el historial. Libros viejos sin cursor se recorren una
+# vez; si alguien escribió a mano debajo, se avanza desde el cursor.
+
+CURSOR_AD = "_InicioSiguienteAD"
+CURSOR_GK = "_InicioSiguienteGK"
+FILA_DATOS_INICIO = 4
+
+
+def _leer_cursor(wb, nombre):
+    dn = wb.defined_names.get(nombre)
+    m = re.search(r"\$(\d+)$", dn.attr_text) if dn is not None else None
+    return int(m.group(1)) if m else None
+
+
+def fijar_cursor(wb, nombre, columna, fila):
+    from openpyxl.utils import get_column_letter
+    from openpyxl.workbook.defined_name import DefinedName
+
+    wb.defined_names[nombre] = DefinedName(
+        nombre, attr_text=f"Inicio!${get_column_letter(columna)}${fila}", hidden=True)
+
+
+def _siguiente_fila(wb, ws, nombre, columna):
+    fila = _leer_cursor(wb, nombre) or FILA_DATOS_INICIO
+    while ws.cell(row=fila, column=columna).value not in (None, ""):
+        fila += 1
+    return fila
+
+# === NUEVO: función que actualiza la hoja Inicio (traída del código 1) ===
+def anexar_resumen_inicio(wb, ts, df):
+    """Actualiza la hoja 'Inicio' con min/max por ejercicio y EMG global."""
+    ws = wb["Inicio"]
+    filas, fila_emg = resumen_inicio(ts, df)
+
+    # ---------- Bloque A–D (por ejercicio) ----------
+    row = _siguiente_fila(wb, ws, CURSOR_AD, 1)
+
+    for fila in filas:
+        for j, v in enumerate(fila, start=1):
+            ws.cell(row=row, column=j, value=v)
+        row += 1
+    fijar_cursor(wb, CURSOR_AD, 1, row)
+
+    # ---------- Bloque G–K (resumen EMG global) ----------
+    if fila_emg is None:
         return
 
-    ws.cell(row=row_g, column=7, value=ts.strftime("%Y-%m-%d"))
-    ws.cell(row=row_g, column=8, value=emg_max_val)
-    ws.cell(row=row_g, column=9, value=momento_max)
-    ws.cell(row=row_g, column=10, value=emg_min_val)
-    ws.cell(row=row_g, column=11, value=momento_min)
+    row_g = _siguiente_fila(wb, ws, CURSOR_GK, 7)
+
+    for j, v in enumerate(fila_emg, start=7):
+        ws.cell(row=row_g, column=j, value=v)
+    fijar_cursor(wb, CURSOR_GK, 7, row_g + 1)
+
+# ---------- Reconstrucción completa de Inicio ----------
+
+def resumen_inicio_lote(sesiones):
+    """Como resumen_inicio, para muchas sesiones [(ts, df), ...] de una vez:
+    se apilan y se resuelve con groupby/orden en vez de un bucle por sesión."""
+    import numpy as np
+    import pandas as pd
+
+    sesiones = [(ts, df) for ts, df in sesiones if len(df)]
+    if not sesiones:
+        return [], []
+    cols_ej = [c for _, c in EJERCICIOS]
+    emg_cols = list(EMG_MAP.keys())
+    grande = pd.concat([df.reindex(columns=cols_ej + emg_cols) for _, df in sesiones],
+                       ignore_index=True).apply(pd.to_numeric, errors="coerce")
+    sid = np.repeat(np.arange(len(sesiones)), [len(df) for _, df in sesiones])
+    fechas = [ts.strftime("%Y-%m-%d") for ts, _ in sesiones]
+
+    # ---------- Bloque A–D: min/max por sesión y ejercicio ----------
+    g = grande[cols_ej].groupby(sid)
+    vmin, vmax, hay = g.min().to_numpy(), g.max().to_numpy(), g.count().to_numpy() > 0
+    filas = [[fechas[i], EJERCICIOS[j][0], float(vmin[i, j]), float(vmax[i, j])]
+             for i, j in zip(*np.nonzero(hay))]
+
+    # ---------- Bloque G–K: extremos EMG (mismo desempate que
+    # _emg_global_y_momentos: primera columna EMG y primera fila) ----------
+    largo = grande[emg_cols].to_numpy()
+    fila, col = np.nonzero(~np.isnan(largo))
+    if not len(fila):
+        return filas, []
+    val = largo[fila, col]
+    s = sid[fila]
+
+    def extremo(signo):
+        orden = np.lexsort((fila, col, signo * val, s))
+        prim = orden[np.r_[True, s[orden][1:] != s[orden][:-1]]]
+        return {int(s[k]): (float(val[k]), fila[k], emg_cols[col[k]]) for k in prim}
+
+    inicio = np.r_[0, np.cumsum([len(df) for _, df in sesiones])[:-1]]
+
+    def momento(f, emg_col):
+        i, asoc = sid[f], EMG_MAP[emg_col]
+        return f"{asoc} = {sesiones[i][1][asoc].iloc[f - inicio[i]]}"
+
+    maximos, minimos = extremo(-1), extremo(1)
+    filas_emg = []
+    for i in sorted(maximos):
+        vmax_, fmax, cmax = maximos[i]
+        vmin_, fmin, cmin = minimos[i]
+        filas_emg.append([fechas[i], vmax_, momento(fmax, cmax), vmin_, momento(fmin, cmin)])
+    return filas, filas_emg
+
+
+def _sesiones_del_libro(wb):
+    """[(ts, df)] de las hojas sesion_* de un libro ya abierto."""
+    import pandas as pd
+
+    out = []
+    for nombre in wb.sheetnames:
+        m = re.match(r"sesion_(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})", nombre)
+        if not m:
+            continue
+        filas = list(wb[nombre].values)
+        if not filas:
+            continue
+        df = pd.DataFrame(filas[1:], columns=filas[0])
+        out.append((datetime.strptime(m.group(1), "%Y-%m-%d_%H-%M-%S"), df))
+    return out
+
+
+def reconstruir_inicio(wb, sesiones=None):
+    """Rehace la hoja 'Inicio' entera (p.ej. si cambia el diseño) a partir
+    de todas las sesiones: las del libro si no se pasan [(ts, df), ...]."""
+    if sesiones is None:
+        sesiones = _sesiones_del_libro(wb)
+    filas, filas_emg = resumen_inicio_lote(sesiones)
+
+    if "Inicio" in wb.sheetnames:
+        wb.remove(wb["Inicio"])
+    asegurar_inicio_simple(wb)
+    ws = wb["Inicio"]
+    for i, fila in enumerate(filas, start=FILA_DATOS_INICIO):
+        for j, v in enumerate(fila, start=1):
+            ws.cell(row=i, column=j, value=v)
+    for i, fila in enumerate(filas_emg, start=FILA_DATOS_INICIO):
+        for j, v in enumerate(fila, start=7):
+            ws.cell(row=i, column=j, value=v)
+    fijar_cursor(wb, CURSOR_AD, 1, FILA_DATOS_INICIO + len(filas))
+    fijar_cursor(wb, CURSOR_GK, 7, FILA_DATOS_INICIO + len(filas_emg))
+    return ws
 
 def escribir_sesion(wb, hoja_nombre, df, table_name):
+    from openpyxl.utils import get_column_letter
+    from openpyxl.utils.dataframe import dataframe_to_rows
+    from openpyxl.worksheet.table import Table, TableStyleInfo
+
     if hoja_nombre in wb.sheetnames:
         base = hoja_nombre
         i = 2
@@ -243,106 +391,257 @@ def escribir_sesion(wb, hoja_nombre, df, table_name):
 
     return hoja_nombre
 
+# ===================== EXCEL EN STREAMING (write_only) =====================
+# Para libros Workbook(write_only=True): las filas se escriben directo al
+# archivo, sin una celda de openpyxl por valor, así la memoria no depende
+# del largo de la sesión.
+
+FILAS_MAX_HOJA = 1_048_576 - 1   # límite de Excel menos la cabecera
+FILAS_POR_TROZO = 10_000
+
+
+def _negrita(ws, valor, size=None):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    c = WriteOnlyCell(ws, value=valor)
+    c.font = Font(bold=True, size=size)
+    return c
+
+
+def escribir_inicio_stream(wb, filas, filas_emg):
+    """Hoja 'Inicio' (mismo diseño que asegurar_inicio_simple +
+    anexar_resumen_inicio) con todas sus filas de una vez."""
+    ws = wb.create_sheet("Inicio", 0)
+    ws.append([_negrita(ws, "Dashboard - Resumen (simple)", 14)])
+    ws.append([None] * 6 + [_negrita(ws, "Resumen EMG global (por sesión)")])
+    ws.append(["Fecha", "Ejercicio", "Min", "Max", None, None]
+              + [_negrita(ws, h) for h in ("Fecha", "Emg max", "Momento del EMG max",
+                                           "Emg min", "Momento del EMG min")])
+    for i in range(max(len(filas), len(filas_emg))):
+        a_d = filas[i] if i < len(filas) else [None] * 4
+        g_k = filas_emg[i] if i < len(filas_emg) else []
+        ws.append(list(a_d) + [None, None] + list(g_k))
+    fijar_cursor(wb, CURSOR_AD, 1, FILA_DATOS_INICIO + len(filas))
+    fijar_cursor(wb, CURSOR_GK, 7, FILA_DATOS_INICIO + len(filas_emg))
+    return ws
+
+
+def escribir_sesion_stream(wb, hoja_nombre, df, table_name, filas_max=FILAS_MAX_HOJA):
+    """Como escribir_sesion, para un libro write_only. Si la sesión no cabe
+    en una hoja se parte en hoja, hoja_2, ... (cada una con su tabla).
+    Devuelve los nombres de las hojas creadas."""
+    import pandas as pd
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.table import Table, TableStyleInfo, TableColumn
+
+    hojas = []
+    n = len(df)
+    for parte, ini in enumerate(range(0, max(n, 1), filas_max), start=1):
+        fin = min(ini + filas_max, n)
+        nombre = hoja_nombre if parte == 1 else (hoja_nombre[:28] + f"_{parte}")[:31]
+        base, i = nombre, 2
+        while nombre in wb.sheetnames:
+            nombre = (base[:28] + f"_{i}")[:31]
+            i += 1
+        ws = wb.create_sheet(nombre)
+
+        cabecera = [str(c) for c in df.columns]
+        ws.append(cabecera)
+        for a in range(ini, fin, FILAS_POR_TROZO):
+            valores = df.iloc[a:min(a + FILAS_POR_TROZO, fin)].to_numpy(dtype=object, copy=True)
+            valores[pd.isna(valores)] = None
+            for r in valores.tolist():
+                ws.append(r)
+
+        ref = f"A1:{get_column_letter(len(df.columns))}{fin - ini + 1}"
+        tbl = Table(displayName=table_name if parte == 1 else f"{table_name[:28]}_{parte}", ref=ref)
+        tbl.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
+        # En write_only openpyxl no lee la cabecera: columnas de la tabla a mano
+        tbl.tableColumns = [TableColumn(id=j, name=h) for j, h in enumerate(cabecera, start=1)]
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", UserWarning)   # "must add table columns manually"
+            ws.add_table(tbl)
+        hojas.append(nombre)
+    return hojas
+
 # ===================== CAPTURA ARDUINO =====================
 
-def _extraer_numero(linea: str):
-    match = re.search(r"[-+]?\d*\.\d+|\d+", linea)
-    return float(match.group()) if match else None
+def capturar_rom_desde_arduino(cmd, nombre_col, conexion=None, ruta_diario=None):
+    """Captura un ejercicio. Si se pasa `conexion` (ConexionSerial abierta para
+    todo el examen) se reutiliza el puerto; si no, se abre y cierra aquí.
+    Con `ruta_diario` las muestras se van escribiendo a disco (DiarioCaptura)
+    en vez de quedar solo en memoria."""
+    from conexion_serial import ConexionSerial
+    from tramas import CAMPO_POR_CMD
+    from lector_serial import LectorSerial
+    from muestras import BufferMuestras
+    from diario import DiarioCaptura
+    from reloj import ModeloReloj, COL_T_HOST, tiempos_de_bloque
+    from pantalla import PantallaEnVivo
 
-def capturar_rom_desde_arduino(cmd, nombre_col):
     duracion = int(input(f"Tiempo de captura para {nombre_col}: "))
 
-    print(f"\n📡 Abriendo puerto {SERIAL_PORT}...")
-    ser = serial.Serial(port=SERIAL_PORT, baudrate=BAUD_RATE, timeout=1)
-    time.sleep(2)
-
-    print(f"➡ Enviando comando '{cmd}'...")
-    ser.write(cmd.encode())
-    time.sleep(0.3)
-
-    print("➡ TARA enviada...")
-    ser.write(b" ")
-    time.sleep(0.3)
-
-    t0 = time.time()
-    timestamps, valores = [], []
-
-    print(f"🎥 Capturando {duracion} segundos...\n")
+    propia = conexion is None
+    if propia:
+        print(f"\n📡 Abriendo puerto {SERIAL_PORT}...")
+        conexion = ConexionSerial(SERIAL_PORT, BAUD_RATE, binario=MODO_BINARIO).abrir()
 
-    while (time.time() - t0) < duracion:
-        linea = ser.readline().decode(errors="ignore").strip()
-        val = _extraer_numero(linea)
-        if val is None:
-            continue
-        ts = time.time() - t0
-        timestamps.append(ts)
-        valores.append(val)
-        print(f"[{ts:6.2f}s] {val:8.2f}")
-
-    print("\n🛑 Enviando 'e'...")
-    ser.write(b"e")
-    ser.close()
-
-    # DF solo con tiempo y la columna del ejercicio
-    df = pd.DataFrame({
-        "timestamp_s": timestamps,
-        nombre_col: valores
-    })
+    buf = None
+    try:
+        print(f"➡ Enviando comando '{cmd}' + TARA...")
+        conexion.iniciar_ejercicio(cmd)
+
+        parser = conexion.crear_parser()
+        campo = CAMPO_POR_CMD[cmd]
+        col_emg = EMG_DE[nombre_col]
+        canales = ["timestamp_s", COL_T_HOST, nombre_col, col_emg]
+        if ruta_diario is None:
+            buf = BufferMuestras(canales)
+        else:
+            buf = DiarioCaptura(ruta_diario, canales, {"cmd": cmd, "nombre_col": nombre_col}).abrir()
+        reloj = ModeloReloj()
+        t_dev0 = None
+        t0 = time.time()
+
+        print(f"🎥 Capturando {duracion} segundos...\n")
+
+        with LectorSerial(conexion) as lector, PantallaEnVivo(nombre_col, MODO_PANTALLA) as pantalla:
+            generacion = lector.generacion
+            while (time.time() - t0) < duracion:
+                datos = lector.leer()
+                if lector.generacion != generacion:
+                    # reconexión: el modo (texto/binario) se negoció de nuevo
+                    # y lo que quedó a medias en el parser ya no sirve
+                    generacion = lector.generacion
+                    parser = conexion.crear_parser(generacion)
+                cols, _ = parser.alimentar(datos)
+                n = len(cols["t"])
+                if not n:
+                    continue
+                t_dev, t_host = tiempos_de_bloque(reloj, cols["t"], time.time() - t0)
+                if t_dev0 is None:
+                    t_dev0 = t_dev[0]
+                buf.agregar_bloque({"timestamp_s": t_dev - t_dev0, COL_T_HOST: t_host,
+                                    nombre_col: cols[campo], col_emg: cols["emg_env"]})
+                pantalla.publicar(t_dev - t_dev0, cols[campo])
+
+        est = reloj.estadisticas()
+        print(f"⏱ Reloj: deriva {est['deriva_ppm']:+.0f} ppm, jitter {est['jitter_ms']:.1f} ms "
+              f"(máx {est['jitter_max_ms']:.1f} ms)")
+        if lector.desbordes:
+            print(f"⚠️ Se descartaron {lector.bytes_descartados} bytes ({lector.desbordes} desbordes).")
+
+        print("\n🛑 Enviando 'e'...")
+        conexion.detener_ejercicio()
+    finally:
+        if isinstance(buf, DiarioCaptura):
+            buf.cerrar()
+        if propia:
+            conexion.cerrar()
+
+    # DF con tiempo de dispositivo y de PC, la columna del ejercicio y su EMG
+    # (vistas del buffer o del diario mapeado, sin copia); las estadísticas
+    # del reloj viajan en attrs
+    df = buf.a_dataframe()
+    df.attrs["reloj"] = est
 
     return df
 
+# ===================== UNIÓN DE CAPTURAS =====================
+
+def unir_capturas(lista_dfs, modo="columnas"):
+    """Une las capturas de cada ejercicio en un DF con COLS: fila a fila
+    ("columnas") o alineadas por timestamp_s ("tiempo", ver sesion.py).
+    Solo para exportar/mostrar: el almacén guarda las capturas por separado."""
+    from sesion import densificar
+
+    return densificar(lista_dfs, modo, COLS)
+
+# ===================== RECUPERACIÓN DEL DIARIO =====================
+
+def recuperar_sesiones(carpeta_paciente):
+    """Ofrece pasar al almacén las sesiones del diario que no se guardaron
+    (corte de luz, cuelgue a mitad del examen)."""
+    from diario import sesiones_pendientes, cargar_sesion, descartar_sesion
+
+    pendientes = sesiones_pendientes(carpeta_paciente)
+    if not pendientes:
+        return 0
+    print(f"\n⚠️ Hay {len(pendientes)} sesión(es) capturada(s) sin guardar.")
+    if input("¿Recuperarlas ahora? (s/n): ").strip().lower() != "s":
+        return 0
+    from almacen import guardar_sesion
+    for carpeta in pendientes:
+        info, dfs = cargar_sesion(carpeta, mmap=False)
+        if dfs:
+            hoja = guardar_sesion(carpeta_paciente, dfs, info["ts"], info["hoja"], info["table_name"])
+            print(f"♻️ Recuperada: {hoja} ({sum(len(df) for df in dfs)} muestras)")
+        descartar_sesion(carpeta)
+    return len(pendientes)
+
 # ===================== MAIN =====================
 
 def main():
+    # lo pesado se carga mientras el operador elige la prueba y escribe la
+    # cédula; lo de guardar/exportar termina durante la primera captura
+    precargar()
     pf = menu_prueba_funcional()
     paciente_id = pedir_cedula()
 
-    ruta_xlsx = MAIN_DIR / paciente_id / EXCEL_NAME
+    from conexion_serial import ConexionSerial
+    from diario import iniciar_sesion, ruta_ejercicio, descartar_sesion
+    from cola_excel import TrabajadorCola, exportar_o_encolar, pendientes as exportaciones_pendientes
 
-    try:
-        wb = abrir_o_crear_xlsx(ruta_xlsx)
-    except PermissionError:
-        print("❌ Cierra el Excel e intenta de nuevo.")
-        return
+    carpeta_paciente = MAIN_DIR / paciente_id
+    recuperar_sesiones(carpeta_paciente)
 
-    asegurar_inicio_simple(wb)
+    # Exportaciones que quedaron en cola (Excel abierto) se aplican mientras se captura
+    cola = TrabajadorCola(MAIN_DIR, al_exportar=lambda e, ruta: print(f"\n📄 Excel al día: {ruta}"))
+    cola.start()
 
     ts, hoja , table_name = ahora_nombres()
+    carpeta_diario = iniciar_sesion(carpeta_paciente, ts, hoja, table_name)
     lista_dfs = []
 
-    for cmd, nombre_col in pf["ejercicios"]:
-        print(f"\n=== Capturando: {nombre_col} ===")
-        df_ej = capturar_rom_desde_arduino(cmd, nombre_col)
-        lista_dfs.append(df_ej)
-
-    # Unir todas las capturas sin cortar nada
-    df_final = lista_dfs[0].copy()
-
-    for df_ej, (cmd, nombre_col) in zip(lista_dfs[1:], pf["ejercicios"][1:]):
-        max_len = max(len(df_final), len(df_ej))
-        df_final = df_final.reindex(range(max_len))
-        df_ej    = df_ej.reindex(range(max_len))
-        df_final[nombre_col] = df_ej[nombre_col]
-
-    # --- Asegurar que existan todas las columnas ---
-    for c in COLS:
-        if c not in df_final.columns:
-            df_final[c] = np.nan
-
-    # --- Orden final de columnas ---
-    df_final = df_final[COLS]
-
-    # Escribir sesión
-    hoja_final = escribir_sesion(wb, hoja, df_final, table_name)
-
-    anexar_resumen_inicio(wb, ts, df_final)
-
-    wb.save(ruta_xlsx)
+    # Un solo puerto para todo el examen (un único reinicio del Arduino)
+    print(f"\n📡 Abriendo puerto {SERIAL_PORT}...")
+    with ConexionSerial(SERIAL_PORT, BAUD_RATE, binario=MODO_BINARIO) as conexion:
+        for cmd, nombre_col in pf["ejercicios"]:
+            print(f"\n=== Capturando: {nombre_col} ===")
+            df_ej = capturar_rom_desde_arduino(cmd, nombre_col, conexion,
+                                               ruta_diario=ruta_ejercicio(carpeta_diario, cmd))
+            lista_dfs.append(df_ej)
+        if conexion.reconexiones:
+            print(f"⚠️ Se recuperó la conexión {conexion.reconexiones} vez/veces durante el examen.")
+
+    # Guardar sesión en el almacén del paciente: solo lo medido en cada
+    # ejercicio; la hoja con COLS (unir_capturas) se arma al exportar
+    from almacen import guardar_sesion
+    hoja_final = guardar_sesion(carpeta_paciente, lista_dfs, ts, hoja, table_name, pf["nombre"],
+                                disposicion=UNION)
+
+    del lista_dfs   # soltar los diarios mapeados antes de borrarlos
+    descartar_sesion(carpeta_diario)
 
     print("\n✅ Sesión guardada correctamente.")
-    print(f"Archivo: {ruta_xlsx}")
-    print(f"Hoja creada: {hoja_final}")
+    print(f"Sesión: {hoja_final}")
+
+    # Lecturas.xlsx se regenera desde el almacén; si está abierto queda en cola
+    cola.detener()
+    if EXPORTAR_AL_GUARDAR:
+        ruta_xlsx = exportar_o_encolar(carpeta_paciente, hoja_final)
+        if ruta_xlsx is not None:
+            print(f"Archivo: {ruta_xlsx}")
+        else:
+            print("⏳ El Excel está abierto: la exportación quedó en cola. Se aplica sola en el "
+                  "próximo examen, o ciérralo y ejecuta: python cola_excel.py drenar")
+    else:
+        print(f"Excel: python almacen.py exportar {paciente_id}")
+    n_cola = len(exportaciones_pendientes(MAIN_DIR))
+    if n_cola:
+        print(f"⏳ Exportaciones pendientes: {n_cola} (python cola_excel.py estado)")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
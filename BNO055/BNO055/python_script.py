@@ -11,19 +11,23 @@ import time
 import sys
 import threading
 
-import numpy as np
-import pandas as pd
-import serial
-
-from openpyxl import load_workbook, Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.worksheet.table import Table, TableStyleInfo
-from openpyxl.styles import Font
-from openpyxl.utils import get_column_letter
+# pyserial, numpy, pandas y openpyxl (captura, diario, almacén) se importan
+# donde se usan: STATUS:READY sale enseguida y precargar() los va cargando
+# en segundo plano mientras la app manda PATIENT y el primer START
+from precarga import precargar
+from cola_excel import (TrabajadorCola, exportar_o_encolar, encolar, drenar,
+                        pendientes as exportaciones_pendientes)
+from pantalla import PantallaEnVivo, MODO_MAQUINA, MODO_SILENCIO, emitir
 
 # ---------------- CONFIG (ajusta si hace falta) ----------------
 MAIN_DIR = Path(r"C:\Users\Adrian Jr\Desktop\VICENT\BNO055\PacienteData")
 EXCEL_NAME = "Lecturas.xlsx"
+# SAVE responde STORED:<hoja> en cuanto la sesión está en el almacén y, como
+# siempre, SAVED:<xlsx> cuando Lecturas.xlsx la incluye. El libro se rehace
+# entero desde el almacén (crece con el historial), así que por defecto lo
+# hace el hilo de la cola y SAVE no lo espera (varios SAVE seguidos se
+# exportan una vez). True: exportar dentro de SAVE, antes de responder.
+EXPORTAR_AL_GUARDAR = False
 
 SERIAL_PORT = "COM4"
 BAUD_RATE = 115200
@@ -48,6 +52,8 @@ EMG_MAP = {
     "EMG(FP)_mv":  "Fuerza de Prensión_Kg",
 }
 
+EMG_DE = {col: emg for emg, col in EMG_MAP.items()}
+
 # ---------------- utilidades (copiadas/adaptadas) ----------------
 
 def ahora_nombres():
@@ -57,65 +63,32 @@ def ahora_nombres():
     table_name = re.sub(r'[^A-Za-z0-9_]', '_', table_name)[:31]
     return ts, hoja, table_name
 
-def abrir_o_crear_xlsx(ruta):
-    ruta.parent.mkdir(parents=True, exist_ok=True)
-    if ruta.exists():
-        return load_workbook(ruta)
-    wb = Workbook()
-    wb.save(ruta)
-    return wb
-
-def asegurar_inicio_simple(wb):
-    if "Inicio" not in wb.sheetnames:
-        ws = wb.create_sheet("Inicio", 0)
-        ws["A1"].value = "Dashboard - Resumen"
-        ws["A1"].font = Font(bold=True, size=14)
-        ws.append([])
-        ws.append(["Fecha", "Ejercicio", "Min", "Max"])
-
-def escribir_sesion(wb, hoja_nombre, df, table_name):
-    if hoja_nombre in wb.sheetnames:
-        base = hoja_nombre
-        i = 2
-        while hoja_nombre in wb.sheetnames:
-            hoja_nombre = (base[:28] + f"_{i}")[:31]
-            i += 1
-
-    ws = wb.create_sheet(hoja_nombre)
-
-    for r in dataframe_to_rows(df, index=False, header=True):
-        ws.append(r)
-
-    max_row, max_col = ws.max_row, ws.max_column
-    last_col = get_column_letter(max_col)
-    ref = f"A1:{last_col}{max_row}"
-
-    tbl = Table(displayName=table_name, ref=ref)
-    tbl.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
-    ws.add_table(tbl)
-
-    return hoja_nombre
-
 # ---------------- capturar desde Arduino (adaptada) ----------------
 
-def _extraer_numero(linea: str):
-    match = re.search(r"[-+]?\d*\.\d+|\d+", linea)
-    return float(match.group()) if match else None
-
-def capturar_rom_desde_arduino(cmd: str, nombre_col: str, duracion: int, serial_port=SERIAL_PORT, baud=BAUD_RATE):
+def capturar_rom_desde_arduino(cmd: str, nombre_col: str, duracion: int, serial_port=SERIAL_PORT, baud=BAUD_RATE,
+                               modo_pantalla=MODO_MAQUINA, ruta_diario=None):
     """
     Ejecuta una captura no interactiva:
       cmd: comando que se enviará por Serial (ej "1")
       nombre_col: nombre de columna (ej "ROM Flexión/Extensión_°")
       duracion: segundos de captura
-    Devuelve DataFrame con columnas (COLS) y la columna `nombre_col` llena.
-    Mientras captura imprime por stdout líneas máquina-amigables:
+    Devuelve DataFrame solo con los canales medidos (tiempos, `nombre_col` y su EMG).
+    Mientras captura imprime por stdout líneas máquina-amigables, en lotes
+    a ~10 Hz (modo_pantalla="silencio" para no emitirlas):
       DATA:<colname>,<timestamp_s>,<value>
+    Con `ruta_diario` las muestras se escriben a disco mientras llegan.
     """
+    import serial
+    from tramas import ParserTramas, CAMPO_POR_CMD
+    from lector_serial import LectorSerial
+    from muestras import BufferMuestras
+    from diario import DiarioCaptura
+    from reloj import ModeloReloj, COL_T_HOST, tiempos_de_bloque
+
     try:
         ser = serial.Serial(port=serial_port, baudrate=baud, timeout=SERIAL_TIMEOUT)
     except Exception as e:
-        print(f"ERROR:SERIAL_OPEN:{e}", flush=True)
+        emitir(f"ERROR:SERIAL_OPEN:{e}")
         return None
 
     # dar tiempo a Arduino
@@ -131,33 +104,63 @@ def capturar_rom_desde_arduino(cmd: str, nombre_col: str, duracion: int, serial_
     ser.flush()
     time.sleep(0.05)
 
+    parser = ParserTramas()
+    campo = CAMPO_POR_CMD.get(cmd.strip()[:1], "angle")
+    col_emg = EMG_DE.get(nombre_col)
+    canales = ["timestamp_s", COL_T_HOST, nombre_col] + ([col_emg] if col_emg else [])
+    if ruta_diario is None:
+        buf = BufferMuestras(canales)
+    else:
+        buf = DiarioCaptura(ruta_diario, canales, {"cmd": cmd, "nombre_col": nombre_col}).abrir()
+    reloj = ModeloReloj()
+    t_dev0 = None
     t0 = time.time()
-    timestamps, valores = [], []
 
-    print(f"STATUS:CAPTURE_STARTED:{nombre_col}", flush=True)
+    emitir(f"STATUS:CAPTURE_STARTED:{nombre_col}")
 
-    while (time.time() - t0) < duracion:
-        try:
-            linea = ser.readline().decode(errors="ignore").strip()
-        except Exception:
-            linea = ""
-        if not linea:
-            continue
-
-        # Intenta extraer número como antes
-        val = _extraer_numero(linea)
-        if val is None:
-            # si la línea contiene mensajes del Arduino podemos reenviarlos por stdout
-            # por ejemplo: CAPTURE_START, END, etc
-            print(f"HWMSG:{linea}", flush=True)
-            continue
-
-        ts = time.time() - t0
-        timestamps.append(ts)
-        valores.append(val)
-
-        # Emitir línea máquina-amigable para que la UI muestre en tiempo real
-        print(f"DATA:{nombre_col},{ts:.3f},{val:.6f}", flush=True)
+    lector = LectorSerial(ser)
+    pantalla = PantallaEnVivo(nombre_col, modo_pantalla)
+    try:
+        lector.start()
+        pantalla.iniciar()
+        while (time.time() - t0) < duracion:
+            try:
+                datos = lector.leer()
+            except Exception as e:
+                # el hilo lector murió (puerto desconectado): se corta aquí y se
+                # avisa, en vez de girar sin datos hasta agotar la duración
+                pantalla.mensaje(f"ERROR:SERIAL_LOST:{e}")
+                break
+            if not datos:
+                continue
+
+            cols, mensajes = parser.alimentar(datos)
+
+            # mensajes del Arduino (ZERO_OK, menú, avisos) se reenvían por stdout
+            for m in mensajes:
+                pantalla.mensaje(f"HWMSG:{m}")
+
+            n = len(cols["t"])
+            if not n:
+                continue
+
+            t_dev, t_host = tiempos_de_bloque(reloj, cols["t"], time.time() - t0)
+            if t_dev0 is None:
+                t_dev0 = t_dev[0]
+            buf.agregar_bloque({"timestamp_s": t_dev - t_dev0, COL_T_HOST: t_host,
+                                nombre_col: cols[campo], col_emg: cols["emg_env"]})
+
+            # Líneas máquina-amigables para la UI (se escriben en lotes)
+            pantalla.publicar(t_dev - t_dev0, cols[campo])
+    finally:
+        lector.detener()
+        pantalla.cerrar()
+
+    est = lector.estadisticas()
+    emitir(f"STATUS:LINK:{est['bytes']},{est['bytes_por_segundo']:.0f},{est['desbordes']}")
+    est_reloj = reloj.estadisticas()
+    emitir(f"STATUS:CLOCK:{est_reloj['deriva_ppm']:.1f},{est_reloj['jitter_ms']:.2f},"
+           f"{est_reloj['jitter_max_ms']:.2f}")
 
     # señal de fin al Arduino (como tu Python hacía)
     try:
@@ -167,22 +170,44 @@ def capturar_rom_desde_arduino(cmd: str, nombre_col: str, duracion: int, serial_
         pass
     ser.close()
 
-    # crear DataFrame con la estructura de COLS
-    df = pd.DataFrame({c: [1]*len(valores) for c in COLS})
-    df["timestamp_s"] = timestamps
-    df[nombre_col] = valores
-    print(f"STATUS:CAPTURE_END:{nombre_col}", flush=True)
+    # DataFrame solo con los canales medidos (vistas del buffer o del diario,
+    # sin copia); las columnas que faltan de COLS se completan al exportar.
+    df = buf.a_dataframe()
+    df.attrs["reloj"] = est_reloj
+    emitir(f"STATUS:CAPTURE_END:{nombre_col}")
     return df
 
 # ---------------- controlador por stdin ----------------
+# Protocolo por líneas (stdin -> stdout):
+#   PATIENT:<cedula>          -> STATUS:PATIENT_SET:<cedula> [STATUS:PENDING:<n>]
+#   START:<cmd>:<col>:<seg>   -> STATUS:CAPTURE_STARTED, DATA:/HWMSG: durante la
+#                                captura, STATUS:LINK/CLOCK, STATUS:CAPTURE_END
+#                                (ERROR:SERIAL_OPEN / ERROR:SERIAL_LOST)
+#   SAVE                      -> STORED:<hoja> y después SAVED:<ruta xlsx>
+#                                (si el Excel está abierto, SAVED llega al cerrarlo)
+#   EXPORT                    -> SAVED:<ruta xlsx> | QUEUED:<cedula>
+#   QUEUE                     -> QUEUE:<n>:<cedula>,...
+#   RECOVER                   -> RECOVERED:<n>
+#   DISPLAY:maquina|silencio  -> STATUS:DISPLAY:<modo>
+#   STATUS                    -> STATUS:READY
+#   EXIT                      -> (SAVED: pendientes) STATUS:EXITING
+# STORED: es nueva; un cliente que solo espera SAVED: tras SAVE la ignora.
 
 class Controller:
     def __init__(self):
         self.patient_id = None
         self.session_dfs = []  # lista de dataframes por ejercicio en la sesión
+        self.sesion = None     # (ts, hoja, table_name) fijados en el primer START
+        self.carpeta_diario = None
         self.serial_port = SERIAL_PORT
         self.baud = BAUD_RATE
-        print("STATUS:READY", flush=True)
+        self.modo_pantalla = MODO_MAQUINA
+        # exporta en segundo plano lo que quedó en cola por un Excel abierto
+        self.cola = TrabajadorCola(MAIN_DIR, al_exportar=self._exportado_en_cola,
+                                   al_fallar=self._fallo_en_cola)
+        self.cola.start()
+        precargar()
+        emitir("STATUS:READY")
 
     def handle_line(self, line: str):
         line = line.strip()
@@ -194,63 +219,154 @@ class Controller:
             _, val = line.split(":", 1)
             val = re.sub(r"[.\s-]+", "", val)
             self.patient_id = val
-            print(f"STATUS:PATIENT_SET:{self.patient_id}", flush=True)
+            emitir(f"STATUS:PATIENT_SET:{self.patient_id}")
+            from diario import sesiones_pendientes
+            pendientes = sesiones_pendientes(MAIN_DIR / self.patient_id)
+            if pendientes:
+                emitir(f"STATUS:PENDING:{len(pendientes)}")
+            return
+
+        if line.upper() == "RECOVER":
+            # pasa al Excel las sesiones del diario que no llegaron a guardarse
+            self.recuperar()
+            return
+
+        if line.upper().startswith("DISPLAY:"):
+            # DISPLAY:maquina (DATA en lotes) | DISPLAY:silencio
+            modo = line.split(":", 1)[1].strip().lower()
+            if modo not in (MODO_MAQUINA, MODO_SILENCIO):
+                emitir("ERROR:DISPLAY_MODE")
+                return
+            self.modo_pantalla = modo
+            emitir(f"STATUS:DISPLAY:{modo}")
             return
 
         if line.upper().startswith("START:"):
             # formato START:cmd:colname:dur
             parts = line.split(":", 3)
             if len(parts) < 4:
-                print("ERROR:START_FORMAT", flush=True)
+                emitir("ERROR:START_FORMAT")
                 return
             _, cmd, colname, dur_s = parts
             try:
                 dur = int(dur_s)
             except:
-                print("ERROR:DURATION", flush=True)
+                emitir("ERROR:DURATION")
                 return
+            # la sesión (y su diario en disco) empieza con el primer START
+            from diario import iniciar_sesion, ruta_ejercicio
+            ruta_diario = None
+            if self.sesion is None:
+                self.sesion = ahora_nombres()
+                if self.patient_id:
+                    self.carpeta_diario = iniciar_sesion(MAIN_DIR / self.patient_id, *self.sesion)
+            if self.carpeta_diario is not None:
+                ruta_diario = ruta_ejercicio(self.carpeta_diario, cmd)
             # iniciar captura (bloqueante) y añadir DF a session_dfs
-            df = capturar_rom_desde_arduino(cmd, colname, dur, serial_port=self.serial_port, baud=self.baud)
+            df = capturar_rom_desde_arduino(cmd, colname, dur, serial_port=self.serial_port, baud=self.baud,
+                                            modo_pantalla=self.modo_pantalla, ruta_diario=ruta_diario)
             if df is not None:
                 self.session_dfs.append(df)
             return
 
         if line.upper() == "SAVE":
-            # guarda todas las sesiones acumuladas en un archivo xlsx en MAIN_DIR/patient_id/
+            # guarda la sesión en el almacén del paciente (MAIN_DIR/patient_id/)
+            # -> STORED:<hoja>; el xlsx se regenera desde ahí -> SAVED:<ruta>
             if not self.patient_id:
-                print("ERROR:NO_PATIENT", flush=True)
-                return
-            ruta_xlsx = MAIN_DIR / self.patient_id / EXCEL_NAME
-            try:
-                wb = abrir_o_crear_xlsx(ruta_xlsx)
-            except PermissionError:
-                print("ERROR:EXCEL_LOCKED", flush=True)
+                emitir("ERROR:NO_PATIENT")
                 return
-            asegurar_inicio_simple(wb)
-            ts, hoja, table_name = ahora_nombres()
+            ts, hoja, table_name = self.sesion or ahora_nombres()
             if not self.session_dfs:
-                print("ERROR:NO_DATA", flush=True)
+                emitir("ERROR:NO_DATA")
                 return
-            df_final = pd.concat(self.session_dfs, ignore_index=True)
-            hoja_final = escribir_sesion(wb, hoja, df_final, table_name)
+            # solo los canales medidos; la hoja densa (un ejercicio debajo
+            # del otro) se arma al exportar
+            from almacen import guardar_sesion
+            from diario import descartar_sesion
             try:
-                wb.save(ruta_xlsx)
-                print(f"SAVED:{ruta_xlsx}", flush=True)
-                # limpiar lista de dfs después de guardar
-                self.session_dfs = []
+                hoja_final = guardar_sesion(MAIN_DIR / self.patient_id, self.session_dfs, ts, hoja,
+                                            table_name, disposicion="filas")
             except Exception as e:
-                print(f"ERROR:SAVE_FAILED:{e}", flush=True)
+                emitir(f"ERROR:SAVE_FAILED:{e}")
+                return
+            emitir(f"STORED:{hoja_final}")
+            # limpiar lista de dfs (y el diario) después de guardar
+            self.session_dfs = []
+            if self.carpeta_diario is not None:
+                descartar_sesion(self.carpeta_diario)
+            self.sesion = None
+            self.carpeta_diario = None
+            if EXPORTAR_AL_GUARDAR:
+                self.exportar(hoja_final)
+            else:
+                # SAVED: lo emite el hilo de la cola cuando el libro esté al día
+                encolar(MAIN_DIR / self.patient_id, hoja_final)
+                self.cola.despertar()
+            return
+
+        if line.upper() == "EXPORT":
+            # regenera Lecturas.xlsx desde el almacén (o lo deja en cola)
+            self.exportar()
+            return
+
+        if line.upper() == "QUEUE":
+            # QUEUE:<n>:<cedula>,<cedula>... exportaciones pendientes
+            entradas = exportaciones_pendientes(MAIN_DIR)
+            emitir(f"QUEUE:{len(entradas)}:{','.join(e['cedula'] for e in entradas)}")
             return
 
         if line.upper() == "STATUS":
-            print("STATUS:READY", flush=True)
+            emitir("STATUS:READY")
             return
 
         if line.upper() == "EXIT":
-            print("STATUS:EXITING", flush=True)
+            # lo que quedó encolado por un SAVE reciente sale antes de EXITING
+            self.cola.detener()
+            drenar(MAIN_DIR, self._exportado_en_cola, self._fallo_en_cola)
+            emitir("STATUS:EXITING")
             sys.exit(0)
 
-        print(f"ERROR:UNKNOWN_CMD:{line}", flush=True)
+        emitir(f"ERROR:UNKNOWN_CMD:{line}")
+
+
+    def exportar(self, hoja=None):
+        if not self.patient_id:
+            emitir("ERROR:NO_PATIENT")
+            return
+        try:
+            ruta_xlsx = exportar_o_encolar(MAIN_DIR / self.patient_id, hoja)
+        except Exception as e:
+            emitir(f"ERROR:EXPORT_FAILED:{e}")
+            return
+        if ruta_xlsx is None:
+            # Excel abierto: SAVED llega solo cuando se cierre
+            emitir(f"QUEUED:{self.patient_id}")
+            return
+        emitir(f"SAVED:{ruta_xlsx}")
+
+    # Llamados desde el hilo de la cola: emitir() no los mezcla con DATA:
+    def _exportado_en_cola(self, entrada, ruta_xlsx):
+        emitir(f"SAVED:{ruta_xlsx}")
+
+    def _fallo_en_cola(self, entrada, error):
+        emitir(f"ERROR:EXPORT_FAILED:{entrada['cedula']}:{error}")
+
+    def recuperar(self):
+        if not self.patient_id:
+            emitir("ERROR:NO_PATIENT")
+            return
+        from diario import sesiones_pendientes, cargar_sesion, descartar_sesion
+        from almacen import guardar_sesion
+
+        carpeta_paciente = MAIN_DIR / self.patient_id
+        pendientes = [c for c in sesiones_pendientes(carpeta_paciente) if c != self.carpeta_diario]
+        for carpeta in pendientes:
+            info, dfs = cargar_sesion(carpeta, mmap=False)
+            if dfs:
+                guardar_sesion(carpeta_paciente, dfs, info["ts"], info["hoja"], info["table_name"],
+                               disposicion="filas")
+            descartar_sesion(carpeta)
+        emitir(f"RECOVERED:{len(pendientes)}")
 
 
 def stdin_reader(controller: Controller):
@@ -268,7 +384,7 @@ def main():
     try:
         stdin_reader(ctrl)
     except Exception as e:
-        print(f"ERROR:CRASH:{e}", flush=True)
+        emitir(f"ERROR:CRASH:{e}")
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+import numpy as np
+
+# ===================== RELOJ DISPOSITIVO ↔ HOST =====================
+
+COL_T_HOST = "t_host_s"   # tiempo de llegada al PC (junto a timestamp_s)
+
+
+class ModeloReloj:
+    """Ajuste lineal continuo entre el reloj del Arduino y el del PC.
+
+        t_host ≈ offset + pendiente · t_dispositivo
+
+    Se actualiza con sumas acumuladas (mínimos cuadrados, O(1) por bloque),
+    así que sirve en vivo durante la captura. `pendiente - 1` es la deriva
+    del cristal del Arduino y los residuos son el jitter de USB/planificador.
+
+    También vuelve continuo el tiempo del dispositivo: si retrocede (el
+    Arduino se reinició tras una reconexión) se encadena tras la última
+    muestra, de modo que `timestamp_s` sea siempre monótono.
+    """
+
+    def __init__(self):
+        self._n = 0
+        self._sx = self._sy = self._sxx = self._sxy = self._syy = 0.0
+        self._x0 = None            # origen para no perder precisión
+        self._ultimo_dev = None
+        self._salto = 0.0
+        self._dt = 0.0
+        self.reinicios = 0
+        self.residuo_max = 0.0
+
+    # ---------- tiempo del dispositivo ----------
+
+    def continuo(self, t_dev):
+        """Tiempo de dispositivo sin retrocesos (segundos)."""
+        t = np.asarray(t_dev, dtype=np.float64)
+        if not len(t):
+            return t
+        previo = t[0] if self._ultimo_dev is None else self._ultimo_dev
+        d = np.diff(np.concatenate(([previo], t)))
+        pos = d[d > 0]
+        if len(pos):
+            self._dt = float(np.median(pos))
+        atras = d < 0
+        if atras.any():
+            self.reinicios += int(atras.sum())
+        corr = np.cumsum(np.where(atras, -d + self._dt, 0.0))
+        self._ultimo_dev = float(t[-1])
+        out = t + self._salto + corr
+        self._salto += float(corr[-1])
+        return out
+
+    # ---------- ajuste ----------
+
+    def agregar(self, t_dev, t_host):
+        """Añade pares (dispositivo continuo, host) y actualiza el ajuste."""
+        x = np.asarray(t_dev, dtype=np.float64)
+        y = np.broadcast_to(np.asarray(t_host, dtype=np.float64), x.shape)
+        ok = ~np.isnan(x)
+        x, y = x[ok], y[ok]
+        if not len(x):
+            return
+        if self._x0 is None:
+            self._x0 = (float(x[0]), float(y[0]))
+        x = x - self._x0[0]
+        y = y - self._x0[1]
+        if self._n >= 2:
+            res = y - self.a_host(x + self._x0[0]) + self._x0[1]
+            self.residuo_max = max(self.residuo_max, float(np.abs(res).max()))
+        self._n += len(x)
+        self._sx += float(x.sum())
+        self._sy += float(y.sum())
+        self._sxx += float((x * x).sum())
+        self._sxy += float((x * y).sum())
+        self._syy += float((y * y).sum())
+
+    def _parametros(self):
+        n = self._n
+        if n < 2:
+            return 1.0, (self._sy - self._sx) / n if n else 0.0
+        cxx = self._sxx - self._sx * self._sx / n
+        if cxx <= 0:
+            return 1.0, (self._sy - self._sx) / n
+        b = (self._sxy - self._sx * self._sy / n) / cxx
+        a = (self._sy - b * self._sx) / n
+        return b, a
+
+    @property
+    def pendiente(self):
+        return self._parametros()[0]
+
+    def a_host(self, t_dev):
+        """Convierte tiempo del dispositivo a tiempo del PC."""
+        if self._x0 is None:
+            return np.asarray(t_dev, dtype=np.float64)
+        b, a = self._parametros()
+        return self._x0[1] + a + b * (np.asarray(t_dev, dtype=np.float64) - self._x0[0])
+
+    def estadisticas(self):
+        n = self._n
+        b, _ = self._parametros()
+        jitter = 0.0
+        if n > 2:
+            cxx = self._sxx - self._sx * self._sx / n
+            cyy = self._syy - self._sy * self._sy / n
+            cxy = self._sxy - self._sx * self._sy / n
+            sse = cyy - (cxy * cxy / cxx if cxx > 0 else 0.0)
+            jitter = float(np.sqrt(max(sse, 0.0) / (n - 2)))
+        return {
+            "muestras": n,
+            "deriva_ppm": (b - 1.0) * 1e6,
+            "jitter_ms": jitter * 1e3,
+            "jitter_max_ms": self.residuo_max * 1e3,
+            "reinicios": self.reinicios,
+        }
+
+
+def tiempos_de_bloque(modelo, t_dev, t_host):
+    """Tiempos de un bloque recién parseado.
+
+    Devuelve (t_dispositivo continuo, t_host). `t_host` es la hora de
+    llegada del bloque, que solo es fiel para su última trama (las demás
+    llegaron antes), así que solo esa entra en el ajuste. Si el firmware no
+    manda tiempo (BNO055.ino en texto) se usa el del PC para ambos.
+    """
+    t_dev = np.asarray(t_dev, dtype=np.float64)
+    if np.isnan(t_dev).all():
+        return np.full(t_dev.shape, t_host), np.full(t_dev.shape, t_host)
+    t_cont = modelo.continuo(t_dev)
+    modelo.agregar(t_cont[-1:], t_host)
+    return t_cont, np.full(t_dev.shape, t_host)
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Remuestreo de sesiones a una rejilla uniforme (p.ej. 100 Hz o 10 Hz).
+
+Las muestras llegan a tiempos irregulares y cada ejercicio (tramo, ver
+sesion.py) tiene su propia base de tiempo. Aquí cada tramo pasa a una
+rejilla de paso fijo 1/hz, con los puntos en múltiplos exactos de 1/hz
+(así dos sesiones remuestreadas a la misma frecuencia comparten rejilla):
+
+    "lineal"   interpolación lineal entre la muestra anterior y la siguiente
+    "cercano"  la muestra más cercana (empate: la anterior)
+    "retener"  la última muestra anterior (retención de orden cero)
+
+Los huecos se marcan explícitamente: si entre la muestra anterior y la
+siguiente hay más de `max_hueco` segundos (por defecto HUECO_PASOS veces
+el paso mediano del tramo), el punto de la rejilla queda en NaN y la
+columna "hueco" en True. Una muestra NaN de un canal (p.ej. EMG que no
+llegó) se salta solo en ese canal. Todo es NumPy sobre arrays enteros.
+
+    python remuestreo.py <cedula> [--sesion HOJA] [--hz 100] [--metodo lineal]
+                         [--max-hueco S] [--salida CARPETA]
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from sesion import COL_TIEMPO
+
+# ===================== CONFIG =====================
+
+METODOS = ("lineal", "cercano", "retener")
+HUECO_PASOS = 3.0     # hueco = más de 3 pasos medianos sin muestras
+COL_HUECO = "hueco"
+
+# ===================== REJILLA =====================
+
+def rejilla(t_ini, t_fin, hz):
+    """Puntos k/hz (k entero) entre t_ini y t_fin, ambos incluidos."""
+    k0 = int(np.ceil(t_ini * hz - 1e-9))
+    k1 = int(np.floor(t_fin * hz + 1e-9))
+    return np.arange(k0, max(k1 + 1, k0)) / hz
+
+
+def paso_mediano(t):
+    d = np.diff(t)
+    d = d[np.isfinite(d) & (d > 0)]
+    return float(np.median(d)) if len(d) else 0.0
+
+
+def _ordenado(t, v):
+    """(t, v) sin NaN y con t creciente."""
+    ok = np.isfinite(t) & np.isfinite(v)
+    t, v = t[ok], v[ok]
+    if len(t) > 1 and (np.diff(t) < 0).any():
+        orden = np.argsort(t, kind="stable")
+        t, v = t[orden], v[orden]
+    return t, v
+
+
+def en_rejilla(t, v, puntos, metodo="lineal", max_hueco=np.inf):
+    """(valores, hueco) de la serie (t, v) en `puntos`.
+
+    `hueco` es True donde no hay dato: fuera del rango de muestras o
+    dentro de un intervalo entre muestras de más de `max_hueco` s (un
+    punto que cae justo sobre una muestra nunca es hueco).
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"método desconocido: {metodo!r} (usa {', '.join(METODOS)})")
+    t, v = _ordenado(np.asarray(t, np.float64), np.asarray(v, np.float64))
+    valores = np.full(len(puntos), np.nan)
+    if not len(t):
+        return valores, np.ones(len(puntos), dtype=bool)
+
+    i = np.searchsorted(t, puntos, side="right") - 1   # muestra anterior (<= punto)
+    fuera = (i < 0) | (puntos > t[-1])
+    i = np.clip(i, 0, len(t) - 1)
+    j = np.minimum(i + 1, len(t) - 1)                   # muestra siguiente
+    dt = t[j] - t[i]
+    hueco = fuera | ((dt > max_hueco) & (puntos != t[i]))
+
+    if metodo == "retener":
+        r = v[i]
+    elif metodo == "cercano":
+        r = np.where(puntos - t[i] <= t[j] - puntos, v[i], v[j])
+    else:
+        w = np.divide(puntos - t[i], dt, out=np.zeros_like(dt), where=dt > 0)
+        r = v[i] + w * (v[j] - v[i])
+    valores[~hueco] = r[~hueco]
+    return valores, hueco
+
+# ===================== SESIONES =====================
+
+def remuestrear_tramo(tramo, hz, metodo="lineal", max_hueco=None):
+    """DataFrame del tramo en la rejilla de `hz`: timestamp_s (la rejilla),
+    cada canal del tramo y "hueco" (la rejilla sin muestras del tramo)."""
+    t = pd.to_numeric(tramo[COL_TIEMPO], errors="coerce").to_numpy(np.float64)
+    finitos = t[np.isfinite(t)]
+    if max_hueco is None:
+        max_hueco = HUECO_PASOS * paso_mediano(np.sort(finitos)) or np.inf
+    puntos = rejilla(finitos.min(), finitos.max(), hz) if len(finitos) else np.empty(0)
+
+    out = {COL_TIEMPO: puntos}
+    for c in tramo.columns:
+        if c == COL_TIEMPO:
+            continue
+        v = pd.to_numeric(tramo[c], errors="coerce").to_numpy(np.float64)
+        out[c], _ = en_rejilla(t, v, puntos, metodo, max_hueco)
+    _, out[COL_HUECO] = en_rejilla(t, np.zeros(len(t)), puntos, metodo, max_hueco)
+
+    df = pd.DataFrame(out, copy=False)
+    df.attrs["remuestreo"] = {"hz": hz, "metodo": metodo, "max_hueco_s": max_hueco,
+                              "muestras": int(len(finitos)), "huecos": int(out[COL_HUECO].sum())}
+    return df
+
+
+def remuestrear_sesion(tramos, hz, metodo="lineal", max_hueco=None):
+    """Un DataFrame remuestreado por tramo (cada ejercicio con su base)."""
+    return [remuestrear_tramo(t, hz, metodo, max_hueco) for t in tramos]
+
+# ===================== MAIN =====================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Sesiones del almacén a una rejilla uniforme (CSV)")
+    ap.add_argument("cedula")
+    ap.add_argument("--sesion", help="hoja de la sesión (por defecto, todas)")
+    ap.add_argument("--hz", type=float, default=100.0)
+    ap.add_argument("--metodo", choices=METODOS, default="lineal")
+    ap.add_argument("--max-hueco", type=float, default=None,
+                    help=f"s sin muestras que cuentan como hueco (por defecto {HUECO_PASOS:g} pasos)")
+    ap.add_argument("--dir", help="carpeta PacienteData (por defecto la de principal.py)")
+    ap.add_argument("--salida", help="carpeta de los CSV (por defecto <paciente>/remuestreo)")
+    args = ap.parse_args(argv)
+
+    from almacen import asegurar_almacen, leer_tramos, listar_sesiones
+    if args.dir:
+        main_dir = Path(args.dir)
+    else:
+        from principal import MAIN_DIR
+        main_dir = MAIN_DIR
+    carpeta = main_dir / args.cedula
+    asegurar_almacen(carpeta)
+    salida = Path(args.salida) if args.salida else carpeta / "remuestreo"
+    salida.mkdir(parents=True, exist_ok=True)
+
+    sesiones = [s for s in listar_sesiones(carpeta) if args.sesion in (None, s["hoja"])]
+    if not sesiones:
+        print("❌ No hay sesiones que remuestrear.")
+        return 1
+    for s in sesiones:
+        tramos, _ = leer_tramos(carpeta, s)
+        for n, df in enumerate(remuestrear_sesion(tramos, args.hz, args.metodo, args.max_hueco), start=1):
+            ruta = salida / f"{s['hoja']}_{n}_{args.hz:g}Hz.csv"
+            df.to_csv(ruta, index=False, encoding="utf-8-sig")
+            inf = df.attrs["remuestreo"]
+            print(f"✅ {ruta.name}: {inf['muestras']} muestras -> {len(df)} puntos, "
+                  f"{inf['huecos']} en hueco")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from reloj import COL_T_HOST
+
+# ===================== SESIÓN DISPERSA =====================
+# Una sesión es una lista de tramos, uno por ejercicio capturado. Cada
+# tramo tiene solo los canales que ese ejercicio midió (su timestamp_s,
+# t_host, la columna del ejercicio y su EMG), con su propia base de
+# tiempo y su propio largo. No se guardan columnas de relleno: el DataFrame
+# denso de nueve columnas (COLS) se arma solo al exportar, con
+# `densificar`, en una de estas disposiciones:
+#   "columnas"  cada ejercicio en sus columnas, alineados fila a fila
+#               (principal.unir_capturas; el tiempo es el del primero)
+#   "filas"     un ejercicio debajo del otro (Controller / Interfaz)
+#   "tiempo"    cada ejercicio en sus columnas, alineados por timestamp_s:
+#               el eje es el del tramo más largo y cada canal toma su
+#               muestra más cercana (como merge_asof "nearest"), o NaN si
+#               no tiene ninguna a menos de la tolerancia
+
+COL_TIEMPO = "timestamp_s"
+DISPOSICIONES = ("columnas", "filas", "tiempo")
+COLS_TIEMPO = (COL_TIEMPO, COL_T_HOST)
+
+
+def _valores(df, col):
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(np.float64)
+
+
+def tramos_de_capturas(capturas):
+    """Normaliza lo capturado (un DataFrame denso o una lista por ejercicio)
+    a tramos con solo las columnas que tienen algún dato."""
+    if isinstance(capturas, pd.DataFrame):
+        capturas = [capturas]
+    tramos = []
+    for df in capturas:
+        datos, con_datos = {}, False
+        for col in df.columns:
+            v = _valores(df, col)
+            vacia = np.isnan(v).all()
+            con_datos |= not vacia
+            if col == COL_TIEMPO or not vacia:
+                datos[str(col)] = v
+        if con_datos:
+            tramos.append(pd.DataFrame(datos, copy=False))
+    return tramos
+
+
+def columnas_de(tramos):
+    """Canales medidos en la sesión, en orden de aparición."""
+    vistos = {}
+    for t in tramos:
+        for c in t.columns:
+            vistos.setdefault(c, None)
+    return list(vistos)
+
+
+def filas_densas(tramos, disposicion):
+    if not tramos:
+        return 0
+    largos = [len(t) for t in tramos]
+    return sum(largos) if disposicion == "filas" else max(largos)
+
+
+def canales(datos):
+    """dict columna -> array con todas las muestras de esa columna (de un
+    DataFrame denso o de los tramos), sin armar el DataFrame denso."""
+    if isinstance(datos, pd.DataFrame):
+        return {c: _valores(datos, c) for c in datos.columns}
+    out = {}
+    for t in datos:
+        for c in t.columns:
+            out.setdefault(c, []).append(_valores(t, c))
+    return {c: v[0] if len(v) == 1 else np.concatenate(v) for c, v in out.items()}
+
+
+def _paso_mediano(t):
+    d = np.diff(t)
+    d = d[np.isfinite(d) & (d > 0)]
+    return float(np.median(d)) if len(d) else 0.0
+
+
+def mas_cercano(t_ref, t, tolerancia):
+    """Índice en `t` (creciente) de la muestra más cercana a cada `t_ref`,
+    o -1 si ninguna está a <= `tolerancia`. En empate, la anterior."""
+    if not len(t):
+        return np.full(len(t_ref), -1)
+    j = np.searchsorted(t, t_ref)
+    izq = np.maximum(j - 1, 0)
+    der = np.minimum(j, len(t) - 1)
+    k = np.where(np.abs(t_ref - t[izq]) <= np.abs(t[der] - t_ref), izq, der)
+    k[~(np.abs(t[k] - t_ref) <= tolerancia)] = -1   # también t_ref NaN
+    return k
+
+
+def _alinear_por_tiempo(tramos, denso, idx, tolerancia):
+    """Rellena `denso` (disposición "tiempo"): eje del tramo con más
+    muestras y, para los demás, la muestra más cercana de cada canal."""
+    ref = max(range(len(tramos)), key=lambda i: len(tramos[i]))
+    t_ref = _valores(tramos[ref], COL_TIEMPO)
+    for i, t in enumerate(tramos):
+        if i == ref:
+            k = np.arange(len(t))
+        else:
+            tt = _valores(t, COL_TIEMPO)
+            finitos = np.flatnonzero(np.isfinite(tt))
+            orden = finitos[np.argsort(tt[finitos], kind="stable")]
+            tol = _paso_mediano(tt[orden]) if tolerancia is None else tolerancia
+            k = mas_cercano(t_ref, tt[orden], tol)
+            k = np.where(k >= 0, orden[np.maximum(k, 0)], -1)
+        hay = k >= 0
+        for c in t.columns:
+            if c not in idx or (i != ref and c in COLS_TIEMPO):
+                continue
+            v = _valores(t, c)
+            denso[hay, idx[c]] = v[k[hay]]
+
+
+def densificar(tramos, disposicion="columnas", columnas=None, tolerancia=None):
+    """DataFrame denso (NaN donde un ejercicio no midió) para exportar.
+
+    Se arma en un único array (filas x columnas) que cada tramo rellena en
+    su lugar. En "tiempo", `tolerancia` (s) es la distancia máxima a la
+    muestra más cercana; por defecto, el paso mediano de cada tramo.
+    """
+    columnas = columnas_de(tramos) if columnas is None else list(columnas)
+    n = filas_densas(tramos, disposicion)
+    idx = {c: j for j, c in enumerate(columnas)}
+    denso = np.full((n, len(columnas)), np.nan)
+
+    if disposicion == "tiempo":
+        if tramos:
+            _alinear_por_tiempo(tramos, denso, idx, tolerancia)
+    elif disposicion == "filas":
+        fila = 0
+        for t in tramos:
+            for c in t.columns:
+                if c in idx:
+                    denso[fila:fila + len(t), idx[c]] = _valores(t, c)
+            fila += len(t)
+    else:
+        # igual que unir_capturas: los tiempos salen del primer tramo y cada
+        # tramo siguiente reemplaza (entera) cada columna que trae
+        for i, t in enumerate(tramos):
+            for c in t.columns:
+                if c not in idx or (i and c in (COL_TIEMPO, COL_T_HOST)):
+                    continue
+                denso[:, idx[c]] = np.nan
+                denso[:len(t), idx[c]] = _valores(t, c)
+    return pd.DataFrame(denso, columns=columnas, copy=False)
+
+# ===================== CODIFICACIÓN COMPACTA =====================
+# Para archivar: cada columna se guarda con lo mínimo que la reproduce
+# igual a como se muestra (redondeada a sus decimales):
+#   "delta"  tiempos: enteros (ticks de 10^-dec s) codificados como
+#            diferencias, en el entero más chico que alcance (int8..int64)
+#   "f32"    canales con <= DEC_MAX decimales que float32 devuelve exactos
+#            al redondear al leer (ROM y fuerza a 2-3 decimales, EMG...)
+#   "f64"    lo demás, tal cual
+# Los tiempos sin decimales fijos (modelo de reloj) se guardan al
+# microsegundo. Encima, cada array va comprimido (zip deflate).
+
+DEC_MAX = 6
+
+
+def _decimales(v):
+    """Menor número de decimales (<= DEC_MAX) que deja `v` igual, o None."""
+    finitos = v[np.isfinite(v)]
+    for d in range(DEC_MAX + 1):
+        if np.array_equal(np.round(finitos, d), finitos):
+            return d
+    return None
+
+
+def _entero_minimo(a):
+    lo, hi = (int(a.min()), int(a.max())) if len(a) else (0, 0)
+    for t in (np.int8, np.int16, np.int32):
+        if np.iinfo(t).min <= lo and hi <= np.iinfo(t).max:
+            return t
+    return np.int64
+
+
+def codificar(col, v):
+    """(array, descripción) de una columna en formato compacto."""
+    d = _decimales(v)
+    if col in COLS_TIEMPO and len(v) and not np.isnan(v).any():
+        d = DEC_MAX if d is None else d
+        ticks = np.round(v * 10.0 ** d).astype(np.int64)
+        delta = np.diff(ticks, prepend=0)
+        return delta.astype(_entero_minimo(delta)), {"cod": "delta", "dec": d}
+    if d is not None:
+        v32 = v.astype(np.float32)
+        if np.array_equal(np.round(v32.astype(np.float64), d), v, equal_nan=True):
+            return v32, {"cod": "f32", "dec": d}
+    return v, {"cod": "f64"}
+
+
+def decodificar(a, cod):
+    if cod is None or cod["cod"] == "f64":
+        return a.astype(np.float64, copy=False)
+    if cod["cod"] == "f32":
+        return np.round(a.astype(np.float64), cod["dec"])
+    return np.cumsum(a, dtype=np.int64) / 10.0 ** cod["dec"]
+
+# ===================== ARCHIVO .npz =====================
+# v2: "indice" (JSON con las columnas de cada tramo y, si es compacto, la
+#     codificación de cada una) y un array por tramo y columna, "t{i}_c{j}".
+# v1: sesión densa, "columnas" + "c{j}" (almacenes anteriores); se lee como
+#     un único tramo en disposición "columnas".
+
+def escribir_npz(ruta, tramos, disposicion, compacto=True):
+    indice = {"disposicion": disposicion,
+              "tramos": [[str(c) for c in t.columns] for t in tramos]}
+    arrays = {}
+    cods = []
+    for i, t in enumerate(tramos):
+        cods.append([])
+        for j, c in enumerate(t.columns):
+            v = _valores(t, c)
+            if compacto:
+                v, cod = codificar(c, v)
+                cods[i].append(cod)
+            arrays[f"t{i}_c{j}"] = v
+    if compacto:
+        indice["codificacion"] = cods
+    guardar = np.savez_compressed if compacto else np.savez
+    with open(ruta, "wb") as f:
+        guardar(f, indice=np.array(json.dumps(indice, ensure_ascii=False)), **arrays)
+
+
+def leer_npz(ruta, columnas=None):
+    """(tramos, disposicion). Con `columnas` solo se leen esas (y el tiempo)."""
+    with np.load(ruta) as z:
+        if "indice" not in z.files:
+            nombres = [str(c) for c in z["columnas"]]
+            pedidas = [c for c in nombres if columnas is None or c in columnas or c == COL_TIEMPO]
+            df = pd.DataFrame({c: z[f"c{nombres.index(c)}"] for c in pedidas}, copy=False)
+            return [df], "columnas"
+        indice = json.loads(str(z["indice"]))
+        cods = indice.get("codificacion")
+        tramos = []
+        for i, cols in enumerate(indice["tramos"]):
+            pedidas = [(j, c) for j, c in enumerate(cols)
+                       if columnas is None or c in columnas or c == COL_TIEMPO]
+            tramos.append(pd.DataFrame(
+                {c: decodificar(z[f"t{i}_c{j}"], cods[i][j] if cods else None) for j, c in pedidas},
+                copy=False))
+        return tramos, indice["disposicion"]
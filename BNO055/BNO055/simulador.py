@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Arduino simulado para probar y medir sin hardware.
+
+Habla el mismo protocolo que integrado.ino ('1'–'4', espacio/'z' -> ZERO_OK,
+'e', 'b'/'t') y emite tramas reproducidas de una sesión guardada en
+PacienteData/<cedula>/Lecturas.xlsx o sintetizadas, a la tasa que se pida
+(limitada por el baudrate, como el enlace real).
+
+Uso sin tocar el código de captura (sustituye serial.Serial):
+    python simulador.py [--xlsx RUTA] [--hoja NOMBRE] [--hz 10] script.py [args...]
+Con un pseudo-terminal (Linux/macOS, p.ej. para la app Qt):
+    python simulador.py --pty [--xlsx RUTA] [--hz 100]
+"""
+
+import argparse
+import os
+import runpy
+import select
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import serial
+
+from tramas import DTYPE_BIN, SYNC_BIN, crc16_filas, DECIMALES
+from lector_xlsx import LectorLibro
+
+# ===================== CONFIG =====================
+
+HZ_TEXTO = 10           # PRINT_MS = 100 en el firmware
+HZ_BINARIO = 100        # PRINT_MS_BIN = 10
+EMG_UMBRAL = 15
+
+# cmd -> (columna de valor, columna EMG, modo del firmware, es_fuerza)
+EJERCICIOS_SIM = {
+    "1": ("ROM Flexión/Extensión_°",       "EMG(F/E)_mv", 2, False),
+    "2": ("ROM Desviación Ulnar/Radial_°", "EMG(D)_mv",   1, False),
+    "3": ("ROM Pronosupinación_°",         "EMG(PS)_mv",  3, False),
+    "4": ("Fuerza de Prensión_Kg",         "EMG(FP)_mv",  4, True),
+}
+
+MENSAJES_MODO = {
+    "1": "Modo: Flexión/Extensión (1). Fija cero con espacio.",
+    "2": "Modo: Ulnar/Radial (2). Fija cero con espacio.",
+    "3": "Modo: Pronosupinación (3). Fija cero con espacio.",
+    "4": "Modo: Fuerza de prensión (4).",
+}
+
+MENU = ("\r\n=== MENÚ DE MEDICIÓN ===\r\n1: Flexión/Extensión\r\n2: Ulnar/Radial\r\n"
+        "3: Pronosupinación\r\n4: Fuerza de prensión\r\ne: Detener medición\r\n"
+        "b/t: telemetría binaria / texto\r\n")
+
+# ===================== FUENTES DE DATOS =====================
+
+def generar_df_prueba(n=3000, hz=HZ_TEXTO, semilla=7) -> pd.DataFrame:
+    """Sesión sintética con las columnas COLS (igual idea que el generador
+    de pruebas original, pero vectorizado)."""
+    t = np.arange(n, dtype=float) / hz
+    rng = np.random.default_rng(semilla)
+
+    def ruido(s):
+        return rng.uniform(-s, s, n)
+
+    rom_fe = 20*np.sin(2*np.pi*(t/6)) + 45 + ruido(1.0)
+    rom_ur = 15*np.sin(2*np.pi*(t/8)) + 10 + ruido(1.0)
+    rom_ps = 30*np.sin(2*np.pi*(t/7)) + ruido(1.2)
+    grip   = 15 + 5*np.sin(2*np.pi*(t/5)) + ruido(0.6)
+
+    return pd.DataFrame({
+        "timestamp_s": t.round(3),
+        "ROM Flexión/Extensión_°": np.round(rom_fe, 2),
+        "EMG(F/E)_mv": np.round(np.abs(0.01*np.abs(rom_fe) + ruido(0.5)), 3),
+        "ROM Desviación Ulnar/Radial_°": np.round(rom_ur, 2),
+        "EMG(D)_mv": np.round(np.abs(0.012*np.abs(rom_ur) + ruido(0.4)), 3),
+        "ROM Pronosupinación_°": np.round(rom_ps, 2),
+        "EMG(PS)_mv": np.round(np.abs(0.009*np.abs(rom_ps) + ruido(0.5)), 3),
+        "Fuerza de Prensión_Kg": np.round(grip, 2),
+        "EMG(FP)_mv": np.round(np.abs(0.03*np.abs(grip) + ruido(0.6)), 3),
+    })
+
+
+def cargar_sesion_xlsx(ruta, hoja=None) -> pd.DataFrame:
+    """Lee una hoja sesion_* de un Lecturas.xlsx (la última si no se indica)."""
+    with LectorLibro(ruta) as lib:
+        if hoja is None:
+            hojas = lib.sesiones()
+            if not hojas:
+                raise ValueError(f"{ruta} no tiene hojas de sesión")
+            hoja = hojas[-1]
+        return lib.hoja(hoja)
+
+
+def _series_por_ejercicio(df):
+    series = {}
+    for cmd, (col, col_emg, _, _) in EJERCICIOS_SIM.items():
+        val = pd.to_numeric(df.get(col), errors="coerce") if col in df else None
+        if val is None or val.notna().sum() == 0:
+            continue
+        emg = pd.to_numeric(df[col_emg], errors="coerce") if col_emg in df else val * np.nan
+        ok = val.notna().to_numpy()
+        series[cmd] = (val.to_numpy(float)[ok], emg.to_numpy(float)[ok])
+    return series
+
+# ===================== NÚCLEO DEL ARDUINO =====================
+
+class ArduinoSimulado:
+    """Máquina de estados de integrado.ino sin E/S: recibe comandos y
+    devuelve los bytes que el firmware habría emitido hasta `ahora`."""
+
+    def __init__(self, df=None, hz=None, baud=115200):
+        df = generar_df_prueba() if df is None else df
+        self.series = _series_por_ejercicio(df)
+        sinteticas = _series_por_ejercicio(generar_df_prueba())
+        for cmd in EJERCICIOS_SIM:
+            self.series.setdefault(cmd, sinteticas[cmd])
+        self.hz_fijo = hz
+        self.bytes_por_s = baud / 10.0
+        self.t_boot = time.time()
+        self.cmd = None
+        self.cero = False
+        self.binario = False
+        self.seq = 0
+        self.idx = 0
+        self._t_emit = None
+        self._pendiente = bytearray(
+            ("Muñeca calib SYS:3 G:3 A:3 M:3\r\nMano   calib SYS:3 G:3 A:3 M:3\r\n"
+             "Baseline EMG: 512\r\n" + MENU).encode("utf-8"))
+
+    @property
+    def hz(self):
+        return self.hz_fijo or (HZ_BINARIO if self.binario else HZ_TEXTO)
+
+    def _texto(self, msg):
+        self._pendiente += (msg + "\r\n").encode("utf-8")
+
+    def comando(self, datos: bytes):
+        for c in datos.decode("latin-1"):
+            if c in "\r\n":
+                continue
+            if c in EJERCICIOS_SIM:
+                self.cmd = c
+                self.cero = False
+                self.idx = 0
+                self._t_emit = time.time()
+                self._texto(MENSAJES_MODO[c])
+            elif c in "eE":
+                self.cmd = None
+                self.cero = False
+                self._texto(">> Medición detenida.")
+                self._pendiente += MENU.encode("utf-8")
+            elif c in " zZ":
+                if self.cmd in ("1", "2", "3"):
+                    self.cero = True
+                    self._texto("ZERO_OK")
+                else:
+                    self._texto("ZERO_FAIL")
+            elif c in "bB":
+                self._texto("BIN_OK")
+                self.binario = True
+                self.seq = 0
+            elif c in "tT":
+                self.binario = False
+                self._texto("TXT_OK")
+
+    def _tramas(self, n, ahora):
+        val, emg = self.series[self.cmd]
+        i = (self.idx + np.arange(n)) % len(val)
+        self.idx = int((self.idx + n) % len(val))
+        es_fuerza = EJERCICIOS_SIM[self.cmd][3]
+        t_ms = ((ahora - self.t_boot) * 1000 - (n - 1 - np.arange(n)) * 1000 / self.hz).astype(np.int64)
+        angle = np.full(n, np.nan) if es_fuerza else val[i]
+        force = val[i] if es_fuerza else np.full(n, np.nan)
+        env = np.nan_to_num(emg[i])
+        act = np.where(env > EMG_UMBRAL, 100, 0)
+
+        if self.binario:
+            regs = np.zeros(n, dtype=DTYPE_BIN)
+            regs["sync"] = SYNC_BIN
+            regs["seq"] = (self.seq + np.arange(n)) % 65536
+            regs["t_ms"] = t_ms
+            regs["angle"], regs["force"], regs["emg_env"] = angle, force, env
+            regs["threshold"], regs["activation"] = EMG_UMBRAL, act
+            regs["modo"] = EJERCICIOS_SIM[self.cmd][2]
+            filas = regs.view(np.uint8).reshape(n, DTYPE_BIN.itemsize)
+            regs["crc"] = crc16_filas(filas[:, 2:-2])
+            self.seq = int((self.seq + n) % 65536)
+            return regs.tobytes()
+
+        def fmt(x, d):
+            return "NaN" if np.isnan(x) else f"{x:.{d}f}"
+        return "".join(
+            f"{tm / 1000:.3f},{fmt(a, DECIMALES['angle'])},{fmt(f, DECIMALES['force'])},"
+            f"{e:.2f},{EMG_UMBRAL},{ac}\r\n"
+            for tm, a, f, e, ac in zip(t_ms, angle, force, env, act)).encode()
+
+    def volcado(self, cmd, n, binario=False):
+        """n tramas seguidas del ejercicio `cmd`, sin esperar al reloj
+        (para medir el parser con flujos largos)."""
+        self.cmd, self.cero, self.binario = cmd, True, binario
+        self.idx = self.seq = 0
+        return self._tramas(n, self.t_boot + n / self.hz)
+
+    def generar(self, ahora=None):
+        """Bytes emitidos hasta `ahora` (tasa limitada por el enlace)."""
+        ahora = time.time() if ahora is None else ahora
+        if self.cmd is not None and (self.cero or self.cmd == "4"):
+            n = int((ahora - self._t_emit) * self.hz)
+            tam = DTYPE_BIN.itemsize if self.binario else 36
+            n = min(n, int((ahora - self._t_emit) * self.bytes_por_s / tam))
+            if n > 0:
+                self._pendiente += self._tramas(n, ahora)
+                self._t_emit += n / self.hz
+        elif self.cmd is not None:
+            self._t_emit = ahora
+        out = bytes(self._pendiente)
+        self._pendiente.clear()
+        return out
+
+# ===================== INTERFAZ TIPO PYSERIAL =====================
+
+class SerialSimulado:
+    """Sustituto de serial.Serial respaldado por un ArduinoSimulado."""
+
+    fuente = None       # DataFrame a reproducir (None = sintético)
+    hz = None           # None = tasa del firmware según el modo
+
+    def __init__(self, port=None, baudrate=115200, timeout=None, **_):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = False
+        self._buf = bytearray()
+        self._arduino = None
+        if port is not None:
+            self.open()
+
+    def open(self):
+        # Abrir el puerto reinicia el Arduino, como en el real
+        self._arduino = ArduinoSimulado(self.fuente, self.hz, self.baudrate)
+        self._buf.clear()
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def _bombear(self):
+        if not self.is_open:
+            raise serial.SerialException("Puerto simulado cerrado")
+        self._buf += self._arduino.generar()
+
+    @property
+    def in_waiting(self):
+        self._bombear()
+        return len(self._buf)
+
+    def read(self, size=1):
+        limite = None if self.timeout is None else time.time() + self.timeout
+        self._bombear()
+        while len(self._buf) < size and (limite is None or time.time() < limite):
+            time.sleep(min(0.005, 1.0 / self._arduino.hz))
+            self._bombear()
+        out = bytes(self._buf[:size])
+        del self._buf[:size]
+        return out
+
+    def readline(self):
+        limite = None if self.timeout is None else time.time() + self.timeout
+        self._bombear()
+        while b"\n" not in self._buf and (limite is None or time.time() < limite):
+            time.sleep(0.005)
+            self._bombear()
+        corte = self._buf.find(b"\n")
+        corte = len(self._buf) if corte < 0 else corte + 1
+        out = bytes(self._buf[:corte])
+        del self._buf[:corte]
+        return out
+
+    def write(self, datos):
+        if not self.is_open:
+            raise serial.SerialException("Puerto simulado cerrado")
+        self._arduino.comando(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def reset_input_buffer(self):
+        self._bombear()
+        self._buf.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def instalar(fuente=None, hz=None):
+    """Sustituye serial.Serial por el simulado en todo el proceso.
+
+    Todas las capturas (principal, python_script, Interfaz, ConexionSerial)
+    llaman a serial.Serial(...) en tiempo de ejecución, así que no hay que
+    tocar ninguna llamada.
+    """
+    SerialSimulado.fuente = fuente
+    SerialSimulado.hz = hz
+    serial.Serial = SerialSimulado
+    return SerialSimulado
+
+# ===================== PSEUDO-TERMINAL =====================
+
+def servir_pty(fuente=None, hz=None, baud=115200):
+    """Expone el Arduino simulado en un pty (Linux/macOS)."""
+    import pty
+    import tty
+    maestro, esclavo = pty.openpty()
+    tty.setraw(esclavo)
+    print(f"Arduino simulado en {os.ttyname(esclavo)} (Ctrl+C para salir)", flush=True)
+    arduino = ArduinoSimulado(fuente, hz, baud)
+    try:
+        while True:
+            listo, _, _ = select.select([maestro], [], [], 0.005)
+            if listo:
+                arduino.comando(os.read(maestro, 1024))
+            datos = arduino.generar()
+            if datos:
+                os.write(maestro, datos)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(maestro)
+        os.close(esclavo)
+
+# ===================== MAIN =====================
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Arduino simulado (protocolo integrado.ino)")
+    ap.add_argument("--xlsx", type=Path, help="Lecturas.xlsx a reproducir (por defecto: sintético)")
+    ap.add_argument("--hoja", help="hoja sesion_* a reproducir (por defecto: la última)")
+    ap.add_argument("--hz", type=float, help="tramas por segundo (por defecto: las del firmware)")
+    ap.add_argument("--pty", action="store_true", help="servir en un pseudo-terminal")
+    ap.add_argument("script", nargs="?", help="script de captura a ejecutar con el simulador")
+    ap.add_argument("args", nargs=argparse.REMAINDER)
+    a = ap.parse_args(argv)
+
+    fuente = cargar_sesion_xlsx(a.xlsx, a.hoja) if a.xlsx else None
+    if a.pty:
+        servir_pty(fuente, a.hz)
+        return 0
+    if not a.script:
+        ap.error("indica --pty o el script a ejecutar")
+
+    instalar(fuente, a.hz)
+    sys.argv = [a.script] + a.args
+    sys.path.insert(0, str(Path(a.script).resolve().parent))
+    runpy.run_path(a.script, run_name="__main__")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
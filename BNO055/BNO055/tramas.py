@@ -0,0 +1,290 @@
+import time
+
+import numpy as np
+
+# ===================== FORMATO DE TRAMA =====================
+# integrado.ino emite una línea CSV por muestra:
+#   timestamp_s, angle_deg, force_kg, emg_env, threshold, activation
+# (ángulo o fuerza en "NaN" según el ejercicio). BNO055.ino (solo ROM)
+# emite "ETIQUETA [deg]: -23.45"; esas líneas se aceptan como ángulo sin
+# tiempo de dispositivo.
+
+CAMPOS = ("t", "angle", "force", "emg_env", "threshold", "activation")
+
+# float64 en todo: los valores llegan con 2–3 decimales y un float32
+# acabaría en Excel como 12.34000015258789.
+DTYPES = {c: np.float64 for c in CAMPOS}
+
+# Decimales con que el firmware imprime cada campo en modo texto
+DECIMALES = {"t": 3, "angle": 2, "force": 3, "emg_env": 2, "threshold": 0, "activation": 0}
+
+N_CAMPOS = len(CAMPOS)
+
+# Columna de la trama que corresponde a cada comando de ejercicio
+CAMPO_POR_CMD = {"1": "angle", "2": "angle", "3": "angle", "4": "force"}
+
+
+def columnas_vacias():
+    return {c: np.empty(0, dtype=DTYPES[c]) for c in CAMPOS}
+
+
+def _a_float(tokens):
+    """bytes -> float64 en bloque; campos vacíos o basura -> NaN."""
+    arr = np.asarray(tokens, dtype=np.bytes_)
+    arr = np.char.strip(arr)
+    arr = np.where(arr == b"", b"nan", arr)
+    try:
+        return arr.astype(np.float64)
+    except ValueError:
+        # Algún token corrupto: se convierten uno a uno solo en este caso
+        out = np.empty(arr.shape, dtype=np.float64)
+        flat_in, flat_out = arr.ravel(), out.ravel()
+        for i, tok in enumerate(flat_in):
+            try:
+                flat_out[i] = float(tok)
+            except ValueError:
+                flat_out[i] = np.nan
+        return out
+
+
+def decodificar_lineas(lineas):
+    """Decodifica líneas completas (sin '\\n') a columnas tipadas.
+
+    Devuelve (columnas, mensajes): `columnas` es un dict campo -> ndarray y
+    `mensajes` las líneas de texto del firmware (ZERO_OK, menú, avisos...).
+    """
+    arr = np.char.strip(np.asarray(lineas, dtype=np.bytes_))
+    arr = arr[arr != b""]
+    comas = np.char.count(arr, b",")
+    es_csv = comas == N_CAMPOS - 1
+    es_legado = (comas == 0) & (np.char.find(arr, b"]:") >= 0)
+
+    csv = arr[es_csv].tolist()
+    legado = [ln.rsplit(b":", 1)[1] for ln in arr[es_legado].tolist()]
+    mensajes = [ln.decode("utf-8", errors="ignore")
+                for ln in arr[~(es_csv | es_legado)].tolist()]
+
+    cols = columnas_vacias()
+    partes = []
+
+    if csv:
+        matriz = _a_float(b",".join(csv).split(b",")).reshape(len(csv), N_CAMPOS)
+        # Una trama sin tiempo de dispositivo no es una muestra: se descarta
+        matriz = matriz[~np.isnan(matriz[:, 0])]
+        partes.append(matriz)
+
+    if legado:
+        matriz = np.full((len(legado), N_CAMPOS), np.nan)
+        matriz[:, 1] = _a_float(legado)
+        partes.append(matriz[~np.isnan(matriz[:, 1])])
+
+    if partes:
+        matriz = partes[0] if len(partes) == 1 else np.concatenate(partes)
+        for j, c in enumerate(CAMPOS):
+            cols[c] = matriz[:, j].astype(DTYPES[c])
+
+    return cols, mensajes
+
+
+class ParserTramas:
+    """Parser en bloque del flujo serie.
+
+    Recibe trozos de bytes tal como llegan del puerto, separa las tramas
+    completas y conserva la línea final incompleta para el siguiente trozo.
+    """
+
+    def __init__(self):
+        self._resto = b""
+        self.tramas = 0
+
+    def alimentar(self, datos: bytes):
+        if not datos:
+            return columnas_vacias(), []
+        datos = self._resto + datos
+        corte = datos.rfind(b"\n")
+        if corte < 0:
+            self._resto = datos
+            return columnas_vacias(), []
+        self._resto = datos[corte + 1:]
+        cols, mensajes = decodificar_lineas(datos[:corte].split(b"\n"))
+        self.tramas += len(cols["t"])
+        return cols, mensajes
+
+    def vaciar(self):
+        """Procesa lo que quede pendiente (fin de captura)."""
+        resto, self._resto = self._resto, b""
+        return decodificar_lineas([resto]) if resto else (columnas_vacias(), [])
+
+
+def leer_bloque(ser):
+    """Lee todo lo disponible en el puerto (al menos 1 byte, con timeout)."""
+    return ser.read(ser.in_waiting or 1)
+
+
+# ===================== MODO BINARIO =====================
+# Registro fijo little-endian (26 bytes), igual al struct TramaBin del
+# firmware. Se activa enviando 'b' (responde BIN_OK) y se vuelve a texto
+# con 't' (responde TXT_OK). El CRC-16/CCITT-FALSE cubre seq..modo.
+
+SYNC_BIN = 0xA55A
+CMD_BINARIO = b"b"
+CMD_TEXTO = b"t"
+RESP_BINARIO = b"BIN_OK"
+
+# Cabecera de showMenu(): el firmware la imprime al acabar setup() (BNO,
+# tara de la balanza, baseline EMG), solo entonces atiende comandos
+MARCA_MENU = "=== MENÚ DE MEDICIÓN ===".encode("utf-8")
+ESPERA_LISTO_S = 10.0    # setup() de integrado.ino tarda ~5-7 s tras el reinicio
+SILENCIO_MENU_S = 0.1    # sin bytes durante este tiempo = menú completo
+
+DTYPE_BIN = np.dtype([
+    ("sync",       "<u2"),
+    ("seq",        "<u2"),
+    ("t_ms",       "<u4"),
+    ("angle",      "<f4"),
+    ("force",      "<f4"),
+    ("emg_env",    "<f4"),
+    ("threshold",  "<i2"),
+    ("activation", "u1"),
+    ("modo",       "u1"),
+    ("crc",        "<u2"),
+])
+TAM_BIN = DTYPE_BIN.itemsize
+_CRC_INI, _CRC_FIN = 2, TAM_BIN - 2
+
+
+def _tabla_crc16():
+    tabla = np.zeros(256, dtype=np.uint16)
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        tabla[i] = crc & 0xFFFF
+    return tabla
+
+
+_TABLA_CRC = _tabla_crc16()
+
+
+def crc16_filas(bloque):
+    """CRC-16/CCITT-FALSE de cada fila de una matriz uint8 (n, k)."""
+    crc = np.full(bloque.shape[0], 0xFFFF, dtype=np.uint16)
+    for j in range(bloque.shape[1]):
+        idx = ((crc >> 8) ^ bloque[:, j]) & 0xFF
+        crc = (crc << 8) ^ _TABLA_CRC[idx]
+    return crc
+
+
+class DecodificadorBinario:
+    """Decodificador del modo binario con la misma salida que ParserTramas.
+
+    Busca la palabra de sincronía, valida el CRC de todas las candidatas a
+    la vez y decodifica con numpy.frombuffer. Los bytes de texto que se
+    cuelen (menú, ZERO_OK) se ignoran; los huecos de `seq` se cuentan en
+    `perdidas`.
+    """
+
+    def __init__(self):
+        self._resto = b""
+        self._ultimo_seq = None
+        self.tramas = 0
+        self.perdidas = 0
+        self.crc_invalidas = 0
+
+    def alimentar(self, datos: bytes):
+        buf = self._resto + datos
+        if len(buf) < TAM_BIN:
+            self._resto = buf
+            return columnas_vacias(), []
+
+        a = np.frombuffer(buf, dtype=np.uint8)
+        cand = np.flatnonzero((a[:-1] == (SYNC_BIN & 0xFF)) & (a[1:] == (SYNC_BIN >> 8)))
+        cand = cand[cand + TAM_BIN <= len(a)]
+
+        fin = 0
+        if len(cand):
+            filas = a[cand[:, None] + np.arange(TAM_BIN)]
+            regs = np.ascontiguousarray(filas).view(DTYPE_BIN).ravel()
+            validas = crc16_filas(filas[:, _CRC_INI:_CRC_FIN]) == regs["crc"]
+            self.crc_invalidas += int(np.count_nonzero(~validas))
+
+            # Candidatas válidas sin solaparse (falsos sync dentro de datos)
+            elegidas = []
+            for i in np.flatnonzero(validas):
+                if cand[i] >= fin:
+                    elegidas.append(i)
+                    fin = cand[i] + TAM_BIN
+            regs = regs[elegidas]
+        else:
+            regs = np.empty(0, dtype=DTYPE_BIN)
+
+        self._resto = buf[max(fin, len(buf) - TAM_BIN + 1):]
+        return self._a_columnas(regs), []
+
+    def _a_columnas(self, regs):
+        cols = columnas_vacias()
+        if not len(regs):
+            return cols
+        seq = regs["seq"].astype(np.int64)
+        if self._ultimo_seq is not None:
+            seq = np.concatenate(([self._ultimo_seq], seq))
+        saltos = (np.diff(seq) - 1) % 65536
+        self.perdidas += int(saltos.sum())
+        self._ultimo_seq = int(seq[-1])
+        self.tramas += len(regs)
+
+        cols["t"] = regs["t_ms"] / 1000.0
+        # Misma precisión que el modo texto (float32 -> decimales impresos)
+        for c in ("angle", "force", "emg_env", "threshold", "activation"):
+            cols[c] = np.round(regs[c].astype(DTYPES[c]), DECIMALES[c])
+        return cols
+
+    def vaciar(self):
+        self._resto = b""
+        return columnas_vacias(), []
+
+
+def esperar_listo(ser, timeout=ESPERA_LISTO_S):
+    """Espera a que el firmware termine setup() e imprima el menú.
+
+    Lee (y descarta) la salida de arranque hasta ver MARCA_MENU y el resto
+    del menú. True si llegó; False si venció `timeout` (p.ej. placa que no
+    se reinicia al abrir el puerto y ya estaba en el menú).
+    """
+    visto = b""
+    limite = time.time() + timeout
+    while time.time() < limite:
+        visto = visto[-len(MARCA_MENU):] + ser.read(ser.in_waiting or 1)
+        if MARCA_MENU in visto:
+            break
+    else:
+        return False
+    # el resto del menú sale seguido; acaba al quedar el puerto en silencio
+    while True:
+        if not ser.in_waiting:
+            time.sleep(SILENCIO_MENU_S)
+            if not ser.in_waiting:
+                return True
+        ser.read(ser.in_waiting)
+
+
+def negociar_binario(ser, timeout=1.0):
+    """Pide al firmware el modo binario. True si respondió BIN_OK.
+
+    Debe llamarse con el firmware ya en el menú (ver esperar_listo): en
+    setup() no lee el puerto y atendería la 'b' más tarde. Si no responde
+    a tiempo (firmware antiguo sin modo binario, o respuesta tardía) se
+    envía 't' para que el firmware quede seguro en texto, como el host.
+    """
+    ser.reset_input_buffer()
+    ser.write(CMD_BINARIO)
+    ser.flush()
+    visto = b""
+    limite = time.time() + timeout
+    while time.time() < limite:
+        visto += ser.read(ser.in_waiting or 1)
+        if RESP_BINARIO in visto:
+            return True
+    ser.write(CMD_TEXTO)
+    ser.flush()
+    return False
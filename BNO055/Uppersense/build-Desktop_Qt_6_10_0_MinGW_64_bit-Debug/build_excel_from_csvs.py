@@ -3,6 +3,11 @@ from pathlib import Path
 from datetime import datetime
 import sys
 import re
+import queue
+import threading
+import time
+import argparse
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 
 import numpy as np
 import pandas as pd
@@ -11,6 +16,7 @@ from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.table import Table, TableStyleInfo
 from openpyxl.styles import Font
 from openpyxl.utils import get_column_letter
+from openpyxl.workbook.defined_name import DefinedName
 
 # Columnas finales, igual que tu script original
 COLS = [
@@ -39,8 +45,11 @@ EMG_MAP = {
     "EMG(FP)_mv":  "Fuerza de Prensión_Kg",
 }
 
-def ahora_nombres():
-    ts = datetime.now()
+# Columna EMG que acompaña a cada ejercicio
+EMG_DE = {col: emg for emg, col in EMG_MAP.items()}
+
+def ahora_nombres(ts=None):
+    ts = ts or datetime.now()
     hoja = f"sesion_{ts.strftime('%Y-%m-%d_%H-%M-%S')}"[:31]
     table_name = f"TablaDatos_{ts.strftime('%H%M%S')}"
     table_name = re.sub(r"[^A-Za-z0-9_]", "_", table_name)[:31]
@@ -94,13 +103,32 @@ def _emg_global_y_momentos(df: pd.DataFrame):
 
     return emg_max_val, momento_max, emg_min_val, momento_min
 
+# Cursor de Inicio: siguiente fila libre de cada bloque como nombre definido
+# oculto (igual que en principal.py), para no recorrer el historial.
+CURSOR_AD = "_InicioSiguienteAD"
+CURSOR_GK = "_InicioSiguienteGK"
+FILA_DATOS_INICIO = 4
+
+def _leer_cursor(wb, nombre):
+    dn = wb.defined_names.get(nombre)
+    m = re.search(r"\$(\d+)$", dn.attr_text) if dn is not None else None
+    return int(m.group(1)) if m else None
+
+def fijar_cursor(wb, nombre, columna, fila):
+    wb.defined_names[nombre] = DefinedName(
+        nombre, attr_text=f"Inicio!${get_column_letter(columna)}${fila}", hidden=True)
+
+def _siguiente_fila(wb, ws, nombre, columna):
+    fila = _leer_cursor(wb, nombre) or FILA_DATOS_INICIO
+    while ws.cell(row=fila, column=columna).value not in (None, ""):
+        fila += 1
+    return fila
+
 def anexar_resumen_inicio(wb, ts: datetime, df: pd.DataFrame):
     ws = wb["Inicio"]
 
     # Bloque A–D
-    row = 4
-    while ws.cell(row=row, column=1).value not in (None, ""):
-        row += 1
+    row = _siguiente_fila(wb, ws, CURSOR_AD, 1)
 
     for nombre_ej, col in EJERCICIOS:
         if col not in df.columns:
@@ -115,21 +143,21 @@ def anexar_resumen_inicio(wb, ts: datetime, df: pd.DataFrame):
         ws.cell(row=row, column=3, value=vmin)
         ws.cell(row=row, column=4, value=vmax)
         row += 1
+    fijar_cursor(wb, CURSOR_AD, 1, row)
 
     # Bloque G–K (EMG global)
-    row_g = 4
-    while ws.cell(row=row_g, column=7).value not in (None, ""):
-        row_g += 1
-
     emg_max_val, momento_max, emg_min_val, momento_min = _emg_global_y_momentos(df)
     if emg_max_val is None:
         return
 
+    row_g = _siguiente_fila(wb, ws, CURSOR_GK, 7)
+
     ws.cell(row=row_g, column=7, value=ts.strftime("%Y-%m-%d"))
     ws.cell(row=row_g, column=8, value=emg_max_val)
     ws.cell(row=row_g, column=9, value=momento_max)
     ws.cell(row=row_g, column=10, value=emg_min_val)
     ws.cell(row=row_g, column=11, value=momento_min)
+    fijar_cursor(wb, CURSOR_GK, 7, row_g + 1)
 
 def escribir_sesion(wb, hoja_nombre: str, df: pd.DataFrame, table_name: str):
     if hoja_nombre in wb.sheetnames:
@@ -144,62 +172,497 @@ def escribir_sesion(wb, hoja_nombre: str, df: pd.DataFrame, table_name: str):
     max_row, max_col = ws.max_row, ws.max_column
     last_col = get_column_letter(max_col)
     ref = f"A1:{last_col}{max_row}"
+    # el nombre de tabla es único en todo el libro (HHMMSS se repite entre días)
+    existentes = {t for w in wb.worksheets for t in w.tables}
+    base, i = table_name, 2
+    while table_name in existentes:
+        table_name = (base[:28] + f"_{i}")[:31]
+        i += 1
     tbl = Table(displayName=table_name, ref=ref)
     tbl.tableStyleInfo = TableStyleInfo(name="TableStyleMedium9", showRowStripes=True)
     ws.add_table(tbl)
     return hoja_nombre
 
-def main(argv):
-    if len(argv) < 4:
-        print("Uso: build_excel_from_csvs.py <cedula> <nombre_examen> <csv1> [csv2 csv3 ...]")
-        return 1
+# ===================== LECTURA DE CSV =====================
+# Los CSV de MainWindow::saveCurrentExerciseToCsv tienen siempre el mismo
+# formato: UTF-8 con BOM, cabecera "timestamp_s,<ejercicio>,<su EMG>" y
+# números con 4 decimales; la celda de EMG queda vacía si no hubo EMG (los
+# CSV más viejos no traen la columna EMG). Se leen con ese esquema, sin que
+# pandas tenga que adivinar tipos, y los grandes por trozos sobre un array
+# ya reservado: el pico de memoria es el resultado más un trozo.
+#
+# Si la app no sabía el ejercicio escribe "timestamp_s,Valor,EMG". El número
+# Ej<n> del nombre es el mismo que usa su switch, así que con n de 1 a 4 se
+# lee como ese ejercicio; si no, quedan como columnas "Valor"/"EMG" extra
+# al final de la hoja (mejor que perder el examen).
 
-    patient_id = argv[1]
-    exam_name  = argv[2]
-    csv_paths  = [Path(p) for p in argv[3:]]
+DTYPE_CSV = np.float64           # float32 mostraría 12.369999885559082 en el Excel
+TAMANO_TROZOS = 32 * 2**20       # CSV de más bytes se leen por trozos
+FILAS_POR_TROZO = 100_000
 
-    # Leemos cada CSV (timestamp_s + una columna ROM)
-    lista_dfs = []
-    for p in csv_paths:
-        df = pd.read_csv(p)
-        lista_dfs.append(df)
+COLS_GENERICAS = ("Valor", "EMG")
+# Ej<n> -> columna, como el switch de MainWindow::saveCurrentExerciseToCsv
+COL_POR_EJ = {
+    1: "ROM Flexión/Extensión_°",
+    2: "ROM Desviación Ulnar/Radial_°",
+    3: "ROM Pronosupinación_°",
+    4: "Fuerza de Prensión_Kg",
+}
 
-    if not lista_dfs:
-        print("No hay CSV para procesar.")
-        return 1
+def cabecera_csv(ruta):
+    """Columnas del CSV, validadas contra el esquema de la app (las
+    genéricas Valor/EMG ya traducidas al ejercicio de su Ej<n>)."""
+    with open(ruta, encoding="utf-8-sig", newline="") as f:
+        linea = f.readline().rstrip("\r\n")
+    cols = [c.strip() for c in linea.split(",")]
+    if len(cols) in (2, 3) and cols[0] == "timestamp_s":
+        if cols[1] in EMG_DE and cols[2:] in ([], [EMG_DE[cols[1]]]):
+            return cols
+        if tuple(cols[1:]) == COLS_GENERICAS[:len(cols) - 1]:
+            m = PATRON_CSV.match(Path(ruta).name)
+            col = COL_POR_EJ.get(int(m.group(3))) if m else None
+            return cols if col is None else ["timestamp_s", col, EMG_DE[col]][:len(cols)]
+    raise ValueError(f"{Path(ruta).name}: cabecera inesperada {linea!r} "
+                     "(se esperaba timestamp_s,<ejercicio>,<su EMG>)")
+
+def _contar_filas(ruta):
+    """Filas de datos (sin la cabecera), contando saltos de línea en binario."""
+    n, ultimo = 0, b"\n"
+    with open(ruta, "rb") as f:
+        while bloque := f.read(2**20):
+            n += bloque.count(b"\n")
+            ultimo = bloque[-1:]
+    return n - 1 + (ultimo != b"\n")
+
+def leer_csv_qt(ruta):
+    """DataFrame (timestamp_s, ejercicio[, EMG]) de un CSV de la app."""
+    ruta = Path(ruta)
+    cols = cabecera_csv(ruta)
+    opciones = dict(encoding="utf-8-sig", engine="c", header=0, names=cols,
+                    dtype={c: DTYPE_CSV for c in cols}, na_values=[""], keep_default_na=False)
+    try:
+        if ruta.stat().st_size <= TAMANO_TROZOS:
+            return pd.read_csv(ruta, **opciones)
+        datos = np.empty((_contar_filas(ruta), len(cols)), dtype=DTYPE_CSV)
+        fila = 0
+        for trozo in pd.read_csv(ruta, chunksize=FILAS_POR_TROZO, **opciones):
+            datos[fila:fila + len(trozo)] = trozo.to_numpy()
+            fila += len(trozo)
+        return pd.DataFrame(datos[:fila], columns=cols, copy=False)
+    except ValueError as e:
+        # p.ej. un valor no numérico: que se sepa de qué archivo
+        raise ValueError(f"{ruta.name}: {e}") from e
 
-    # Unir como en tu script original
-    df_final = lista_dfs[0].copy()
-    for df_ej in lista_dfs[1:]:
-        max_len = max(len(df_final), len(df_ej))
-        df_final = df_final.reindex(range(max_len))
-        df_ej    = df_ej.reindex(range(max_len))
+# ===================== SESIÓN =====================
+# La hoja se arma en un único array (filas x COLS) que cada CSV rellena en
+# su lugar:
+#   "columnas"  fila a fila, como siempre: el tiempo es el del primer CSV y
+#               cada ejercicio ocupa sus columnas desde la fila 0
+#   "tiempo"    alineados por timestamp_s: el eje es el del CSV más largo y
+#               cada canal toma su muestra más cercana (merge_asof
+#               "nearest"), o NaN si no hay ninguna a menos de un paso
+#
+# _paso_mediano, mas_cercano y unir son COPIAS de BNO055/BNO055/sesion.py
+# (_paso_mediano, mas_cercano, densificar), que es la fuente de verdad: este
+# script se despliega solo junto al ejecutable de Qt y no puede importar
+# aquel paquete (sesion arrastra reloj y el resto de la captura). Si cambias
+# uno, cambia el otro; test_build_excel_from_csvs.py compara ambos.
 
-        # Copiar todas las columnas excepto timestamp_s
-        for col in df_ej.columns:
-            if col == "timestamp_s":
+UNION = "columnas"
+
+def _paso_mediano(t):
+    d = np.diff(t)
+    d = d[np.isfinite(d) & (d > 0)]
+    return float(np.median(d)) if len(d) else 0.0
+
+def mas_cercano(t_ref, t, tolerancia):
+    """Índice en `t` (creciente) de la muestra más cercana a cada `t_ref`,
+    o -1 si ninguna está a <= `tolerancia`. En empate, la anterior."""
+    if not len(t):
+        return np.full(len(t_ref), -1)
+    j = np.searchsorted(t, t_ref)
+    izq = np.maximum(j - 1, 0)
+    der = np.minimum(j, len(t) - 1)
+    k = np.where(np.abs(t_ref - t[izq]) <= np.abs(t[der] - t_ref), izq, der)
+    k[~(np.abs(t[k] - t_ref) <= tolerancia)] = -1
+    return k
+
+def unir(lista_dfs, modo=UNION, columnas=COLS, tolerancia=None):
+    """DataFrame con `columnas` a partir de los DataFrames de cada ejercicio."""
+    if not lista_dfs:
+        raise ValueError("No hay CSV para procesar.")
+    idx = {c: j for j, c in enumerate(columnas)}
+    n = max(len(df) for df in lista_dfs)
+    denso = np.full((n, len(columnas)), np.nan)
+
+    # el tiempo sale del primer CSV o, alineando, del más largo
+    ref = 0
+    if modo == "tiempo":
+        ref = max(range(len(lista_dfs)), key=lambda i: len(lista_dfs[i]))
+        t_ref = lista_dfs[ref]["timestamp_s"].to_numpy(np.float64)
+    for i, df in enumerate(lista_dfs):
+        if modo == "tiempo" and i != ref:
+            t = df["timestamp_s"].to_numpy(np.float64)
+            finitos = np.flatnonzero(np.isfinite(t))
+            orden = finitos[np.argsort(t[finitos], kind="stable")]
+            tol = _paso_mediano(t[orden]) if tolerancia is None else tolerancia
+            k = mas_cercano(t_ref, t[orden], tol)
+            filas, k = np.flatnonzero(k >= 0), orden[k[k >= 0]]
+        else:
+            filas = k = np.arange(len(df))
+        for col in df.columns:
+            if col not in idx or (col == "timestamp_s" and i != ref):
                 continue
-            df_final[col] = df_ej[col].values
+            if modo != "tiempo":
+                denso[:, idx[col]] = np.nan   # cada CSV reemplaza la columna entera
+            denso[filas, idx[col]] = df[col].to_numpy(np.float64)[k]
+    return pd.DataFrame(denso, columns=list(columnas), copy=False)
+
+def unir_csvs(csv_paths, modo=UNION):
+    """DataFrame con COLS a partir de los CSV de un examen (uno por ejercicio),
+    más Valor/EMG al final si algún CSV no sabía su ejercicio."""
+    dfs = [leer_csv_qt(p) for p in csv_paths]
+    extra = [c for c in COLS_GENERICAS if any(c in df.columns for df in dfs)]
+    return unir(dfs, modo, COLS + extra)
+
+def anexar_sesion(wb, df_final, ts=None):
+    """Hoja nueva + filas de Inicio en un libro ya abierto. Devuelve la hoja."""
+    asegurar_inicio_simple(wb)
+    ts, hoja_nombre, table_name = ahora_nombres(ts)
+    hoja_nombre = escribir_sesion(wb, hoja_nombre, df_final, table_name)
+    anexar_resumen_inicio(wb, ts, df_final)
+    return hoja_nombre
 
-    # Asegurar columnas finales
-    for c in COLS:
-        if c not in df_final.columns:
-            df_final[c] = np.nan
-    df_final = df_final[COLS]
+def construir_sesion(patient_id, exam_name, csv_paths, ts=None):
+    """Une los CSV de un examen y los añade como hoja nueva a Lecturas.xlsx
+    (carpeta del primer CSV). Devuelve la ruta del libro.
 
+    La hoja lleva la fecha del último CSV (como en el lote, ver _fecha_csv):
+    así un examen hecho por el worker y luego por `--lote` tiene el mismo
+    nombre de hoja y el lote lo salta.
+
+    No escribe nada hasta el wb.save final: si el Excel está abierto sale
+    con PermissionError y se puede reintentar tal cual.
+    """
+    csv_paths = [Path(p) for p in csv_paths]
+    df_final = unir_csvs(csv_paths)
+    ts = ts or _fecha_csv(csv_paths[-1])
 
     # Ruta de Lecturas.xlsx = carpeta del primer CSV / Lecturas.xlsx
     base_dir = csv_paths[0].parent
     xlsx_path = base_dir / "Lecturas.xlsx"
 
     wb = abrir_o_crear_xlsx(xlsx_path)
-    asegurar_inicio_simple(wb)
+    anexar_sesion(wb, df_final, ts)
 
-    ts, hoja_nombre, table_name = ahora_nombres()
-    escribir_sesion(wb, hoja_nombre, df_final, table_name)
-    anexar_resumen_inicio(wb, ts, df_final)
+    wb.save(xlsx_path)
+    return xlsx_path
+
+# ===================== LOTE =====================
+# Para migrar o rehacer de una vez muchas sesiones exportadas por la app:
+#   build_excel_from_csvs.py --lote <carpeta|manifiesto> [--procesos N] [--reconstruir] [--listar]
+#                            [--union columnas|tiempo]
+# Con una carpeta (p.ej. PacienteData) se buscan en todo el árbol los CSV de
+# la app, <fecha>_<examen>_Ej<n>.csv; un examen son los CSV seguidos de un
+# paciente con el mismo examen y Ej creciente. El manifiesto (texto UTF-8)
+# tiene una línea por examen, con los mismos campos que BUILD:
+#   <cedula>\t<examen>\t<csv1>[\t<csv2>...]    (rutas relativas al manifiesto)
+# Los exámenes se agrupan por libro (carpeta del primer CSV, la del paciente)
+# y cada libro se abre y se guarda una sola vez, en un pool de procesos. La
+# hoja de cada examen lleva la fecha de su último CSV (igual que en el worker
+# y en la línea de comandos); si ya está en el libro se salta, así repetir el
+# lote o pasarlo sobre exámenes que ya hizo la app no duplica sesiones.
 
+PATRON_CSV = re.compile(r"^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})_(.+)_Ej(\d+)\.csv$", re.IGNORECASE)
+
+def _fecha_csv(ruta: Path):
+    """Fecha del nombre del CSV (la de la app) o, si no la tiene, su mtime."""
+    m = PATRON_CSV.match(ruta.name)
+    if m:
+        return datetime.strptime(m.group(1), "%Y-%m-%d_%H-%M-%S")
+    return datetime.fromtimestamp(ruta.stat().st_mtime).replace(microsecond=0)
+
+def examenes_de_arbol(carpeta):
+    """[{cedula, examen, csvs, ts}] de todos los CSV de la app bajo `carpeta`."""
+    por_paciente = {}
+    for ruta in Path(carpeta).rglob("*.csv"):
+        m = PATRON_CSV.match(ruta.name)
+        if m:
+            por_paciente.setdefault(ruta.parent, []).append((m.group(1), int(m.group(3)), m.group(2), ruta))
+
+    examenes = []
+    for dir_paciente, csvs in sorted(por_paciente.items()):
+        actual = None
+        for fecha, ej, examen, ruta in sorted(csvs):
+            if actual is None or examen != actual["examen"] or ej <= actual["ej"]:
+                actual = {"cedula": dir_paciente.name, "examen": examen, "csvs": [], "ej": 0}
+                examenes.append(actual)
+            actual["csvs"].append(ruta)
+            actual["ej"] = ej
+    for ex in examenes:
+        del ex["ej"]
+        ex["ts"] = _fecha_csv(ex["csvs"][-1])
+    return examenes
+
+def examenes_de_manifiesto(ruta):
+    """[{cedula, examen, csvs, ts}] de un manifiesto (líneas # se ignoran)."""
+    ruta = Path(ruta)
+    examenes = []
+    for n, linea in enumerate(ruta.read_text(encoding="utf-8-sig").splitlines(), start=1):
+        if not linea.strip() or linea.lstrip().startswith("#"):
+            continue
+        partes = linea.rstrip("\r\n").split("\t")
+        if len(partes) < 3:
+            raise ValueError(f"{ruta}:{n}: se esperaba <cedula>\\t<examen>\\t<csv>...")
+        cedula, examen, *csvs = partes
+        csvs = [p if p.is_absolute() else ruta.parent / p for p in map(Path, csvs)]
+        examenes.append({"cedula": cedula, "examen": examen, "csvs": csvs, "ts": _fecha_csv(csvs[-1])})
+    return examenes
+
+def agrupar_por_libro(examenes):
+    """{ruta de Lecturas.xlsx: [exámenes en orden de fecha]}."""
+    libros = {}
+    for ex in sorted(examenes, key=lambda e: e["ts"]):
+        libros.setdefault(Path(ex["csvs"][0]).parent / "Lecturas.xlsx", []).append(ex)
+    return libros
+
+def construir_libro(xlsx_path, examenes, reconstruir=False, modo=UNION):
+    """Añade todos los `examenes` a un libro con una sola apertura y un
+    solo guardado. Con `reconstruir` parte de un libro vacío (el anterior
+    se reemplaza). Devuelve (ruta, hojas nuevas, exámenes ya presentes)."""
+    xlsx_path = Path(xlsx_path)
+    existentes = set()
+    if not reconstruir and xlsx_path.exists():
+        # solo los nombres de hoja (read_only no carga las celdas)
+        ro = load_workbook(xlsx_path, read_only=True)
+        existentes = set(ro.sheetnames)
+        ro.close()
+    nuevos = [ex for ex in examenes if ahora_nombres(ex["ts"])[1] not in existentes]
+    omitidos = len(examenes) - len(nuevos)
+    if not nuevos and not reconstruir:
+        return xlsx_path, [], omitidos
+
+    if reconstruir:
+        xlsx_path.parent.mkdir(parents=True, exist_ok=True)
+        wb = Workbook()
+    else:
+        wb = abrir_o_crear_xlsx(xlsx_path)
+    hojas = [anexar_sesion(wb, unir_csvs(ex["csvs"], modo), ex["ts"]) for ex in nuevos]
     wb.save(xlsx_path)
+    return xlsx_path, hojas, omitidos
+
+def ejecutar_lote(fuente, procesos=None, reconstruir=False, listar=False, modo=UNION):
+    fuente = Path(fuente)
+    examenes = examenes_de_manifiesto(fuente) if fuente.is_file() else examenes_de_arbol(fuente)
+    libros = agrupar_por_libro(examenes)
+    print(f"{len(examenes)} examen(es) de {len(libros)} libro(s)")
+
+    if listar:
+        for xlsx_path, exs in libros.items():
+            print(xlsx_path)
+            for ex in exs:
+                print(f"  {ex['ts']:%Y-%m-%d %H:%M:%S}  {ex['examen']}  "
+                      + ", ".join(Path(p).name for p in ex["csvs"]))
+        return 0
+
+    def informar(xlsx_path, fut):
+        try:
+            ruta, hojas, omitidos = fut.result()
+        except PermissionError:
+            print(f"BLOQUEADO {xlsx_path}: el Excel está abierto, no se tocó")
+            return False
+        except Exception as e:
+            print(f"ERROR {xlsx_path}: {e}")
+            return False
+        print(f"OK {ruta}: {len(hojas)} hoja(s) nueva(s)"
+              + (f", {omitidos} ya estaban" if omitidos else ""))
+        return True
+
+    ok = True
+    if procesos == 1 or len(libros) <= 1:
+        for xlsx_path, exs in libros.items():
+            fut = Future()
+            try:
+                fut.set_result(construir_libro(xlsx_path, exs, reconstruir, modo))
+            except Exception as e:
+                fut.set_exception(e)
+            ok &= informar(xlsx_path, fut)
+    else:
+        # un libro por tarea: nunca dos procesos sobre el mismo archivo
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = {pool.submit(construir_libro, xlsx_path, exs, reconstruir, modo): xlsx_path
+                       for xlsx_path, exs in libros.items()}
+            for fut in as_completed(futuros):
+                ok &= informar(futuros[fut], fut)
+    return 0 if ok else 1
+
+# ===================== WORKER PERSISTENTE =====================
+# La app Qt lo arranca una sola vez (`--worker`) y le pasa cada examen por
+# stdin, así no paga el arranque de Python + pandas/openpyxl en cada uno
+# ni se bloquea esperando. Protocolo por líneas (UTF-8), como el Controller
+# de python_script.py:
+#   BUILD:<id>\t<cedula>\t<examen>\t<csv1>[\t<csv2>...]
+#       -> QUEUED:<id>, y al terminar DONE:<id>:<ruta xlsx>
+#          o ERROR:BUILD_FAILED:<id>:<detalle>
+#       Si el Excel está abierto: STATUS:EXCEL_LOCKED:<id> y se reintenta
+#       cada REINTENTO_S s hasta que se cierre (DONE llega entonces).
+#   STATUS  -> STATUS:READY:<trabajos pendientes>
+#   EXIT    -> termina lo encolado y responde STATUS:EXITING (lo que siga
+#              bloqueado por el Excel sale como ERROR:EXCEL_LOCKED:<id>)
+# Los trabajos se hacen de a uno y en orden (varios pueden ir al mismo libro).
+
+REINTENTO_S = 5.0
+_SALIR = object()
+
+
+class Worker:
+    def __init__(self):
+        self.trabajos = queue.Queue()
+        self._lock_salida = threading.Lock()
+        self._lock_cuenta = threading.Lock()
+        self.pendientes = 0
+        self.hilo = threading.Thread(target=self._bucle, daemon=True)
+        self.hilo.start()
+        self.emitir("STATUS:READY:0")
+
+    def emitir(self, linea):
+        with self._lock_salida:
+            sys.stdout.write(linea + "\n")
+            sys.stdout.flush()
+
+    def _contar(self, n):
+        with self._lock_cuenta:
+            self.pendientes += n
+
+    # ---------- hilo de trabajo ----------
+
+    def _bucle(self):
+        bloqueados = []   # trabajos esperando que se cierre su Excel, en orden
+        proximo = None    # cuándo reintentarlos
+        while True:
+            espera = None if not bloqueados else max(0.0, proximo - time.monotonic())
+            try:
+                trabajo = self.trabajos.get(timeout=espera)
+            except queue.Empty:
+                trabajo = None
+            if trabajo is _SALIR:
+                for t in bloqueados:
+                    self._contar(-1)
+                    self.emitir(f"ERROR:EXCEL_LOCKED:{t['id']}")
+                return
+            if trabajo is not None:
+                self._hacer(trabajo, bloqueados)
+            if bloqueados and proximo is None:
+                proximo = time.monotonic() + REINTENTO_S
+            elif bloqueados and time.monotonic() >= proximo:
+                reintentar, bloqueados = bloqueados, []
+                for t in reintentar:
+                    self._hacer(t, bloqueados)
+                proximo = time.monotonic() + REINTENTO_S if bloqueados else None
+            elif not bloqueados:
+                proximo = None
+
+    def _hacer(self, t, bloqueados):
+        # si otro examen del mismo libro ya espera, este va detrás (orden de hojas)
+        libro = Path(t["csvs"][0]).parent
+        if any(Path(b["csvs"][0]).parent == libro for b in bloqueados):
+            bloqueados.append(t)
+            return
+        try:
+            ruta = construir_sesion(t["cedula"], t["examen"], t["csvs"], t["ts"])
+        except PermissionError:
+            if not t.get("avisado"):
+                self.emitir(f"STATUS:EXCEL_LOCKED:{t['id']}")
+                t["avisado"] = True
+            bloqueados.append(t)
+            return
+        except Exception as e:
+            respuesta = f"ERROR:BUILD_FAILED:{t['id']}:{e}".replace("\n", " ")
+        else:
+            respuesta = f"DONE:{t['id']}:{ruta}"
+        self._contar(-1)
+        self.emitir(respuesta)
+
+    # ---------- stdin ----------
+
+    def handle_line(self, line):
+        line = line.rstrip("\r\n")
+        if not line.strip():
+            return True
+
+        if line.startswith("BUILD:"):
+            partes = line[len("BUILD:"):].split("\t")
+            if len(partes) < 4:
+                self.emitir("ERROR:BUILD_FORMAT")
+                return True
+            id_, cedula, examen, *csvs = partes
+            self._contar(1)
+            # la hoja lleva la fecha del último CSV (fin del examen), no la
+            # del reintento: la misma que le daría --lote (ver construir_sesion)
+            self.trabajos.put({"id": id_, "cedula": cedula, "examen": examen,
+                               "csvs": csvs, "ts": None})
+            self.emitir(f"QUEUED:{id_}")
+            return True
+
+        if line.upper() == "STATUS":
+            self.emitir(f"STATUS:READY:{self.pendientes}")
+            return True
+
+        if line.upper() == "EXIT":
+            self.trabajos.put(_SALIR)
+            self.hilo.join()
+            self.emitir("STATUS:EXITING")
+            return False
+
+        self.emitir(f"ERROR:UNKNOWN_CMD:{line}")
+        return True
+
+
+def servir():
+    # Qt escribe y lee UTF-8 (rutas con tildes/ñ), sea cual sea la consola
+    sys.stdin.reconfigure(encoding="utf-8")
+    sys.stdout.reconfigure(encoding="utf-8")
+    worker = Worker()
+    for raw in sys.stdin:
+        if not worker.handle_line(raw):
+            return 0
+    # stdin cerrado (la app se cerró): terminar lo encolado igual
+    worker.handle_line("EXIT")
+    return 0
+
+
+def main(argv):
+    if len(argv) > 1 and argv[1] == "--worker":
+        return servir()
+
+    if len(argv) > 1 and argv[1] == "--lote":
+        ap = argparse.ArgumentParser(prog="build_excel_from_csvs.py --lote",
+                                     description="Construye los Lecturas.xlsx de muchos exámenes")
+        ap.add_argument("fuente", help="carpeta con los CSV de la app (p.ej. PacienteData) o manifiesto")
+        ap.add_argument("--procesos", type=int, default=None, help="procesos en paralelo (por defecto, CPUs)")
+        ap.add_argument("--reconstruir", action="store_true",
+                        help="rehacer cada libro solo con los exámenes del lote (reemplaza el anterior)")
+        ap.add_argument("--listar", action="store_true", help="solo mostrar cómo se agrupan")
+        ap.add_argument("--union", choices=["columnas", "tiempo"], default=UNION,
+                        help="ejercicios fila a fila (por defecto) o alineados por timestamp_s")
+        args = ap.parse_args(argv[2:])
+        return ejecutar_lote(args.fuente, args.procesos, args.reconstruir, args.listar, args.union)
+
+    if len(argv) < 4:
+        print("Uso: build_excel_from_csvs.py <cedula> <nombre_examen> <csv1> [csv2 csv3 ...]")
+        print("     build_excel_from_csvs.py --worker   (proceso persistente para la app Qt)")
+        print("     build_excel_from_csvs.py --lote <carpeta|manifiesto> [--procesos N] [--reconstruir] [--listar]")
+        return 1
+
+    patient_id = argv[1]
+    exam_name  = argv[2]
+    csv_paths  = [Path(p) for p in argv[3:]]
+
+    try:
+        xlsx_path = construir_sesion(patient_id, exam_name, csv_paths)
+    except ValueError as e:
+        print(e)
+        return 1
     print(f"Guardado Excel en {xlsx_path}")
     return 0
 
@@ -0,0 +1,127 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+AQUI = Path(__file__).resolve().parent
+sys.path.insert(0, str(AQUI))
+
+import build_excel_from_csvs as bx  # noqa: E402
+
+
+def _csv(carpeta, nombre, col, emg, n=50):
+    ruta = carpeta / nombre
+    filas = [f"{i / 10:.4f},{i * 1.5:.4f},{i * 0.1:.4f}" for i in range(n)]
+    ruta.write_text("\ufefftimestamp_s," + col + "," + emg + "\n" + "\n".join(filas) + "\n",
+                    encoding="utf-8")
+    return ruta
+
+
+def _examen(tmp_path):
+    carpeta = tmp_path / "PacienteData" / "12345678"
+    carpeta.mkdir(parents=True)
+    return [
+        _csv(carpeta, "2025-03-02_10-00-00_ROM_Ej1.csv", "ROM Flexión/Extensión_°", "EMG(F/E)_mv"),
+        _csv(carpeta, "2025-03-02_10-00-02_ROM_Ej2.csv", "ROM Desviación Ulnar/Radial_°", "EMG(D)_mv"),
+    ]
+
+
+def _sesiones(xlsx):
+    wb = load_workbook(xlsx, read_only=True)
+    try:
+        return [h for h in wb.sheetnames if h.startswith("sesion_")]
+    finally:
+        wb.close()
+
+
+def test_worker_y_lote_no_duplican_examen(tmp_path, capsys):
+    csvs = _examen(tmp_path)
+    entrada = "BUILD:1\t12345678\tROM\t" + "\t".join(map(str, csvs)) + "\nEXIT\n"
+    salida = subprocess.run([sys.executable, str(AQUI / "build_excel_from_csvs.py"), "--worker"],
+                            input=entrada, capture_output=True, text=True, encoding="utf-8",
+                            timeout=120, check=True).stdout
+    assert "DONE:1:" in salida
+
+    xlsx = csvs[0].parent / "Lecturas.xlsx"
+    assert _sesiones(xlsx) == ["sesion_2025-03-02_10-00-02"]
+
+    assert bx.ejecutar_lote(tmp_path / "PacienteData", procesos=1) == 0
+    assert "0 hoja(s) nueva(s), 1 ya estaban" in capsys.readouterr().out
+    assert _sesiones(xlsx) == ["sesion_2025-03-02_10-00-02"]
+
+
+def test_linea_de_comandos_usa_fecha_del_csv(tmp_path):
+    csvs = _examen(tmp_path)
+    assert bx.main(["build_excel_from_csvs.py", "12345678", "ROM", *map(str, csvs)]) == 0
+    assert _sesiones(csvs[0].parent / "Lecturas.xlsx") == ["sesion_2025-03-02_10-00-02"]
+
+
+# ---------- copias de sesion.py (fuente de verdad) ----------
+
+def _sesion():
+    sys.path.insert(0, str(AQUI.parents[1] / "BNO055"))
+    return pytest.importorskip("sesion")
+
+
+def _tramos(rng):
+    tramos = []
+    for j, (col, emg) in enumerate([("ROM Flexión/Extensión_°", "EMG(F/E)_mv"),
+                                    ("ROM Pronosupinación_°", "EMG(PS)_mv"),
+                                    ("Fuerza de Prensión_Kg", "EMG(FP)_mv")]):
+        n = 200 + 70 * j
+        t = np.cumsum(rng.uniform(0.005, 0.03, n)) + rng.uniform(0, 0.5)
+        t[rng.choice(n, 3, replace=False)] = np.nan
+        t[5:9] = t[5:9][::-1]          # algo desordenado
+        v = rng.normal(size=n).round(2)
+        v[rng.choice(n, 5, replace=False)] = np.nan
+        tramos.append(pd.DataFrame({"timestamp_s": t, col: v, emg: rng.normal(size=n).round(2)}))
+    return tramos
+
+
+def test_mas_cercano_igual_que_sesion():
+    sesion = _sesion()
+    rng = np.random.default_rng(3)
+    t = np.sort(rng.uniform(0, 10, 500))
+    t_ref = np.concatenate([rng.uniform(-1, 11, 500), t[:20], [np.nan], (t[:-1] + t[1:])[:10] / 2])
+    for tol in (0.0, 0.01, sesion._paso_mediano(t), np.inf):
+        np.testing.assert_array_equal(bx.mas_cercano(t_ref, t, tol), sesion.mas_cercano(t_ref, t, tol))
+    np.testing.assert_array_equal(bx.mas_cercano(t_ref, t[:0], 1.0), sesion.mas_cercano(t_ref, t[:0], 1.0))
+    assert bx._paso_mediano(t) == sesion._paso_mediano(t)
+
+
+@pytest.mark.parametrize("modo", ["columnas", "tiempo"])
+@pytest.mark.parametrize("tolerancia", [None, 0.05])
+def test_unir_igual_que_densificar(modo, tolerancia):
+    sesion = _sesion()
+    tramos = _tramos(np.random.default_rng(5))
+    pd.testing.assert_frame_equal(bx.unir(tramos, modo, bx.COLS, tolerancia),
+                                  sesion.densificar(tramos, modo, bx.COLS, tolerancia))
+
+
+# ---------- cabecera genérica Valor/EMG de mainwindow.cpp ----------
+
+def test_csv_generico_toma_el_ejercicio_de_su_numero(tmp_path):
+    csv = _csv(tmp_path, "2025-03-02_10-00-00_Muñeca_Ej2.csv", "Valor", "EMG")
+    assert bx.cabecera_csv(csv) == ["timestamp_s", "ROM Desviación Ulnar/Radial_°", "EMG(D)_mv"]
+    df = bx.unir_csvs([csv])
+    assert list(df.columns) == bx.COLS
+    assert df["ROM Desviación Ulnar/Radial_°"].iloc[3] == 4.5
+
+
+def test_csv_generico_sin_ejercicio_conserva_valor_y_emg(tmp_path):
+    csvs = [_csv(tmp_path, "2025-03-02_10-00-00_Examen_Ej0.csv", "Valor", "EMG"),
+            _csv(tmp_path, "2025-03-02_10-00-01_Examen_Ej1.csv", "ROM Flexión/Extensión_°", "EMG(F/E)_mv")]
+    ruta = bx.construir_sesion("1", "Examen", csvs)
+    df = bx.unir_csvs(csvs)
+    assert list(df.columns) == bx.COLS + ["Valor", "EMG"]
+    assert df["Valor"].iloc[3] == 4.5 and df["ROM Flexión/Extensión_°"].iloc[3] == 4.5
+    assert _sesiones(ruta) == ["sesion_2025-03-02_10-00-01"]
+
+
+def test_cabecera_ajena_sigue_rechazandose(tmp_path):
+    with pytest.raises(ValueError, match="cabecera inesperada"):
+        bx.cabecera_csv(_csv(tmp_path, "2025-03-02_10-00-00_X_Ej1.csv", "Valor", "EMG(F/E)_mv"))
@@ -66,7 +66,12 @@ MainWindow::MainWindow(QWidget *parent)
     m_patientId(),
     m_serial(nullptr),
     m_acqTimer(nullptr),
-    m_elapsed(nullptr)
+    m_elapsed(nullptr),
+    m_acqDurationMs(0),
+    m_deviceT0(std::numeric_limits<double>::quiet_NaN()),
+    m_lastDeviceT(std::numeric_limits<double>::quiet_NaN()),
+    m_excelWorker(nullptr),
+    m_nextExcelJobId(1)
 {
     setWindowTitle(QString::fromUtf8("UpperSense — Panel de Control"));
     resize(1280, 720);
@@ -156,10 +161,26 @@ MainWindow::MainWindow(QWidget *parent)
     if (m_pages)
         m_pages->setCurrentIndex(0);
 
+    // ===== Worker Python =====
+    // Se arranca ya: pandas/openpyxl terminan de cargar mientras se captura
+    ensureExcelWorker();
+
     setStatusText(QString::fromUtf8("Ingrese la cédula del paciente"));
     showMaximized();
 }
 
+MainWindow::~MainWindow()
+{
+    // Dejar que el worker termine los Excel encolados antes de salir
+    if (m_excelWorker && m_excelWorker->state() == QProcess::Running) {
+        disconnect(m_excelWorker, nullptr, this, nullptr);
+        m_excelWorker->write("EXIT\n");
+        m_excelWorker->closeWriteChannel();
+        if (!m_excelWorker->waitForFinished(30000))
+            m_excelWorker->kill();
+    }
+}
+
 // ---------------------------------------------------------------------------
 //                  CARD CENTRAL + PÁGINAS
 // ---------------------------------------------------------------------------
@@ -651,6 +672,8 @@ void MainWindow::startAcquisitionForCurrentExercise(int durationSeconds)
     m_emgSamples.clear();
 
     m_elapsed->restart();                      // timestamp = 0 al iniciar
+    m_deviceT0 = std::numeric_limits<double>::quiet_NaN();
+    m_lastDeviceT = std::numeric_limits<double>::quiet_NaN();
     m_acqDurationMs = durationSeconds * 1000;
     m_acqTimer->start(m_acqDurationMs);
 
@@ -756,8 +779,16 @@ void MainWindow::onSerialReadyRead()
 
         double emgVal = emg_env;
 
-        // 4) Tiempo local de Qt
+        // 4) Tiempo: el del Arduino (millis) relativo a la primera muestra;
+        //    el de Qt solo si la trama no trae tiempo. El reloj del PC
+        //    arrastra el jitter de USB/planificador.
         double t = m_elapsed->elapsed() / 1000.0;
+        if (!std::isnan(t_arduino)) {
+            if (std::isnan(m_deviceT0) || t_arduino < m_lastDeviceT)
+                m_deviceT0 = t_arduino - (m_timeSamples.isEmpty() ? 0.0 : m_timeSamples.last());
+            m_lastDeviceT = t_arduino;
+            t = t_arduino - m_deviceT0;
+        }
 
         m_timeSamples.append(t);
         m_valueSamples.append(romOrForce);
@@ -948,27 +979,101 @@ void MainWindow::runExcelBuilderForCurrentSession()
     default:        examName = "Examen"; break;
     }
 
+    if (!ensureExcelWorker()) {
+        QMessageBox::warning(this,
+                             tr("Error al crear Excel"),
+                             tr("No se pudo iniciar Python para generar Lecturas.xlsx.\n"
+                                "Los CSV del examen quedaron en la carpeta del paciente."));
+        return;
+    }
+
+    // BUILD:<id>\t<cedula>\t<examen>\t<csv1>\t<csv2>... (ver build_excel_from_csvs.py)
+    const QString jobId = QString::number(m_nextExcelJobId++);
+    QStringList fields;
+    fields << m_patientId << examName << m_sessionCsvFiles;
+    const QString request = "BUILD:" + jobId + "\t" + fields.join('\t') + "\n";
+
+    qDebug() << "Worker Python <-" << request.trimmed();
+    m_excelWorker->write(request.toUtf8());
+
+    // No se espera: la respuesta llega por onExcelWorkerOutput y se puede
+    // empezar otro examen mientras tanto
+    m_excelJobCsvFiles.insert(jobId, m_sessionCsvFiles);
+    m_excelJobPatient.insert(jobId, m_patientId);
+    m_sessionCsvFiles.clear();
+    setStatusText(QString::fromUtf8("Generando Lecturas.xlsx..."));
+}
+
+bool MainWindow::ensureExcelWorker()
+{
+    if (m_excelWorker && m_excelWorker->state() != QProcess::NotRunning)
+        return true;
+
+    QString scriptPath = QCoreApplication::applicationDirPath()
+                         + "/build_excel_from_csvs.py";
+    if (!QFileInfo::exists(scriptPath))
+        return false;
+
+    if (!m_excelWorker) {
+        m_excelWorker = new QProcess(this);
+        m_excelWorker->setProcessChannelMode(QProcess::ForwardedErrorChannel);
+        connect(m_excelWorker, &QProcess::readyReadStandardOutput,
+                this, &MainWindow::onExcelWorkerOutput);
+        connect(m_excelWorker, &QProcess::finished, this,
+                [this](int exitCode, QProcess::ExitStatus) {
+            qWarning() << "Worker Python terminó con código" << exitCode;
+            // Los trabajos sin respuesta dejan sus CSV en disco; el
+            // siguiente examen vuelve a arrancar el worker
+            if (!m_excelJobCsvFiles.isEmpty())
+                setStatusText(QString::fromUtf8("Python se cerró: Excel pendiente sin generar"));
+            m_excelJobCsvFiles.clear();
+            m_excelJobPatient.clear();
+        });
+    }
+
     QString pythonExe = "python";   // ajusta ruta si hace falta
 
-    QStringList args;
-    args << m_patientId << examName;
-    for (const QString &p : m_sessionCsvFiles)
-        args << p;
+    m_excelWorkerBuffer.clear();
+    m_excelWorker->start(pythonExe, QStringList() << "-u" << scriptPath << "--worker");
+    if (!m_excelWorker->waitForStarted(5000)) {
+        qWarning() << "No se pudo iniciar el worker Python:" << m_excelWorker->errorString();
+        return false;
+    }
+    return true;
+}
+
+void MainWindow::onExcelWorkerOutput()
+{
+    m_excelWorkerBuffer += m_excelWorker->readAllStandardOutput();
 
-    qDebug() << "Ejecutando" << pythonExe << scriptPath << args;
+    int nl;
+    while ((nl = m_excelWorkerBuffer.indexOf('\n')) >= 0) {
+        const QByteArray line = m_excelWorkerBuffer.left(nl);
+        m_excelWorkerBuffer.remove(0, nl + 1);
+        handleExcelWorkerLine(QString::fromUtf8(line).trimmed());
+    }
+}
+
+void MainWindow::handleExcelWorkerLine(const QString &line)
+{
+    qDebug() << "Worker Python ->" << line;
 
-    int exitCode = QProcess::execute(pythonExe, QStringList() << scriptPath << args);
+    if (line.startsWith("DONE:")) {
+        // DONE:<id>:<ruta> (la ruta puede traer ':' de la unidad)
+        const QString jobId   = line.section(':', 1, 1);
+        const QString patient = m_excelJobPatient.take(jobId);
 
-    if (exitCode == 0) {
         setStatusText(QString::fromUtf8("Lecturas.xlsx actualizado correctamente"));
-        QMessageBox::information(this,
-                                 tr("Excel actualizado"),
-                                 tr("Se generó/actualizó el archivo Lecturas.xlsx "
-                                    "para el paciente %1.")
-                                     .arg(m_patientId));
+        if (!m_isAcquiring) {
+            QMessageBox::information(this,
+                                     tr("Excel actualizado"),
+                                     tr("Se generó/actualizó el archivo Lecturas.xlsx "
+                                        "para el paciente %1.")
+                                         .arg(patient));
+        }
 
         // ======== BORRAR LOS CSV TEMPORALES =========
-        for (const QString &path : m_sessionCsvFiles) {
+        for (const QString &path : m_excelJobCsvFiles.take(jobId)) {
             QFile f(path);
             if (f.exists()) {
                 if (!f.remove()) {
@@ -977,14 +1082,32 @@ void MainWindow::runExcelBuilderForCurrentSession()
                 }
             }
         }
-        m_sessionCsvFiles.clear();
         // ============================================
-    } else {
+        return;
+    }
+
+    if (line.startsWith("STATUS:EXCEL_LOCKED:")) {
+        // El worker reintenta solo; DONE llega cuando se cierre el Excel
+        const QString patient = m_excelJobPatient.value(line.section(':', 2, 2));
+        setStatusText(QString::fromUtf8("Lecturas.xlsx de %1 está abierto: se guardará al cerrarlo")
+                          .arg(patient));
+        return;
+    }
+
+    if (line.startsWith("ERROR:")) {
+        // ERROR:BUILD_FAILED:<id>:<detalle> | ERROR:EXCEL_LOCKED:<id> | ERROR:<otro>
+        const QString kind    = line.section(':', 1, 1);
+        const QString jobId   = line.section(':', 2, 2);
+        const QString detail  = line.section(':', 3);
+        const QString patient = m_excelJobPatient.take(jobId);
+        m_excelJobCsvFiles.remove(jobId);   // los CSV se conservan
+
+        setStatusText(QString::fromUtf8("Error al crear Lecturas.xlsx"));
         QMessageBox::warning(this,
                              tr("Error al crear Excel"),
-                             tr("El script Python terminó con código %1.\n"
-                                "Revisa la consola o ejecuta el script a mano.")
-                                 .arg(exitCode));
+                             tr("No se pudo generar Lecturas.xlsx del paciente %1 (%2).\n"
+                                "Los CSV del examen quedaron en su carpeta.")
+                                 .arg(patient, detail.isEmpty() ? kind : detail));
     }
 }
 
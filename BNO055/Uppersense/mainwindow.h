@@ -3,6 +3,7 @@
 #include <QMainWindow>
 #include <QVector>
 #include <QStringList>
+#include <QHash>
 
 class HeaderWidget;
 class QLabel;
@@ -12,6 +13,7 @@ class QTimer;
 class QLineEdit;
 class QSerialPort;
 class QElapsedTimer;
+class QProcess;
 
 class MainWindow : public QMainWindow
 {
@@ -19,6 +21,7 @@ class MainWindow : public QMainWindow
 
 public:
     explicit MainWindow(QWidget *parent = nullptr);
+    ~MainWindow() override;
 
 private slots:
     // Navegación principal
@@ -40,6 +43,9 @@ private slots:
     void onSerialReadyRead();
     void onAcquisitionTimeout();
 
+    // Worker Python (Lecturas.xlsx)
+    void onExcelWorkerOutput();
+
     // Otros
     void updateClock();
     void toggleFullscreen();
@@ -67,6 +73,8 @@ private:
     void stopAcquisition(bool fromTimeout);
     QString saveCurrentExerciseToCsv();
     void runExcelBuilderForCurrentSession();
+    bool ensureExcelWorker();
+    void handleExcelWorkerLine(const QString &line);
 
     // ----- UI general -----
     HeaderWidget   *m_header;
@@ -97,11 +105,20 @@ private:
     QTimer        *m_acqTimer;
     QElapsedTimer *m_elapsed;
     int            m_acqDurationMs;      // <<< AÑADIR ESTA LÍNEA
+    double         m_deviceT0;           // t del Arduino en la 1.ª muestra
+    double         m_lastDeviceT;        // para detectar reinicios del Arduino
 
     QByteArray      m_serialBuffer;
     QVector<double> m_timeSamples;   // timestamp_s
     QVector<double> m_valueSamples;  // ROM o Fuerza
     QVector<double> m_emgSamples;    // EMG del ejercicio
     QStringList     m_sessionCsvFiles;
+
+    // ----- Worker Python persistente (build_excel_from_csvs.py --worker) -----
+    QProcess                  *m_excelWorker;
+    QByteArray                 m_excelWorkerBuffer;
+    int                        m_nextExcelJobId;
+    QHash<QString, QStringList> m_excelJobCsvFiles;   // id -> CSV a borrar al terminar
+    QHash<QString, QString>     m_excelJobPatient;    // id -> cédula (para los avisos)
 };
 